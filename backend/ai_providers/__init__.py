@@ -0,0 +1,8 @@
+# Async provider clients used by the Discord model commands
+from ai_providers.adapters import ProviderAdapter, OpenAICompatibleAdapter, ProviderError
+from ai_providers.registry import register_adapter, register_openai_compatible, create_adapter, registered_providers
+from ai_providers.http_client import get_session, close_session
+from ai_providers.scheduler import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND, get_scheduler, scheduler_stats
+from ai_providers.single_flight import single_flight_stats
+from ai_providers.key_pool import get_key_pool, key_pool_stats
+from ai_providers.resilience import CircuitOpenError, complete_with_failover, stream_with_failover, health_stats
@@ -0,0 +1,325 @@
+import copy
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from ai_providers.errors import ProviderError
+from ai_providers.http_client import STREAM_TIMEOUT, get_session
+from ai_providers.key_pool import get_key_pool
+from ai_providers.scheduler import PRIORITY_INTERACTIVE, get_scheduler, parse_retry_after
+from ai_providers.single_flight import PROVIDER_COALESCE_REQUESTS, get_single_flight, request_fingerprint
+from ai_providers.sse import iter_sse_events
+from observability import registry
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_RESPONSES = registry.counter("dae_provider_responses", "Upstream HTTP responses by provider and status code", ("provider", "status"))
+PROVIDER_TOKENS = registry.counter("dae_provider_tokens", "Tokens the provider reported as used", ("provider", "model", "kind"))
+
+
+class ProviderAdapter:
+    """
+    Async client for one provider, bound to one model and integration config.
+
+    Static headers, the endpoint URL and the payload template are computed once
+    when the adapter is built (at command registration), so a request only has
+    to merge the context messages into the template. With several API keys,
+    each request is sent with the key the key pool picks; per-key copies of
+    the adapter hold that key's headers and URL.
+    """
+
+    display_name = "Provider"
+    default_url = ""
+
+    def __init__(self, api_key: str, model_id: str, config: Optional[Dict[str, Any]] = None, api_url: Optional[str] = None,
+                 api_keys: Optional[Sequence[str]] = None):
+        self.api_keys: Tuple[str, ...] = tuple(api_keys) if api_keys else (api_key,)
+        self.api_key = api_key or self.api_keys[0]
+        self._by_key: Dict[str, "ProviderAdapter"] = {}
+        # Metric children are resolved here so recording a request is a plain increment
+        self._responses: Dict[int, Any] = {}
+        self._prompt_tokens = PROVIDER_TOKENS.labels(self.limit_key, model_id, "prompt")
+        self._completion_tokens = PROVIDER_TOKENS.labels(self.limit_key, model_id, "completion")
+        self.model_id = model_id
+        self.config = dict(config or {})
+        self.api_url = api_url or self.default_url
+        self.url = self.request_url()
+        self.headers = self.static_headers()
+        self.template = self.payload_template()
+
+    def static_headers(self) -> Dict[str, str]:
+        return {"content-type": "application/json"}
+
+    def request_url(self) -> str:
+        return self.api_url
+
+    def payload_template(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def build_request(self, messages: List[Dict[str, str]]) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """Return (url, headers, json body) for the given context messages"""
+        body = dict(self.template)
+        body["messages"] = messages
+        return self.url, self.headers, body
+
+    def parse_response(self, data: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    def build_stream_request(self, messages: List[Dict[str, str]]) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """Same as build_request, but asking the provider for an SSE token stream"""
+        url, headers, body = self.build_request(messages)
+        body["stream"] = True
+        return url, headers, body
+
+    def parse_stream_event(self, event: Dict[str, Any]) -> Optional[str]:
+        """Return the text delta carried by one stream event, if any"""
+        raise NotImplementedError
+
+    def parse_usage(self, data: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+        """(prompt tokens, completion tokens) reported in a response or stream event, if any"""
+        return None
+
+    def _record_usage(self, usage: Optional[Tuple[int, int]]) -> None:
+        if usage:
+            self._prompt_tokens.inc(usage[0] or 0)
+            self._completion_tokens.inc(usage[1] or 0)
+
+    @property
+    def limit_key(self) -> str:
+        """Name the scheduler applies concurrency and rate limits under"""
+        return self.display_name.lower()
+
+    def for_key(self, api_key: str) -> "ProviderAdapter":
+        """This adapter bound to another key of the pool"""
+        if api_key == self.api_key:
+            return self
+        adapter = self._by_key.get(api_key)
+        if adapter is None:
+            adapter = copy.copy(self)
+            adapter.api_key = api_key
+            adapter.url = adapter.request_url()
+            adapter.headers = adapter.static_headers()
+            self._by_key[api_key] = adapter
+        return adapter
+
+    async def _check_response(self, resp) -> None:
+        responses = self._responses.get(resp.status)
+        if responses is None:
+            responses = self._responses[resp.status] = PROVIDER_RESPONSES.labels(self.limit_key, resp.status)
+        responses.inc()
+        get_scheduler().observe(self.limit_key, self.api_key, resp.headers)
+        if resp.status != 200:
+            raise ProviderError(self.display_name, resp.status, await resp.text(), parse_retry_after(resp.headers))
+
+    async def complete(self, messages: List[Dict[str, str]], priority: int = PRIORITY_INTERACTIVE) -> str:
+        """Send a chat completion request and return the reply text"""
+        url, headers, body = self.build_request(messages)
+
+        def send(api_key):
+            adapter = self.for_key(api_key)
+            request = (url, headers, body) if adapter is self else adapter.build_request(messages)
+            return get_scheduler().run(self.limit_key, api_key, lambda: adapter._complete_once(*request), priority)
+
+        def call():
+            if len(self.api_keys) == 1:
+                return send(self.api_key)
+            return get_key_pool().run(self.limit_key, self.api_keys, send)
+
+        if not PROVIDER_COALESCE_REQUESTS:
+            return await call()
+        # Identical requests already in flight share their upstream call
+        return await get_single_flight().do(request_fingerprint(self.api_key, url, body), call)
+
+    async def _complete_once(self, url: str, headers: Dict[str, str], body: Dict[str, Any]) -> str:
+        async with get_session().post(url, json=body, headers=headers) as resp:
+            await self._check_response(resp)
+            data = await resp.json(content_type=None)
+        self._record_usage(self.parse_usage(data))
+        return self.parse_response(data)
+
+    async def stream(self, messages: List[Dict[str, str]], priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[str]:
+        """Send a streaming chat completion request and yield text deltas as they arrive"""
+        def open_stream(api_key):
+            adapter = self.for_key(api_key)
+            return get_scheduler().stream(self.limit_key, api_key, lambda: adapter._stream_once(messages), priority)
+
+        streams = open_stream(self.api_key) if len(self.api_keys) == 1 else get_key_pool().stream(self.limit_key, self.api_keys, open_stream)
+        async for delta in streams:
+            yield delta
+
+    async def _stream_once(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        url, headers, body = self.build_stream_request(messages)
+        # A long answer may stream for minutes, so the session's total timeout does not apply
+        async with get_session().post(url, json=body, headers=headers, timeout=STREAM_TIMEOUT) as resp:
+            await self._check_response(resp)
+            # Providers report usage once or cumulatively across events; keep the largest counts
+            prompt_tokens = completion_tokens = 0
+            try:
+                async for event in iter_sse_events(resp):
+                    usage = self.parse_usage(event)
+                    if usage:
+                        prompt_tokens = max(prompt_tokens, usage[0] or 0)
+                        completion_tokens = max(completion_tokens, usage[1] or 0)
+                    delta = self.parse_stream_event(event)
+                    if delta:
+                        yield delta
+            finally:
+                self._record_usage((prompt_tokens, completion_tokens))
+
+
+class OpenAICompatibleAdapter(ProviderAdapter):
+    """Chat Completions API shared by OpenAI, DeepSeek, Mistral, OpenRouter and friends"""
+
+    def static_headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "content-type": "application/json"
+        }
+
+    def payload_template(self):
+        return {
+            "model": self.model_id,
+            "max_tokens": self.config.get("max_tokens", 1024),
+            "temperature": self.config.get("temperature", 0.7)
+        }
+
+    def parse_response(self, data):
+        return (data.get('choices') or [{}])[0].get('message', {}).get('content') or 'No response'
+
+    def parse_stream_event(self, event):
+        return ((event.get('choices') or [{}])[0].get('delta') or {}).get('content')
+
+    def parse_usage(self, data):
+        usage = data.get('usage')
+        if usage:
+            return usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+        return None
+
+
+class OpenAIAdapter(OpenAICompatibleAdapter):
+    display_name = "OpenAI"
+    default_url = "https://api.openai.com/v1/chat/completions"
+
+    def payload_template(self):
+        # OpenAI accepts the integration config as-is
+        return {"model": self.model_id, **self.config}
+
+
+class DeepSeekAdapter(OpenAICompatibleAdapter):
+    display_name = "DeepSeek"
+    default_url = "https://api.deepseek.com/v1/chat/completions"
+
+
+class MistralAdapter(OpenAICompatibleAdapter):
+    display_name = "Mistral"
+    default_url = "https://api.mistral.ai/v1/chat/completions"
+
+
+class OpenRouterAdapter(OpenAICompatibleAdapter):
+    display_name = "OpenRouter"
+    default_url = "https://openrouter.ai/api/v1/chat/completions"
+
+
+class AnthropicAdapter(ProviderAdapter):
+    display_name = "Anthropic"
+    default_url = "https://api.anthropic.com/v1/messages"
+
+    def static_headers(self):
+        return {
+            "x-api-key": self.api_key,
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json"
+        }
+
+    def payload_template(self):
+        return {
+            "model": self.model_id,
+            "max_tokens": self.config.get("max_tokens", 1024),
+            "temperature": self.config.get("temperature", 0.7)
+        }
+
+    def build_request(self, messages):
+        # Messages API takes the persona as a top-level system prompt
+        body = dict(self.template)
+        system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+        body["messages"] = [m for m in messages if m["role"] != "system"]
+        if system:
+            body["system"] = system
+        return self.url, self.headers, body
+
+    def parse_response(self, data):
+        return (data.get('content') or [{}])[0].get('text', 'No response')
+
+    def parse_usage(self, data):
+        # message_start carries the input tokens, message_delta the running output count
+        usage = data.get('usage') or (data.get('message') or {}).get('usage')
+        if usage:
+            return usage.get('input_tokens', 0), usage.get('output_tokens', 0)
+        return None
+
+    def parse_stream_event(self, event):
+        if event.get('type') == 'content_block_delta':
+            return (event.get('delta') or {}).get('text')
+        if event.get('type') == 'error':
+            error = event.get('error') or {}
+            raise ProviderError(self.display_name, 500, error.get('message', 'stream error'))
+        return None
+
+
+class GeminiAdapter(ProviderAdapter):
+    display_name = "Gemini"
+
+    def request_url(self):
+        if self.api_url:
+            return self.api_url
+        return f"https://generativelanguage.googleapis.com/v1beta/models/{self.model_id}:generateContent?key={self.api_key}"
+
+    def stream_url(self):
+        if self.api_url:
+            return self.api_url.replace(":generateContent", ":streamGenerateContent")
+        return f"https://generativelanguage.googleapis.com/v1beta/models/{self.model_id}:streamGenerateContent?alt=sse&key={self.api_key}"
+
+    def payload_template(self):
+        generation_config = {}
+        if "temperature" in self.config:
+            generation_config["temperature"] = self.config["temperature"]
+        if "max_tokens" in self.config:
+            generation_config["maxOutputTokens"] = self.config["max_tokens"]
+        return {"generationConfig": generation_config} if generation_config else {}
+
+    def build_request(self, messages):
+        body = dict(self.template)
+        contents = []
+        system_parts = []
+        for m in messages:
+            if m["role"] == "system":
+                system_parts.append({"text": m["content"]})
+            else:
+                role = "model" if m["role"] == "assistant" else "user"
+                contents.append({"role": role, "parts": [{"text": m["content"]}]})
+        body["contents"] = contents
+        if system_parts:
+            body["systemInstruction"] = {"parts": system_parts}
+        return self.url, self.headers, body
+
+    def build_stream_request(self, messages):
+        # Gemini selects streaming through the endpoint rather than a body flag
+        _, headers, body = self.build_request(messages)
+        return self.stream_url(), headers, body
+
+    def parse_response(self, data):
+        candidates = data.get('candidates', [])
+        if candidates and 'content' in candidates[0] and candidates[0]['content'].get('parts'):
+            return candidates[0]['content']['parts'][0].get('text', 'No response')
+        return 'No response'
+
+    def parse_usage(self, data):
+        usage = data.get('usageMetadata')
+        if usage:
+            return usage.get('promptTokenCount', 0), usage.get('candidatesTokenCount', 0)
+        return None
+
+    def parse_stream_event(self, event):
+        candidates = event.get('candidates', [])
+        if candidates and 'content' in candidates[0]:
+            return "".join(part.get('text', '') for part in candidates[0]['content'].get('parts', []))
+        return None
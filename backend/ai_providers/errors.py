@@ -0,0 +1,25 @@
+from typing import Optional
+
+# Words in a 429 body that mean the account is out of quota rather than briefly rate limited
+_QUOTA_MARKERS = ("quota", "billing", "credit", "insufficient")
+
+
+class ProviderError(Exception):
+    """Raised when a provider answers with a non-200 status"""
+
+    def __init__(self, provider: str, status: int, body: str, retry_after: Optional[float] = None):
+        super().__init__(f"{provider} API error: {status} {body}")
+        self.provider = provider
+        self.status = status
+        self.body = body
+        # Seconds the provider asked us to wait (Retry-After), if it said so
+        self.retry_after = retry_after
+
+    @property
+    def key_rejection(self) -> Optional[str]:
+        """Either "auth" or "quota" when the API key itself was refused, so retrying with it is pointless"""
+        if self.status in (401, 403):
+            return "auth"
+        if self.status == 402 or (self.status == 429 and any(m in (self.body or "").lower() for m in _QUOTA_MARKERS)):
+            return "quota"
+        return None
@@ -0,0 +1,51 @@
+import asyncio
+import logging
+import os
+from typing import Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Connection pool settings for the shared provider HTTP client
+HTTP_POOL_LIMIT = int(os.getenv("PROVIDER_HTTP_POOL_LIMIT", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("PROVIDER_HTTP_POOL_LIMIT_PER_HOST", "20"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("PROVIDER_HTTP_KEEPALIVE_TIMEOUT", "60"))
+HTTP_REQUEST_TIMEOUT = float(os.getenv("PROVIDER_HTTP_TIMEOUT", "30"))
+# Streams have no total limit, only one on connecting and one on the gap between chunks
+HTTP_STREAM_CONNECT_TIMEOUT = float(os.getenv("PROVIDER_STREAM_CONNECT_TIMEOUT", "10"))
+HTTP_STREAM_READ_TIMEOUT = float(os.getenv("PROVIDER_STREAM_READ_TIMEOUT", "60"))
+
+STREAM_TIMEOUT = aiohttp.ClientTimeout(
+    total=None, sock_connect=HTTP_STREAM_CONNECT_TIMEOUT, sock_read=HTTP_STREAM_READ_TIMEOUT,
+)
+
+# One session per event loop: aiohttp sessions are bound to the loop they were created on
+_sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Return the shared keep-alive HTTP session for the running event loop"""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_REQUEST_TIMEOUT),
+        )
+        _sessions[loop] = session
+        logger.info("Created shared provider HTTP session")
+    return session
+
+
+async def close_session() -> None:
+    """Close the shared HTTP session bound to the running event loop, if any"""
+    session: Optional[aiohttp.ClientSession] = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
@@ -0,0 +1,164 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from ai_providers.errors import ProviderError
+from ai_providers.scheduler import get_scheduler
+
+logger = logging.getLogger(__name__)
+
+# How long a key is taken out of its pool after the provider rejects it
+KEY_QUARANTINE_AUTH = float(os.getenv("KEY_QUARANTINE_AUTH", "3600"))
+KEY_QUARANTINE_QUOTA = float(os.getenv("KEY_QUARANTINE_QUOTA", "900"))
+
+
+def key_hint(api_key: str) -> str:
+    return f"...{api_key[-4:]}" if api_key and len(api_key) > 8 else "****"
+
+
+def quarantine_seconds(error: BaseException) -> Optional[float]:
+    """How long the key behind a failed request should sit out, or None if the key is not to blame"""
+    rejection = error.key_rejection if isinstance(error, ProviderError) else None
+    if rejection == "auth":
+        return KEY_QUARANTINE_AUTH
+    if rejection == "quota":
+        return KEY_QUARANTINE_QUOTA
+    return None
+
+
+class KeyUsage:
+    """Counters and quarantine state of one API key"""
+
+    __slots__ = ("requests", "failures", "last_used", "quarantined_until", "last_error")
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.last_used = 0.0
+        self.quarantined_until = 0.0
+        self.last_error = ""
+
+
+class KeyPool:
+    """
+    Spreads a provider's requests over its API keys.
+
+    Each request goes to the key that is not quarantined, not paused by the
+    scheduler after a rate-limit response, and has the fewest requests
+    running or waiting; ties go to the least recently used key. A key the
+    provider rejects for auth or quota is quarantined and the request moves
+    on to the next key straight away.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._usage: Dict[Tuple[str, str], KeyUsage] = {}
+
+    def usage(self, provider: str, api_key: str) -> KeyUsage:
+        with self._lock:
+            usage = self._usage.get((provider, api_key))
+            if usage is None:
+                usage = self._usage[(provider, api_key)] = KeyUsage()
+            return usage
+
+    def pick(self, provider: str, api_keys: Sequence[str], exclude: Set[str] = frozenset()) -> str:
+        """
+        The best key to send the next request with. When every key is
+        quarantined, the one released soonest is used rather than failing.
+        """
+        scheduler = get_scheduler()
+        now = time.monotonic()
+        best, best_rank = None, None
+        for api_key in api_keys:
+            if api_key in exclude:
+                continue
+            usage = self.usage(provider, api_key)
+            quarantined = usage.quarantined_until > now
+            paused, load = scheduler.key_load(provider, api_key)
+            rank = (quarantined, usage.quarantined_until if quarantined else 0.0, paused, load, usage.last_used)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = api_key, rank
+        return best
+
+    def quarantine(self, provider: str, api_key: str, error: BaseException, seconds: float) -> None:
+        usage = self.usage(provider, api_key)
+        usage.quarantined_until = time.monotonic() + seconds
+        usage.last_error = str(error)[:200]
+        logger.warning(f"Quarantined {provider} key {key_hint(api_key)} for {seconds:g}s: {error}")
+
+    def _begin(self, provider: str, api_key: str) -> KeyUsage:
+        usage = self.usage(provider, api_key)
+        usage.requests += 1
+        usage.last_used = time.monotonic()
+        return usage
+
+    def _failed(self, provider: str, api_key: str, usage: KeyUsage, error: Exception,
+                tried: Set[str], api_keys: Sequence[str]) -> None:
+        """Count a failure, quarantining the key if it is to blame; re-raise when no other key is left"""
+        usage.failures += 1
+        seconds = quarantine_seconds(error)
+        if seconds is None:
+            raise error
+        self.quarantine(provider, api_key, error, seconds)
+        tried.add(api_key)
+        if len(tried) >= len(set(api_keys)):
+            raise error
+
+    async def run(self, provider: str, api_keys: Sequence[str], call: Callable[[str], Awaitable[Any]]) -> Any:
+        """Run call(api_key) on the best key, moving to the next key when one is rejected"""
+        tried: Set[str] = set()
+        while True:
+            api_key = self.pick(provider, api_keys, tried)
+            usage = self._begin(provider, api_key)
+            try:
+                return await call(api_key)
+            except Exception as e:
+                self._failed(provider, api_key, usage, e, tried, api_keys)
+
+    async def stream(self, provider: str, api_keys: Sequence[str],
+                     open_stream: Callable[[str], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Like run() for token streams; only moves to another key until the first delta arrives"""
+        tried: Set[str] = set()
+        while True:
+            api_key = self.pick(provider, api_keys, tried)
+            usage = self._begin(provider, api_key)
+            started = False
+            try:
+                async for delta in open_stream(api_key):
+                    started = True
+                    yield delta
+                return
+            except Exception as e:
+                if started:
+                    usage.failures += 1
+                    raise
+                self._failed(provider, api_key, usage, e, tried, api_keys)
+
+    def stats(self) -> Dict[str, List[Dict[str, Any]]]:
+        now = time.monotonic()
+        with self._lock:
+            items = list(self._usage.items())
+        totals: Dict[str, List[Dict[str, Any]]] = {}
+        for (provider, api_key), usage in items:
+            totals.setdefault(provider, []).append({
+                "key": key_hint(api_key),
+                "requests": usage.requests,
+                "failures": usage.failures,
+                "quarantined_for": round(max(0.0, usage.quarantined_until - now), 1),
+                "last_error": usage.last_error,
+            })
+        return totals
+
+
+# Quarantine has to hold for every event loop of the process, so there is a single pool
+_pool = KeyPool()
+
+
+def get_key_pool() -> KeyPool:
+    return _pool
+
+
+def key_pool_stats() -> Dict[str, List[Dict[str, Any]]]:
+    return _pool.stats()
@@ -0,0 +1,69 @@
+import logging
+import os
+from typing import Any, Dict, Optional, Type
+
+from ai_providers.adapters import (
+    ProviderAdapter,
+    OpenAICompatibleAdapter,
+    OpenAIAdapter,
+    AnthropicAdapter,
+    GeminiAdapter,
+    DeepSeekAdapter,
+    MistralAdapter,
+    OpenRouterAdapter,
+)
+
+logger = logging.getLogger(__name__)
+
+# Provider name (lowercase, as stored in AIProvider.name) -> adapter class
+_ADAPTERS: Dict[str, Type[ProviderAdapter]] = {}
+
+
+def register_adapter(name: str, adapter_cls: Type[ProviderAdapter]) -> None:
+    """Register an adapter class for a provider name"""
+    _ADAPTERS[name.lower()] = adapter_cls
+
+
+def register_openai_compatible(name: str, api_url: str, display_name: Optional[str] = None) -> None:
+    """Register a provider that speaks the OpenAI Chat Completions API"""
+    adapter_cls = type(
+        f"{name.title()}Adapter",
+        (OpenAICompatibleAdapter,),
+        {"display_name": display_name or name, "default_url": api_url},
+    )
+    register_adapter(name, adapter_cls)
+
+
+def get_adapter_class(name: str) -> Optional[Type[ProviderAdapter]]:
+    return _ADAPTERS.get(name.lower())
+
+
+def registered_providers() -> list:
+    return sorted(_ADAPTERS)
+
+
+def create_adapter(provider, model_id: str, config: Optional[Dict[str, Any]] = None) -> Optional[ProviderAdapter]:
+    """Build the adapter for an AIProvider row, or None if the provider is unsupported"""
+    if provider is None:
+        return None
+    adapter_cls = get_adapter_class(provider.name)
+    if adapter_cls is None:
+        return None
+    return adapter_cls(provider.api_key, model_id, config, getattr(provider, 'api_url', None), getattr(provider, 'api_keys', None))
+
+
+register_adapter('openai', OpenAIAdapter)
+register_adapter('anthropic', AnthropicAdapter)
+register_adapter('gemini', GeminiAdapter)
+register_adapter('deepseek', DeepSeekAdapter)
+register_adapter('mistral', MistralAdapter)
+register_adapter('openrouter', OpenRouterAdapter)
+
+# Extra OpenAI-compatible providers from the environment, e.g.
+# OPENAI_COMPATIBLE_PROVIDERS="groq=https://api.groq.com/openai/v1/chat/completions"
+for _entry in filter(None, (e.strip() for e in os.getenv("OPENAI_COMPATIBLE_PROVIDERS", "").split(","))):
+    _name, _, _url = _entry.partition("=")
+    if _name and _url:
+        register_openai_compatible(_name.strip(), _url.strip())
+    else:
+        logger.warning(f"Ignoring malformed OPENAI_COMPATIBLE_PROVIDERS entry: {_entry}")
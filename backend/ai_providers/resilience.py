@@ -0,0 +1,265 @@
+import asyncio
+import collections
+import logging
+import os
+import time
+from typing import AsyncIterator, Deque, Dict, List, Optional, Sequence, Tuple
+
+import aiohttp
+
+from ai_providers.adapters import ProviderAdapter
+from ai_providers.errors import ProviderError
+from ai_providers.scheduler import PRIORITY_INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+# A backup request is fired once the primary has taken longer than this latency percentile
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+# ... but never sooner than this many seconds, and at most this late
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "2"))
+HEDGE_MAX_DELAY = float(os.getenv("HEDGE_MAX_DELAY", "15"))
+# Circuit breaker: open when, over the last BREAKER_WINDOW calls (at least BREAKER_MIN_CALLS),
+# the failure rate exceeds BREAKER_ERROR_RATE or the median latency exceeds BREAKER_SLOW_SECONDS
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_SECONDS = float(os.getenv("BREAKER_SLOW_SECONDS", "25"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+
+# Latency samples kept per provider for the hedge percentile
+_LATENCY_SAMPLES = 200
+
+
+class CircuitOpenError(ProviderError):
+    """Raised without calling upstream when every provider in a chain is marked unhealthy"""
+
+    def __init__(self, provider: str):
+        super().__init__(provider, 503, "temporarily skipped after repeated failures")
+
+
+class ProviderHealth:
+    """
+    Latency samples and a circuit breaker for one provider.
+
+    closed: calls go through. open: calls are skipped until the cooldown has
+    passed. half-open: a single probe call is let through, and its outcome
+    closes or re-opens the breaker.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probing = False
+        self.outcomes: Deque[Tuple[bool, float]] = collections.deque(maxlen=BREAKER_WINDOW)
+        self.latencies: Deque[float] = collections.deque(maxlen=_LATENCY_SAMPLES)
+        self.successes = 0
+        self.failures = 0
+        self.skipped = 0
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < BREAKER_COOLDOWN:
+                self.skipped += 1
+                return False
+            self.state = "half_open"
+            self.probing = False
+        if self.state == "half_open":
+            if self.probing:
+                self.skipped += 1
+                return False
+            self.probing = True
+        return True
+
+    def record(self, success: bool, latency: float) -> None:
+        if success:
+            self.successes += 1
+            self.latencies.append(latency)
+        else:
+            self.failures += 1
+        if self.state == "half_open":
+            self.probing = False
+            if success:
+                self._close()
+            else:
+                self._open()
+            return
+        self.outcomes.append((success, latency))
+        if self.state == "closed" and len(self.outcomes) >= BREAKER_MIN_CALLS:
+            failed = sum(1 for ok, _ in self.outcomes if not ok)
+            latencies = sorted(lat for _, lat in self.outcomes)
+            median = latencies[len(latencies) // 2]
+            if failed / len(self.outcomes) > BREAKER_ERROR_RATE or median > BREAKER_SLOW_SECONDS:
+                self._open()
+
+    def release_probe(self) -> None:
+        """A half-open probe was cancelled before it finished; let the next call probe"""
+        if self.state == "half_open":
+            self.probing = False
+
+    def _open(self) -> None:
+        logger.warning(f"Circuit for {self.name} opened; skipping it for {BREAKER_COOLDOWN:g}s")
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+
+    def _close(self) -> None:
+        logger.info(f"Circuit for {self.name} closed again")
+        self.state = "closed"
+        self.outcomes.clear()
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait on this provider before firing a backup request"""
+        if len(self.latencies) < BREAKER_MIN_CALLS:
+            return HEDGE_MAX_DELAY
+        latencies = sorted(self.latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * HEDGE_PERCENTILE / 100))
+        return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, latencies[index]))
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "state": self.state,
+            "successes": self.successes,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "hedge_delay": round(self.hedge_delay(), 3),
+        }
+
+
+_health: Dict[str, ProviderHealth] = {}
+
+
+def get_health(provider: str) -> ProviderHealth:
+    health = _health.get(provider)
+    if health is None:
+        health = _health[provider] = ProviderHealth(provider)
+    return health
+
+
+def health_stats() -> Dict[str, Dict[str, object]]:
+    return {name: health.stats() for name, health in list(_health.items())}
+
+
+def _counts_against_provider(error: BaseException) -> bool:
+    """Outages, overload and timeouts trip the breaker; a rejected request does not"""
+    if isinstance(error, ProviderError):
+        return error.status >= 500 or error.status in (408, 429)
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+async def _timed_complete(adapter: ProviderAdapter, messages: List[Dict[str, str]], priority: int) -> str:
+    health = get_health(adapter.limit_key)
+    start = time.monotonic()
+    try:
+        reply = await adapter.complete(messages, priority)
+    except asyncio.CancelledError:
+        health.release_probe()
+        raise
+    except Exception as e:
+        if _counts_against_provider(e):
+            health.record(False, time.monotonic() - start)
+        else:
+            health.release_probe()
+        raise
+    health.record(True, time.monotonic() - start)
+    return reply
+
+
+def _next_healthy(candidates: List[ProviderAdapter]) -> Optional[ProviderAdapter]:
+    """Pop adapters off the chain until one whose breaker lets a call through"""
+    while candidates:
+        adapter = candidates.pop(0)
+        if get_health(adapter.limit_key).allow():
+            return adapter
+    return None
+
+
+async def complete_with_failover(chain: Sequence[ProviderAdapter], messages: List[Dict[str, str]],
+                                 priority: int = PRIORITY_INTERACTIVE) -> Tuple[str, ProviderAdapter]:
+    """
+    Ask the first healthy adapter of a fallback chain. A failure moves on to
+    the next one at once; a primary slower than its hedge delay gets a backup
+    request to the next one in parallel. The first success wins and the
+    other requests are cancelled. Returns the reply and the adapter that
+    produced it.
+    """
+    candidates = list(chain)
+    pending: Dict[asyncio.Task, ProviderAdapter] = {}
+    last_error: Optional[BaseException] = None
+
+    def launch() -> bool:
+        adapter = _next_healthy(candidates)
+        if adapter is None:
+            return False
+        pending[asyncio.ensure_future(_timed_complete(adapter, messages, priority))] = adapter
+        return True
+
+    if not launch():
+        raise CircuitOpenError(chain[0].display_name)
+    try:
+        while pending:
+            # Only hedge while there is somewhere left to hedge to
+            newest = list(pending.values())[-1]
+            timeout = get_health(newest.limit_key).hedge_delay() if candidates else None
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if launch():
+                    logger.info(f"{newest.display_name} is slow; hedged with {list(pending.values())[-1].display_name}")
+                continue
+            for task in done:
+                adapter = pending.pop(task)
+                if task.exception() is None:
+                    return task.result(), adapter
+                last_error = task.exception()
+                logger.warning(f"{adapter.display_name} failed ({last_error}); trying the next fallback")
+            if not pending:
+                launch()
+        raise last_error or CircuitOpenError(chain[0].display_name)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def stream_with_failover(chain: Sequence[ProviderAdapter], messages: List[Dict[str, str]],
+                               priority: int = PRIORITY_INTERACTIVE,
+                               served_by: Optional[List[ProviderAdapter]] = None) -> AsyncIterator[str]:
+    """
+    Stream from the first healthy adapter, moving down the chain only until
+    the first delta arrives. The adapter that streams is appended to
+    served_by, if given.
+    """
+    candidates = list(chain)
+    last_error: Optional[BaseException] = None
+    while True:
+        adapter = _next_healthy(candidates)
+        if adapter is None:
+            raise last_error or CircuitOpenError(chain[0].display_name)
+        health = get_health(adapter.limit_key)
+        start = time.monotonic()
+        started = False
+        try:
+            async for delta in adapter.stream(messages, priority):
+                if not started:
+                    started = True
+                    health.record(True, time.monotonic() - start)
+                    if served_by is not None:
+                        served_by.append(adapter)
+                yield delta
+            if not started:
+                health.record(True, time.monotonic() - start)
+            return
+        except (asyncio.CancelledError, GeneratorExit):
+            if not started:
+                health.release_probe()
+            raise
+        except Exception as e:
+            if started:
+                raise
+            if _counts_against_provider(e):
+                health.record(False, time.monotonic() - start)
+            else:
+                health.release_probe()
+            if not candidates:
+                raise
+            last_error = e
+            logger.warning(f"{adapter.display_name} stream failed ({e}); trying the next fallback")
@@ -0,0 +1,381 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+import aiohttp
+
+from ai_providers.errors import ProviderError
+from observability import registry
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first: commands typed by a user beat background work
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+# Defaults for every provider; PROVIDER_LIMITS overrides them per provider, e.g.
+# PROVIDER_LIMITS='{"openrouter": {"concurrency": 4, "rate": 2, "burst": 4}}'
+PROVIDER_MAX_CONCURRENCY = int(os.getenv("PROVIDER_MAX_CONCURRENCY", "16"))
+PROVIDER_KEY_MAX_CONCURRENCY = int(os.getenv("PROVIDER_KEY_MAX_CONCURRENCY", "8"))
+PROVIDER_RATE_PER_SECOND = float(os.getenv("PROVIDER_RATE_PER_SECOND", "10"))
+PROVIDER_RATE_BURST = int(os.getenv("PROVIDER_RATE_BURST", "20"))
+PROVIDER_MAX_RETRIES = int(os.getenv("PROVIDER_MAX_RETRIES", "3"))
+PROVIDER_RETRY_BASE_DELAY = float(os.getenv("PROVIDER_RETRY_BASE_DELAY", "0.5"))
+# A Retry-After longer than this is not waited out; the error goes to the user
+PROVIDER_RETRY_MAX_DELAY = float(os.getenv("PROVIDER_RETRY_MAX_DELAY", "30"))
+
+try:
+    _LIMIT_OVERRIDES: Dict[str, Dict[str, float]] = {
+        name.lower(): limits for name, limits in json.loads(os.getenv("PROVIDER_LIMITS", "") or "{}").items()
+    }
+except ValueError:
+    logger.warning("Ignoring malformed PROVIDER_LIMITS")
+    _LIMIT_OVERRIDES = {}
+
+# Statuses that say the request was refused before any work was done: rate limited or overloaded.
+# Other failures may come after the provider ran (and billed) the request, so they go to failover instead.
+RETRYABLE_STATUSES = frozenset({429, 503, 529})
+# Failures to connect, so the request was never sent
+RETRYABLE_ERRORS = (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError)
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Seconds to wait according to Retry-After / retry-after-ms, if present"""
+    if headers is None:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Parse reset values such as "1s", "6m0s", "250ms", "1.5" or an RFC 3339 timestamp"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    if "T" in value:
+        try:
+            reset = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            return max(0.0, (reset - datetime.now(timezone.utc)).total_seconds())
+        except ValueError:
+            return None
+    total, number = 0.0, ""
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    i = 0
+    while i < len(value):
+        ch = value[i]
+        if ch.isdigit() or ch == ".":
+            number += ch
+            i += 1
+            continue
+        unit = "ms" if value.startswith("ms", i) else ch
+        if unit not in units or not number:
+            return None
+        total += float(number) * units[unit]
+        number = ""
+        i += len(unit)
+    return total if not number else None
+
+
+def parse_rate_limit_reset(headers) -> Optional[float]:
+    """
+    Seconds until the request quota refills when the provider reports it is
+    exhausted (OpenAI-style x-ratelimit-* or anthropic-ratelimit-* headers)
+    """
+    if headers is None:
+        return None
+    for prefix in ("x-ratelimit-", "anthropic-ratelimit-"):
+        remaining = headers.get(f"{prefix}remaining-requests")
+        if remaining is None:
+            continue
+        try:
+            if int(float(remaining)) > 0:
+                return None
+        except ValueError:
+            continue
+        reset = headers.get(f"{prefix}reset-requests")
+        if reset:
+            return _parse_duration(reset.strip())
+    return None
+
+
+class PrioritySemaphore:
+    """Semaphore whose waiters are woken lowest priority value first, FIFO within a priority"""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: list = []
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE) -> None:
+        if self._value > 0 and not self.waiting:
+            self._value -= 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # The slot was handed over just as we got cancelled: pass it on
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._value += 1
+
+
+class TokenBucket:
+    """Request rate limiter that can also be paused when the provider says so"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            if self.rate <= 0:
+                return
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _Gate:
+    """Concurrency slots (and, per API key, a rate bucket) plus counters"""
+
+    def __init__(self, concurrency: int, bucket: Optional[TokenBucket] = None):
+        self.semaphore = PrioritySemaphore(concurrency)
+        self.bucket = bucket
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+
+
+class ProviderScheduler:
+    """
+    Admission of provider requests for one event loop.
+
+    Each provider has a concurrency limit, and each API key of a provider has
+    its own concurrency limit and token bucket. Waiters are served by priority.
+    Only requests the provider cannot have processed are retried: 429, 503
+    and 529 responses and failures to connect. Retries use jittered
+    exponential backoff, honouring Retry-After; a 429 or an exhausted
+    rate-limit header pauses the key's bucket for everyone.
+    """
+
+    def __init__(self):
+        self._providers: Dict[str, _Gate] = {}
+        self._keys: Dict[Tuple[str, str], _Gate] = {}
+
+    @staticmethod
+    def limits(provider: str) -> Dict[str, float]:
+        limits = {
+            "concurrency": PROVIDER_MAX_CONCURRENCY,
+            "key_concurrency": PROVIDER_KEY_MAX_CONCURRENCY,
+            "rate": PROVIDER_RATE_PER_SECOND,
+            "burst": PROVIDER_RATE_BURST,
+        }
+        limits.update(_LIMIT_OVERRIDES.get(provider, {}))
+        return limits
+
+    def _gates(self, provider: str, api_key: str) -> Tuple[_Gate, _Gate]:
+        gate = self._providers.get(provider)
+        if gate is None:
+            gate = self._providers[provider] = _Gate(int(self.limits(provider)["concurrency"]))
+        key_gate = self._keys.get((provider, api_key))
+        if key_gate is None:
+            limits = self.limits(provider)
+            key_gate = self._keys[(provider, api_key)] = _Gate(
+                int(limits["key_concurrency"]), TokenBucket(float(limits["rate"]), int(limits["burst"])),
+            )
+        return gate, key_gate
+
+    @asynccontextmanager
+    async def slot(self, provider: str, api_key: str, priority: int = PRIORITY_INTERACTIVE):
+        """Hold one provider slot and one key slot, after taking a rate token"""
+        gate, key_gate = self._gates(provider, api_key)
+        await gate.semaphore.acquire(priority)
+        try:
+            await key_gate.semaphore.acquire(priority)
+            try:
+                await key_gate.bucket.acquire()
+                gate.in_flight += 1
+                gate.requests += 1
+                key_gate.in_flight += 1
+                try:
+                    yield
+                finally:
+                    gate.in_flight -= 1
+                    key_gate.in_flight -= 1
+            finally:
+                key_gate.semaphore.release()
+        finally:
+            gate.semaphore.release()
+
+    def key_load(self, provider: str, api_key: str) -> Tuple[bool, int]:
+        """(rate limit paused, requests running or waiting) for one key"""
+        key_gate = self._keys.get((provider, api_key))
+        if key_gate is None:
+            return False, 0
+        paused = key_gate.bucket.paused_until > time.monotonic()
+        return paused, key_gate.in_flight + key_gate.semaphore.waiting
+
+    def observe(self, provider: str, api_key: str, headers) -> None:
+        """Pause the key's bucket when a response says the quota is used up"""
+        reset = parse_rate_limit_reset(headers)
+        if reset:
+            _, key_gate = self._gates(provider, api_key)
+            key_gate.bucket.pause(min(reset, PROVIDER_RETRY_MAX_DELAY))
+
+    def _retry_delay(self, provider: str, api_key: str, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None if the error is final"""
+        if attempt >= PROVIDER_MAX_RETRIES:
+            return None
+        retry_after = None
+        if isinstance(error, ProviderError):
+            # An exhausted quota is not waited out; the key pool moves on to another key
+            if error.status not in RETRYABLE_STATUSES or error.key_rejection:
+                return None
+            retry_after = error.retry_after
+        elif not isinstance(error, RETRYABLE_ERRORS):
+            return None
+        gate, key_gate = self._gates(provider, api_key)
+        gate.retries += 1
+        if retry_after is not None:
+            if retry_after > PROVIDER_RETRY_MAX_DELAY:
+                return None
+            gate.throttled += 1
+            key_gate.bucket.pause(retry_after)
+            return retry_after
+        if isinstance(error, ProviderError) and error.status == 429:
+            gate.throttled += 1
+        # Full jitter keeps retrying clients from synchronising
+        return random.uniform(0, min(PROVIDER_RETRY_MAX_DELAY, PROVIDER_RETRY_BASE_DELAY * 2 ** attempt))
+
+    async def run(self, provider: str, api_key: str, call: Callable[[], Awaitable[Any]],
+                  priority: int = PRIORITY_INTERACTIVE) -> Any:
+        """Run one request under the provider's limits, retrying transient failures"""
+        attempt = 0
+        while True:
+            try:
+                async with self.slot(provider, api_key, priority):
+                    return await call()
+            except Exception as e:
+                delay = self._retry_delay(provider, api_key, e, attempt)
+                if delay is None:
+                    raise
+                logger.warning(f"{provider} request failed ({e}); retry {attempt + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def stream(self, provider: str, api_key: str, open_stream: Callable[[], AsyncIterator[str]],
+                     priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[str]:
+        """Like run() for token streams; only retried until the first delta arrives"""
+        attempt = 0
+        while True:
+            started = False
+            try:
+                async with self.slot(provider, api_key, priority):
+                    async for delta in open_stream():
+                        started = True
+                        yield delta
+                return
+            except Exception as e:
+                delay = None if started else self._retry_delay(provider, api_key, e, attempt)
+                if delay is None:
+                    raise
+                logger.warning(f"{provider} stream failed ({e}); retry {attempt + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            provider: {
+                "in_flight": gate.in_flight,
+                "waiting": gate.semaphore.waiting,
+                "requests": gate.requests,
+                "retries": gate.retries,
+                "throttled": gate.throttled,
+            }
+            for provider, gate in self._providers.items()
+        }
+
+
+# One scheduler per event loop, like the shared HTTP session
+_schedulers: Dict[asyncio.AbstractEventLoop, ProviderScheduler] = {}
+
+
+def get_scheduler() -> ProviderScheduler:
+    """Return the provider scheduler for the running event loop"""
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        scheduler = _schedulers[loop] = ProviderScheduler()
+    return scheduler
+
+
+def scheduler_stats() -> Dict[str, Dict[str, int]]:
+    """Counters of every provider across all event loops"""
+    totals: Dict[str, Dict[str, int]] = {}
+    for scheduler in list(_schedulers.values()):
+        for provider, stats in scheduler.stats().items():
+            merged = totals.setdefault(provider, dict.fromkeys(stats, 0))
+            for name, value in stats.items():
+                merged[name] += value
+    return totals
+
+
+def _gauge_callback(stat: str):
+    return lambda: [((provider,), stats[stat]) for provider, stats in scheduler_stats().items()]
+
+
+registry.gauge("dae_provider_requests_in_flight", "Provider requests currently being sent", ("provider",)).add_callback(_gauge_callback("in_flight"))
+registry.gauge("dae_provider_requests_waiting", "Provider requests waiting for a concurrency slot", ("provider",)).add_callback(_gauge_callback("waiting"))
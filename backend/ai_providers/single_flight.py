@@ -0,0 +1,80 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Share one upstream request between concurrent identical completions
+PROVIDER_COALESCE_REQUESTS = os.getenv("PROVIDER_COALESCE_REQUESTS", "true").lower() in ("1", "true", "yes")
+
+
+def request_fingerprint(api_key: str, url: str, body: Dict[str, Any]) -> str:
+    """sha256 of the key, endpoint and JSON body; equal fingerprints get the same answer"""
+    payload = json.dumps([api_key, url, body], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same fingerprint into one task.
+
+    The first caller starts the task; callers arriving while it runs await
+    the same result. The task is shielded from any single caller being
+    cancelled and is only cancelled once every caller has gone away.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, Tuple[asyncio.Task, list]] = {}
+        self.flights = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(call())
+            flight = (task, [0])
+            self._flights[key] = flight
+            self.flights += 1
+            task.add_done_callback(lambda _: self._land(key, flight))
+        else:
+            self.coalesced += 1
+        task, waiters = flight
+        waiters[0] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and waiters[0] == 1:
+                task.cancel()
+            raise
+        finally:
+            waiters[0] -= 1
+
+    def _land(self, key: str, flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._flights), "flights": self.flights, "coalesced": self.coalesced}
+
+
+# One coalescer per event loop, like the scheduler and HTTP session
+_single_flights: Dict[asyncio.AbstractEventLoop, SingleFlight] = {}
+
+
+def get_single_flight() -> SingleFlight:
+    loop = asyncio.get_running_loop()
+    single_flight = _single_flights.get(loop)
+    if single_flight is None:
+        single_flight = _single_flights[loop] = SingleFlight()
+    return single_flight
+
+
+def single_flight_stats() -> Dict[str, int]:
+    totals = {"in_flight": 0, "flights": 0, "coalesced": 0}
+    for single_flight in list(_single_flights.values()):
+        for name, value in single_flight.stats().items():
+            totals[name] += value
+    return totals
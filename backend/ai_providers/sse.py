@@ -0,0 +1,30 @@
+import json
+from typing import Any, AsyncIterator, Dict
+
+import aiohttp
+
+
+async def iter_sse_events(resp: aiohttp.ClientResponse) -> AsyncIterator[Dict[str, Any]]:
+    """Yield the JSON payload of each `data:` event in a server-sent event stream"""
+    data_lines = []
+    async for raw in resp.content:
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
+            continue
+        if line or not data_lines:
+            # event:/id:/comment lines, or a blank line with nothing buffered
+            continue
+        data = "\n".join(data_lines)
+        data_lines = []
+        if data == "[DONE]":
+            return
+        try:
+            yield json.loads(data)
+        except ValueError:
+            continue
+    if data_lines and data_lines != ["[DONE]"]:
+        try:
+            yield json.loads("\n".join(data_lines))
+        except ValueError:
+            pass
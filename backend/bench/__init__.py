@@ -0,0 +1 @@
+# Offline load-testing harness: python -m bench.run --help
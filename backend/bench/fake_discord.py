@@ -0,0 +1,86 @@
+import asyncio
+import itertools
+from typing import List, Optional
+
+# Ids handed out to fake messages, channels and users
+_ids = itertools.count(1_000_000)
+
+
+class FakeMessage:
+    """A sent message that can be edited and deleted like discord.Message"""
+
+    def __init__(self, channel: "FakeChannel", content: str):
+        self.id = next(_ids)
+        self.channel = channel
+        self.content = content
+        self.deleted = False
+
+    async def edit(self, content: str = None, **kwargs) -> "FakeMessage":
+        await self.channel.api_call()
+        self.channel.edits += 1
+        if content is not None:
+            self.content = content
+        return self
+
+    async def delete(self) -> None:
+        await self.channel.api_call()
+        self.deleted = True
+
+
+class FakeChannel:
+    """
+    Records what the bot sends instead of talking to Discord. Every API call
+    takes api_latency seconds, roughly a REST round trip to Discord.
+    """
+
+    def __init__(self, api_latency: float = 0.03, keep_messages: bool = False):
+        self.id = next(_ids)
+        self.api_latency = api_latency
+        self.keep_messages = keep_messages
+        self.messages: List[FakeMessage] = []
+        self.sends = 0
+        self.edits = 0
+
+    async def api_call(self) -> None:
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+
+    async def send(self, content: str = None, **kwargs) -> FakeMessage:
+        await self.api_call()
+        self.sends += 1
+        message = FakeMessage(self, content or "")
+        # Long runs would otherwise hold every reply in memory and skew the memory numbers
+        if self.keep_messages:
+            self.messages.append(message)
+        return message
+
+
+class FakeAuthor:
+    def __init__(self, user_id: Optional[int] = None, name: str = "bench-user"):
+        self.id = user_id if user_id is not None else next(_ids)
+        self.name = name
+        self.mention = f"<@{self.id}>"
+        self.bot = False
+
+
+class FakeContext:
+    """
+    The parts of commands.Context a model command touches: channel, author
+    and send(). Outcome flags are derived from the bot's replies.
+    """
+
+    def __init__(self, channel: FakeChannel, author: FakeAuthor):
+        self.channel = channel
+        self.author = author
+        self.last_text = ""
+        self.failed = False
+        self.rejected = False
+
+    async def send(self, content: str = None, **kwargs) -> FakeMessage:
+        text = content or ""
+        if text.startswith("Busy right now"):
+            self.rejected = True
+        elif text.startswith("An error occurred") or " API error: " in text or text.startswith("Unsupported provider"):
+            self.failed = True
+        self.last_text = text
+        return await self.channel.send(content, **kwargs)
@@ -0,0 +1,227 @@
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# Benchmarks never touch the database: conversation memory and the response cache stay in process
+os.environ["MEMORY_BACKEND"] = "memory"
+os.environ["RESPONSE_CACHE_SQL"] = "false"
+
+from bot_runtime import BotRuntime
+from bench.fake_discord import FakeAuthor, FakeChannel, FakeContext
+from bench.mock_provider import MockConfig, MockProvider
+from discord_bots.bot_manager import DaeBotManager
+from discord_bots.model_commands import build_command_spec
+
+# Bot id the benchmark registers its commands under; shows up in /metrics and the request log
+BENCH_BOT_ID = 0
+BENCH_PROVIDERS = ("openai", "anthropic", "gemini")
+
+
+@dataclass
+class BenchRequest:
+    """One command to fire offset seconds after the run starts; no command means plain chatter"""
+    offset: float
+    command: Optional[str]
+    prompt: str
+    user: int = 0
+
+
+@dataclass
+class BenchResult:
+    latency: float
+    failed: bool
+    rejected: bool
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def rss_mb() -> float:
+    """Resident set size of this process in MiB (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a sleeping task: the delay every other task also sees"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - expected))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+@dataclass
+class BenchTarget:
+    """
+    A DaeBotManager wired to the mock provider, with one model command per
+    provider (!openai, !anthropic, !gemini) or, given commands, one per
+    command name mapped to the provider serving it. drive() fires a schedule of
+    requests at the real custom_model_command handlers through fake Discord
+    contexts and reports latency, throughput, loop lag and memory growth.
+    """
+
+    mock_config: MockConfig = field(default_factory=MockConfig)
+    providers: Sequence[str] = BENCH_PROVIDERS
+    commands: Optional[Dict[str, str]] = None
+    stream: bool = False
+    discord_latency: float = 0.03
+    track_allocations: bool = False
+
+    def __post_init__(self):
+        self.mock = MockProvider(self.mock_config)
+        # The mock gets its own loop thread so it doesn't show up in the bot loop's lag
+        self.mock_runtime = BotRuntime("mock-provider")
+        self.manager: Optional[DaeBotManager] = None
+        self.handlers: Dict[str, Any] = {}
+        self.channels: Dict[int, FakeChannel] = {}
+        self.authors: Dict[int, FakeAuthor] = {}
+
+    async def setup(self) -> None:
+        await self.mock_runtime.run(self.mock.start())
+        self.manager = DaeBotManager()
+        specs = {}
+        persona = json.dumps({"behavior": "You are a concise benchmark assistant.", "stream": self.stream})
+        for command, provider in (self.commands or {p: p for p in self.providers}).items():
+            integration = SimpleNamespace(bot_id=BENCH_BOT_ID, command=f"!{command}", cache_ttl=0)
+            model = SimpleNamespace(name=f"bench-{provider}", model_id="mock-model", configuration=persona)
+            provider_row = SimpleNamespace(name=provider, api_key="bench-key", api_url=self.mock.url(provider, "mock-model"))
+            spec = build_command_spec(integration, model, provider_row)
+            specs[spec.command_name] = spec
+        self.manager.command_specs[BENCH_BOT_ID] = specs
+        self.handlers = {name: self.manager.make_model_command(BENCH_BOT_ID, name) for name in specs}
+
+    async def teardown(self) -> None:
+        from ai_providers import close_session
+        await close_session()
+        await self.mock_runtime.run(self.mock.stop())
+        self.mock_runtime.stop()
+
+    def _context(self, user: int) -> FakeContext:
+        # One channel and author per simulated user, so conversation memory builds up like it would live
+        channel = self.channels.get(user)
+        if channel is None:
+            channel = self.channels[user] = FakeChannel(self.discord_latency)
+            self.authors[user] = FakeAuthor(user)
+        return FakeContext(channel, self.authors[user])
+
+    async def _chatter(self, request: BenchRequest) -> None:
+        # What on_message does with a non-command message
+        ctx = self._context(request.user)
+        key = self.manager.get_memory_key(ctx.channel.id, ctx.author.id)
+        await self.manager.memory.append_existing(key, "user", request.prompt)
+
+    async def _one(self, request: BenchRequest) -> BenchResult:
+        handler = self.handlers.get(request.command.lstrip("!"))
+        if handler is None:
+            handler = next(iter(self.handlers.values()))
+        ctx = self._context(request.user)
+        started = time.perf_counter()
+        try:
+            await handler(ctx, prompt=request.prompt)
+        except Exception:
+            ctx.failed = True
+        return BenchResult(time.perf_counter() - started, ctx.failed, ctx.rejected)
+
+    async def drive(self, schedule: Iterable[BenchRequest], speed: float = 1.0) -> Dict[str, Any]:
+        """Fire every request at its offset (divided by speed) without waiting for earlier ones: an open-loop load"""
+        loop = asyncio.get_running_loop()
+        if self.track_allocations:
+            tracemalloc.start()
+        rss_start = rss_mb()
+        lag = LoopLagMonitor()
+        lag.start()
+        tasks = []
+        started = loop.time()
+        for request in schedule:
+            delay = started + request.offset / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if request.command is None:
+                await self._chatter(request)
+            else:
+                tasks.append(asyncio.create_task(self._one(request)))
+        results: List[BenchResult] = await asyncio.gather(*tasks)
+        duration = loop.time() - started
+        await lag.stop()
+        rss_end = rss_mb()
+        report = self.report(results, duration, lag.lags)
+        report["memory_mb"] = {
+            "rss_start": round(rss_start, 1),
+            "rss_end": round(rss_end, 1),
+            "growth": round(rss_end - rss_start, 1),
+        }
+        if self.track_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            report["memory_mb"].update(traced=round(current / 2 ** 20, 2), traced_peak=round(peak / 2 ** 20, 2))
+        return report
+
+    def report(self, results: List[BenchResult], duration: float, lags: List[float]) -> Dict[str, Any]:
+        served = sorted(r.latency for r in results if not r.rejected and not r.failed)
+        lags = sorted(lags)
+        ms = lambda value: round(value * 1000, 1)
+        return {
+            "requests": len(results),
+            "ok": len(served),
+            "failed": sum(1 for r in results if r.failed),
+            "rejected": sum(1 for r in results if r.rejected),
+            "duration_s": round(duration, 2),
+            "throughput_rps": round(len(served) / duration, 2) if duration else 0.0,
+            "latency_ms": {
+                "p50": ms(percentile(served, 50)),
+                "p95": ms(percentile(served, 95)),
+                "p99": ms(percentile(served, 99)),
+                "max": ms(served[-1]) if served else 0.0,
+            },
+            "loop_lag_ms": {
+                "p50": ms(percentile(lags, 50)),
+                "p99": ms(percentile(lags, 99)),
+                "max": ms(lags[-1]) if lags else 0.0,
+            },
+            "provider": self.mock.stats(),
+            "discord": {
+                "sends": sum(c.sends for c in self.channels.values()),
+                "edits": sum(c.edits for c in self.channels.values()),
+            },
+        }
+
+
+async def run_bench(target: BenchTarget, schedule: Iterable[BenchRequest], speed: float = 1.0) -> Dict[str, Any]:
+    await target.setup()
+    try:
+        return await target.drive(schedule, speed)
+    finally:
+        await target.teardown()
@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+import re
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# "[reply:1200]" in a prompt asks for an answer of about that many characters instead of reply_tokens words
+REPLY_HINT = re.compile(r"\[reply:(\d+)\]")
+
+
+@dataclass
+class MockConfig:
+    """Behaviour of the mock provider; every field can be changed while it runs"""
+    latency_ms: float = 300.0       # time to a full (non-streamed) answer
+    jitter_ms: float = 100.0        # +/- uniform jitter added to every delay
+    first_token_ms: float = 150.0   # streamed answers: delay before the first token
+    token_interval_ms: float = 15.0
+    reply_tokens: int = 60          # words in every answer
+    error_rate: float = 0.0         # fraction of requests answered with error_status
+    error_status: int = 500
+    throttle_rate: float = 0.0      # fraction answered 429 with a Retry-After
+    retry_after: float = 1.0
+
+
+class MockProvider:
+    """
+    Local stand-in for the OpenAI, Anthropic and Gemini chat APIs.
+
+    Answers are canned words with realistic latency, token streaming,
+    injected errors and 429s, so the whole command path can be load-tested
+    offline. Point a provider's api_url at base_url + one of the paths below.
+    Prompts can size their answer with a REPLY_HINT.
+    """
+
+    OPENAI_PATH = "/v1/chat/completions"
+    ANTHROPIC_PATH = "/v1/messages"
+    GEMINI_PATH = "/v1beta/models/{model}:generateContent"
+
+    def __init__(self, config: Optional[MockConfig] = None):
+        self.config = config or MockConfig()
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.app = web.Application()
+        self.app.router.add_post(self.OPENAI_PATH, self.openai)
+        self.app.router.add_post(self.ANTHROPIC_PATH, self.anthropic)
+        self.app.router.add_post("/v1beta/models/{action}", self.gemini)
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    def url(self, provider: str, model: str = "mock") -> str:
+        """Endpoint to use as the api_url of a provider named openai, anthropic or gemini"""
+        if provider == "anthropic":
+            return self.base_url + self.ANTHROPIC_PATH
+        if provider == "gemini":
+            return self.base_url + self.GEMINI_PATH.format(model=model)
+        return self.base_url + self.OPENAI_PATH
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        port = self._runner.addresses[0][1]
+        self.base_url = f"http://{host}:{port}"
+        logger.info(f"Mock provider listening on {self.base_url}")
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # --- behaviour -------------------------------------------------------
+
+    def _delay(self, ms: float) -> float:
+        jitter = self.config.jitter_ms
+        return max(0.0, ms + random.uniform(-jitter, jitter)) / 1000
+
+    def _failure(self) -> Optional[web.Response]:
+        self.requests += 1
+        roll = random.random()
+        if roll < self.config.throttle_rate:
+            self.throttled += 1
+            return web.json_response({"error": {"message": "rate limited"}}, status=429,
+                                     headers={"retry-after": str(self.config.retry_after)})
+        if roll < self.config.throttle_rate + self.config.error_rate:
+            self.errors += 1
+            return web.json_response({"error": {"message": "mock failure"}}, status=self.config.error_status)
+        return None
+
+    def _words(self, raw: str) -> list:
+        # The latest prompt comes last in every API's body, so its hint is the last match
+        hints = REPLY_HINT.findall(raw)
+        count = max(1, round(int(hints[-1]) / 7)) if hints else self.config.reply_tokens
+        return [f"word{i}" for i in range(count)]
+
+    @staticmethod
+    def _prompt_tokens(messages) -> int:
+        return sum(len(str(m.get("content", ""))) for m in messages) // 4
+
+    async def _stream(self, request: web.Request, events) -> web.StreamResponse:
+        resp = web.StreamResponse(headers={"content-type": "text/event-stream"})
+        await resp.prepare(request)
+        await asyncio.sleep(self._delay(self.config.first_token_ms))
+        first = True
+        for event in events:
+            if not first:
+                await asyncio.sleep(self.config.token_interval_ms / 1000)
+            first = False
+            payload = event if isinstance(event, str) else json.dumps(event)
+            await resp.write(f"data: {payload}\n\n".encode("utf-8"))
+        await resp.write_eof()
+        return resp
+
+    # --- APIs ------------------------------------------------------------
+
+    async def openai(self, request: web.Request) -> web.StreamResponse:
+        raw = await request.text()
+        body = json.loads(raw)
+        failure = self._failure()
+        if failure is not None:
+            return failure
+        words = self._words(raw)
+        usage = {"prompt_tokens": self._prompt_tokens(body.get("messages", [])), "completion_tokens": len(words)}
+        if body.get("stream"):
+            events = [{"choices": [{"delta": {"content": word + " "}}]} for word in words]
+            events.append({"choices": [{"delta": {}}], "usage": usage})
+            events.append("[DONE]")
+            return await self._stream(request, events)
+        await asyncio.sleep(self._delay(self.config.latency_ms))
+        return web.json_response({"choices": [{"message": {"content": " ".join(words)}}], "usage": usage})
+
+    async def anthropic(self, request: web.Request) -> web.StreamResponse:
+        raw = await request.text()
+        body = json.loads(raw)
+        failure = self._failure()
+        if failure is not None:
+            return failure
+        words = self._words(raw)
+        input_tokens = self._prompt_tokens(body.get("messages", []))
+        if body.get("stream"):
+            events = [{"type": "message_start", "message": {"usage": {"input_tokens": input_tokens, "output_tokens": 1}}}]
+            events += [{"type": "content_block_delta", "delta": {"text": word + " "}} for word in words]
+            events.append({"type": "message_delta", "usage": {"output_tokens": len(words)}})
+            events.append({"type": "message_stop"})
+            return await self._stream(request, events)
+        await asyncio.sleep(self._delay(self.config.latency_ms))
+        return web.json_response({
+            "content": [{"type": "text", "text": " ".join(words)}],
+            "usage": {"input_tokens": input_tokens, "output_tokens": len(words)},
+        })
+
+    async def gemini(self, request: web.Request) -> web.StreamResponse:
+        raw = await request.text()
+        body = json.loads(raw)
+        failure = self._failure()
+        if failure is not None:
+            return failure
+        words = self._words(raw)
+        prompt_tokens = sum(len(p.get("text", "")) for c in body.get("contents", []) for p in c.get("parts", [])) // 4
+        if request.match_info["action"].endswith(":streamGenerateContent"):
+            events = [
+                {"candidates": [{"content": {"parts": [{"text": word + " "}]}}],
+                 "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": i + 1}}
+                for i, word in enumerate(words)
+            ]
+            return await self._stream(request, events)
+        await asyncio.sleep(self._delay(self.config.latency_ms))
+        return web.json_response({
+            "candidates": [{"content": {"parts": [{"text": " ".join(words)}]}}],
+            "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": len(words)},
+        })
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "errors": self.errors, "throttled": self.throttled}
+
+
+async def start_mock_provider(config: Optional[MockConfig] = None, host: str = "127.0.0.1",
+                              port: int = 0) -> Tuple[MockProvider, str]:
+    provider = MockProvider(config)
+    return provider, await provider.start(host, port)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the mock OpenAI/Anthropic/Gemini API for manual testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    provider = MockProvider(MockConfig(latency_ms=args.latency_ms, error_rate=args.error_rate))
+    web.run_app(provider.app, host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from bench.harness import BENCH_PROVIDERS, BenchRequest, BenchTarget, percentile, run_bench
+from bench.mock_provider import MockConfig
+from bench.run import check_gates, print_report
+from observability import read_traffic
+
+
+def filler(chars: int, seed: int) -> str:
+    """
+    Stand-in text of about chars characters (recordings keep sizes, never
+    text). Distinct seeds give distinct texts, so replayed prompts don't
+    collapse into coalesced or cached provider calls.
+    """
+    words = (chars + 6) // 7
+    return " ".join(f"t{(seed * 31 + i) % 99991:05d}" for i in range(words))[:max(chars, 1)]
+
+
+def load_recording(path: str, bot: Optional[int] = None, limit: Optional[int] = None,
+                   providers: Sequence[str] = BENCH_PROVIDERS) -> Tuple[List[BenchRequest], Dict[str, str], Dict[str, Any]]:
+    """
+    Turn a traffic recording into a bench schedule. Arrival times, prompt and
+    reply sizes and the (channel, user) mix are kept; every recorded command
+    is served by one of providers, round-robin. Returns the schedule, the
+    command -> provider map and a summary of what production saw.
+    """
+    events = [e for e in read_traffic(path) if bot is None or e.get("b") == bot]
+    # Worker processes append independently, so lines can be slightly out of order
+    events.sort(key=lambda e: e["t"])
+    if limit:
+        events = events[:limit]
+    if not events:
+        raise ValueError(f"No recorded events in {path}" + (f" for bot {bot}" if bot is not None else ""))
+    start = events[0]["t"]
+    users: Dict[Tuple[str, str], int] = {}
+    commands: Dict[str, str] = {}
+    next_provider = itertools.cycle(providers)
+    schedule = []
+    served_ms = []
+    for index, event in enumerate(events):
+        user = users.setdefault((event.get("ch"), event.get("u")), len(users))
+        prompt = filler(int(event.get("p", 0)), index)
+        if event.get("e") != "c":
+            schedule.append(BenchRequest(event["t"] - start, None, prompt, user))
+            continue
+        command = event.get("c") or "model"
+        if command not in commands:
+            commands[command] = next(next_provider)
+        # Failed runs recorded no reply; those get the mock's default answer size
+        if event.get("r"):
+            prompt = f"[reply:{event['r']}] {prompt}"
+        schedule.append(BenchRequest(event["t"] - start, f"!{command}", prompt, user))
+        if event.get("o") in ("ok", "cache_hit"):
+            served_ms.append(float(event.get("ms", 0.0)))
+    served_ms.sort()
+    recorded = {
+        "requests": sum(1 for r in schedule if r.command is not None),
+        "chatter": sum(1 for r in schedule if r.command is None),
+        "users": len(users),
+        "span_s": round(events[-1]["t"] - start, 2),
+        "latency_ms": {
+            "p50": round(percentile(served_ms, 50), 1),
+            "p95": round(percentile(served_ms, 95), 1),
+            "p99": round(percentile(served_ms, 99), 1),
+        },
+    }
+    return schedule, commands, recorded
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Replay recorded traffic (TRAFFIC_RECORD_PATH) against the mock provider, optionally sped up",
+    )
+    parser.add_argument("recording", help="traffic recording to replay")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="compress arrival times by this factor, e.g. 10 replays an hour in 6 minutes")
+    parser.add_argument("--bot", type=int, help="only replay this bot's traffic")
+    parser.add_argument("--limit", type=int, help="only replay the first N events")
+    parser.add_argument("--provider", action="append", choices=BENCH_PROVIDERS,
+                        help="provider APIs serving the recorded commands, repeatable (default: all)")
+    parser.add_argument("--stream", action="store_true", help="stream replies into edited messages")
+    parser.add_argument("--latency-ms", type=float, default=300, help="mock provider latency of a full answer")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--discord-ms", type=float, default=30, help="latency of every fake Discord API call")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report traced Python allocations (slower)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--fail-p95-ms", type=float, help="exit 1 if p95 latency exceeds this")
+    parser.add_argument("--fail-error-rate", type=float, help="exit 1 if the failed fraction exceeds this")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    schedule, commands, recorded = load_recording(args.recording, args.bot, args.limit,
+                                                  args.provider or list(BENCH_PROVIDERS))
+    target = BenchTarget(
+        mock_config=MockConfig(latency_ms=args.latency_ms, error_rate=args.error_rate,
+                               throttle_rate=args.throttle_rate),
+        commands=commands,
+        stream=args.stream,
+        discord_latency=args.discord_ms / 1000,
+        track_allocations=args.tracemalloc,
+    )
+    report = asyncio.run(run_bench(target, schedule, args.speed))
+    report["speed"] = args.speed
+    report["recorded"] = recorded
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"replayed   {recorded['requests']} commands, {recorded['chatter']} chatter messages from "
+              f"{recorded['users']} users over {recorded['span_s']}s at {args.speed:g}x")
+        print(f"recorded   p50 {recorded['latency_ms']['p50']}ms  p95 {recorded['latency_ms']['p95']}ms  "
+              f"p99 {recorded['latency_ms']['p99']}ms")
+        print_report(report)
+
+    check_gates(report, args.fail_p95_ms, args.fail_error_rate)
+
+
+if __name__ == "__main__":
+    main()
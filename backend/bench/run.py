@@ -0,0 +1,97 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+from typing import List, Optional, Sequence
+
+from bench.harness import BENCH_PROVIDERS, BenchRequest, BenchTarget, run_bench
+from bench.mock_provider import MockConfig
+
+
+def build_schedule(qps: float, duration: float, providers: Sequence[str], users: int, prompt_words: int,
+                   poisson: bool = False, seed: int = 1) -> List[BenchRequest]:
+    """Requests spread evenly (or as a Poisson process) over duration seconds, round-robin across providers"""
+    rng = random.Random(seed)
+    schedule = []
+    offset = 0.0
+    index = 0
+    while offset < duration:
+        prompt = " ".join(f"token{rng.randrange(5000)}" for _ in range(prompt_words))
+        schedule.append(BenchRequest(offset, f"!{providers[index % len(providers)]}", prompt, index % users))
+        index += 1
+        offset += rng.expovariate(qps) if poisson else 1.0 / qps
+    return schedule
+
+
+def print_report(report: dict) -> None:
+    latency, lag, memory = report["latency_ms"], report["loop_lag_ms"], report["memory_mb"]
+    print(f"requests   {report['requests']}  ok {report['ok']}  failed {report['failed']}  rejected {report['rejected']}")
+    print(f"duration   {report['duration_s']}s  throughput {report['throughput_rps']} req/s")
+    print(f"latency    p50 {latency['p50']}ms  p95 {latency['p95']}ms  p99 {latency['p99']}ms  max {latency['max']}ms")
+    print(f"loop lag   p50 {lag['p50']}ms  p99 {lag['p99']}ms  max {lag['max']}ms")
+    print(f"memory     rss {memory['rss_start']} -> {memory['rss_end']} MiB ({memory['growth']:+} MiB)"
+          + (f"  traced peak {memory['traced_peak']} MiB" if "traced_peak" in memory else ""))
+    print(f"provider   {report['provider']}  discord {report['discord']}")
+
+
+def check_gates(report: dict, fail_p95_ms: Optional[float], fail_error_rate: Optional[float]) -> None:
+    """Exit 1 when the report misses a regression gate"""
+    failures = []
+    if fail_p95_ms is not None and report["latency_ms"]["p95"] > fail_p95_ms:
+        failures.append(f"p95 {report['latency_ms']['p95']}ms > {fail_p95_ms}ms")
+    error_rate = report["failed"] / report["requests"] if report["requests"] else 0.0
+    if fail_error_rate is not None and error_rate > fail_error_rate:
+        failures.append(f"error rate {error_rate:.3f} > {fail_error_rate}")
+    if failures:
+        print("FAILED: " + "; ".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Load-test the model command path offline against a mock provider and fake Discord channels",
+    )
+    parser.add_argument("--qps", type=float, default=20, help="offered load in requests per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to keep offering load")
+    parser.add_argument("--provider", action="append", choices=BENCH_PROVIDERS,
+                        help="provider API to exercise, repeatable (default: all)")
+    parser.add_argument("--stream", action="store_true", help="stream replies into edited messages")
+    parser.add_argument("--users", type=int, default=50, help="distinct simulated users/channels")
+    parser.add_argument("--prompt-words", type=int, default=30)
+    parser.add_argument("--poisson", action="store_true", help="Poisson arrivals instead of a fixed interval")
+    parser.add_argument("--latency-ms", type=float, default=300, help="mock provider latency of a full answer")
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--discord-ms", type=float, default=30, help="latency of every fake Discord API call")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report traced Python allocations (slower)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--fail-p95-ms", type=float, help="exit 1 if p95 latency exceeds this")
+    parser.add_argument("--fail-error-rate", type=float, help="exit 1 if the failed fraction exceeds this")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    providers = args.provider or list(BENCH_PROVIDERS)
+    target = BenchTarget(
+        mock_config=MockConfig(latency_ms=args.latency_ms, reply_tokens=args.reply_tokens,
+                               error_rate=args.error_rate, throttle_rate=args.throttle_rate),
+        providers=providers,
+        stream=args.stream,
+        discord_latency=args.discord_ms / 1000,
+        track_allocations=args.tracemalloc,
+    )
+    schedule = build_schedule(args.qps, args.duration, providers, max(1, args.users), args.prompt_words, args.poisson)
+    report = asyncio.run(run_bench(target, schedule))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    check_gates(report, args.fail_p95_ms, args.fail_error_rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.database import SessionLocal
+from discord_bots.bot_models import DiscordBot
+
+logger = logging.getLogger(__name__)
+
+# Start every bot marked is_active when the API starts
+BOT_AUTOSTART = os.getenv("BOT_AUTOSTART", "true").lower() in ("1", "true", "yes")
+# Bots logging in and identifying at the same time during boot
+BOT_BOOT_CONCURRENCY = int(os.getenv("BOT_BOOT_CONCURRENCY", "10"))
+# Minimum seconds between two gateway IDENTIFYs of the fleet, so a boot doesn't burst from one IP
+BOT_IDENTIFY_INTERVAL = float(os.getenv("BOT_IDENTIFY_INTERVAL", "0.2"))
+
+
+def load_active_bots(session_factory=SessionLocal) -> List[Tuple[int, str, str]]:
+    """(id, token, name) of every bot that should be running"""
+    session = session_factory()
+    try:
+        return [(row.id, row.token, row.name)
+                for row in session.query(DiscordBot.id, DiscordBot.token, DiscordBot.name).filter(DiscordBot.is_active)]
+    finally:
+        session.close()
+
+
+class FleetBoot:
+    """
+    Starts the active bots concurrently instead of one by one. At most
+    concurrency bots are starting at a time and their IDENTIFYs are spaced
+    interval seconds apart; each start returns as soon as its bot is ready
+    (or has failed), so the fleet is up in about len(bots) * interval
+    seconds rather than the sum of every bot's login time.
+    """
+
+    def __init__(self, concurrency: int = BOT_BOOT_CONCURRENCY, interval: float = BOT_IDENTIFY_INTERVAL):
+        self.concurrency = max(1, concurrency)
+        self.interval = max(0.0, interval)
+        self.state = "idle"
+        self.total = 0
+        self.started = 0
+        self.failed: Dict[int, str] = {}
+        self.elapsed: Optional[float] = None
+        self._next_slot = 0.0
+
+    async def _identify_slot(self) -> None:
+        # Slots are handed out in order; nothing awaits between reading and taking one
+        loop = asyncio.get_running_loop()
+        slot = max(loop.time(), self._next_slot)
+        self._next_slot = slot + self.interval
+        await asyncio.sleep(slot - loop.time())
+
+    async def run(self, runner, bots: Optional[List[Tuple[int, str, str]]] = None, limit: int = 0) -> Dict[str, Any]:
+        """Start bots (default: every active bot in the database) through runner.start_bot"""
+        if bots is None:
+            bots = await asyncio.to_thread(load_active_bots)
+        if limit:
+            # Nodes booting together take different bots first; leases settle the rest
+            bots = random.sample(bots, min(limit, len(bots)))
+        self.state = "booting"
+        self.total, self.started, self.failed, self.elapsed = len(bots), 0, {}, None
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started_at = time.monotonic()
+        logger.info(f"Booting {len(bots)} bots ({self.concurrency} at a time, {self.interval:g}s between identifies)")
+
+        async def boot(bot_id: int, token: str, name: str) -> None:
+            async with semaphore:
+                await self._identify_slot()
+                try:
+                    success, message = await runner.start_bot(bot_id, token, name)
+                except Exception as e:
+                    success, message = False, str(e)
+            if success:
+                self.started += 1
+            else:
+                self.failed[bot_id] = message
+
+        await asyncio.gather(*(boot(*bot) for bot in bots))
+        self.elapsed = round(time.monotonic() - started_at, 2)
+        self.state = "done"
+        logger.info(f"Booted {self.started}/{self.total} bots in {self.elapsed}s"
+                    + (f"; failed: {sorted(self.failed)}" if self.failed else ""))
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "total": self.total,
+            "started": self.started,
+            "failed": dict(self.failed),
+            "elapsed": self.elapsed,
+            "concurrency": self.concurrency,
+            "identify_interval": self.interval,
+        }
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from config.database import SessionLocal
+from discord_bots.bot_models import BotLease, DiscordBot
+
+logger = logging.getLogger(__name__)
+
+# Lease-based ownership is only needed when several API nodes share one database
+BOT_LEASES_ENABLED = os.getenv("BOT_LEASES", "false").lower() in ("1", "true", "yes")
+NODE_ID = os.getenv("NODE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+# A lease not renewed within this many seconds may be taken over by another node
+BOT_LEASE_TTL = float(os.getenv("BOT_LEASE_TTL", "30"))
+BOT_LEASE_RENEW_INTERVAL = float(os.getenv("BOT_LEASE_RENEW_INTERVAL", "10"))
+# Bots a node claims per heartbeat, so free bots spread over the live nodes
+BOT_LEASE_CLAIM_BATCH = int(os.getenv("BOT_LEASE_CLAIM_BATCH", "5"))
+# Upper bound of bots one node will own (0 = no limit)
+BOT_LEASE_MAX_BOTS = int(os.getenv("BOT_LEASE_MAX_BOTS", "0"))
+
+
+class BotLeaseManager:
+    """
+    Database leases that decide which node runs which bot.
+
+    A node may only connect a bot while it holds an unexpired lease on it and
+    renews its leases every heartbeat, including those of bots it is still
+    starting. The heartbeat only talks to the database; the starts and stops
+    it decides on run as separate tasks, so a slow bot login never delays
+    renewal past the TTL. When a node dies its leases expire and
+    the other nodes pick its bots up. DiscordBot.is_active is the desired
+    state: the owner stops a bot once it is set to false. Lease times come
+    from each node's clock, so the TTL must comfortably exceed clock skew.
+    """
+
+    def __init__(self, session_factory=SessionLocal, node_id: str = NODE_ID,
+                 ttl: float = BOT_LEASE_TTL, interval: float = BOT_LEASE_RENEW_INTERVAL):
+        self.session_factory = session_factory
+        self.node_id = node_id
+        self.ttl = timedelta(seconds=ttl)
+        self.interval = interval
+        self._lock = threading.Lock()
+        # bot_id -> node_id of unexpired leases held by other nodes, as of the last heartbeat
+        self._remote: Dict[int, str] = {}
+        # Bots that should run but whose lease is free, waiting for a node to claim them
+        self._unclaimed: Set[int] = set()
+        # Bots this node acquired a lease on, running or still starting
+        self._held: Set[int] = set()
+        # Starts and stops the heartbeat handed off, referenced until they finish
+        self._tasks: Set[asyncio.Task] = set()
+
+    # --- lease rows ------------------------------------------------------
+
+    def acquire(self, bot_id: int) -> bool:
+        """Take or renew the lease on a bot; False if another node holds it"""
+        now = datetime.utcnow()
+        session = self.session_factory()
+        try:
+            updated = (
+                session.query(BotLease)
+                .filter(BotLease.bot_id == bot_id,
+                        or_(BotLease.node_id == self.node_id, BotLease.expires_at < now))
+                .update({"node_id": self.node_id, "expires_at": now + self.ttl, "renewed_at": now},
+                        synchronize_session=False)
+            )
+            if not updated:
+                session.add(BotLease(bot_id=bot_id, node_id=self.node_id, expires_at=now + self.ttl, renewed_at=now))
+            session.commit()
+        except IntegrityError:
+            # Another node inserted the lease first
+            session.rollback()
+            return False
+        finally:
+            session.close()
+        with self._lock:
+            self._remote.pop(bot_id, None)
+            self._unclaimed.discard(bot_id)
+            self._held.add(bot_id)
+        return True
+
+    def release(self, bot_id: int) -> None:
+        with self._lock:
+            self._held.discard(bot_id)
+        session = self.session_factory()
+        try:
+            session.query(BotLease).filter(BotLease.bot_id == bot_id, BotLease.node_id == self.node_id).delete(synchronize_session=False)
+            session.commit()
+        finally:
+            session.close()
+
+    def release_all(self) -> None:
+        with self._lock:
+            self._held.clear()
+        session = self.session_factory()
+        try:
+            session.query(BotLease).filter(BotLease.node_id == self.node_id).delete(synchronize_session=False)
+            session.commit()
+        finally:
+            session.close()
+
+    def held(self) -> Set[int]:
+        with self._lock:
+            return set(self._held)
+
+    def sync(self, local: Set[int]) -> Tuple[Set[int], Set[int], List[Tuple[int, str, str]]]:
+        """
+        Renew the leases of local (running or starting) bots and read the fleet state.
+        Returns (lost, unwanted, claimable): local bots whose lease is gone,
+        local bots that should no longer run, and (id, token, name) of active
+        bots with no live lease.
+        """
+        now = datetime.utcnow()
+        session = self.session_factory()
+        try:
+            if local:
+                (session.query(BotLease)
+                 .filter(BotLease.node_id == self.node_id, BotLease.bot_id.in_(local))
+                 .update({"expires_at": now + self.ttl, "renewed_at": now}, synchronize_session=False))
+                session.commit()
+            leases = {
+                bot_id: node_id
+                for bot_id, node_id in session.query(BotLease.bot_id, BotLease.node_id).filter(BotLease.expires_at >= now)
+            }
+            bots = {row.id: row for row in session.query(DiscordBot.id, DiscordBot.name, DiscordBot.token, DiscordBot.is_active)}
+        finally:
+            session.close()
+        lost = {bot_id for bot_id in local if leases.get(bot_id) != self.node_id}
+        unwanted = {bot_id for bot_id in local - lost if bot_id not in bots or not bots[bot_id].is_active}
+        claimable = [(row.id, row.token, row.name) for row in bots.values() if row.is_active and row.id not in leases]
+        with self._lock:
+            self._remote = {bot_id: node_id for bot_id, node_id in leases.items() if node_id != self.node_id}
+            self._unclaimed = {bot_id for bot_id, _, _ in claimable}
+        return lost, unwanted, claimable
+
+    # --- fleet view for status reads -------------------------------------
+
+    def owner(self, bot_id: int) -> Optional[str]:
+        with self._lock:
+            return self._remote.get(bot_id)
+
+    def is_running_elsewhere(self, bot_id: int) -> bool:
+        """Another node owns the bot, or it is active and about to be claimed"""
+        with self._lock:
+            return bot_id in self._remote or bot_id in self._unclaimed
+
+    def forget(self, bot_id: int) -> None:
+        with self._lock:
+            self._remote.pop(bot_id, None)
+            self._unclaimed.discard(bot_id)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "node_id": self.node_id,
+                "remote": dict(self._remote),
+                "unclaimed": sorted(self._unclaimed),
+            }
+
+    # --- heartbeat -------------------------------------------------------
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _claim(self, runner, bot_id: int, token: str, name: str) -> None:
+        # Take the lease before connecting, so two nodes that saw the bot unclaimed can't both log it in
+        if not await asyncio.to_thread(self.acquire, bot_id):
+            logger.info(f"Bot {name} (ID: {bot_id}) was claimed by another node first")
+            return
+        success, message = await runner.start_bot(bot_id, token, name)
+        if success:
+            logger.info(f"Node {self.node_id} took over bot {name} (ID: {bot_id}): {message}")
+        else:
+            # start_bot released the lease, so another node can try
+            logger.warning(f"Node {self.node_id} failed to take over bot {name} (ID: {bot_id}): {message}")
+
+    async def heartbeat(self, runner) -> None:
+        local = runner.local_bot_ids() | self.held()
+        lost, unwanted, claimable = await asyncio.to_thread(self.sync, local)
+        for bot_id in lost:
+            logger.warning(f"Lost lease on bot {bot_id}; disconnecting it on node {self.node_id}")
+            with self._lock:
+                self._held.discard(bot_id)
+            self._spawn(runner.stop_local(bot_id))
+        for bot_id in unwanted:
+            logger.info(f"Bot {bot_id} is no longer active; stopping it on node {self.node_id}")
+            self._spawn(runner.stop_bot(bot_id))
+        room = len(claimable)
+        if BOT_LEASE_MAX_BOTS:
+            room = max(0, BOT_LEASE_MAX_BOTS - len(local - lost - unwanted))
+        random.shuffle(claimable)
+        for bot_id, token, name in claimable[:min(room, BOT_LEASE_CLAIM_BATCH)]:
+            self._spawn(self._claim(runner, bot_id, token, name))
+
+    async def run(self, runner) -> None:
+        """Heartbeat forever on its own timer; scheduled on the bot runtime loop"""
+        logger.info(f"Bot leases enabled for node {self.node_id}")
+        while True:
+            try:
+                await self.heartbeat(runner)
+            except Exception as e:
+                logger.error(f"Bot lease heartbeat failed: {str(e)}")
+            # Jitter keeps nodes that started together from claiming in lockstep
+            await asyncio.sleep(self.interval * random.uniform(0.8, 1.2))
@@ -1,40 +1,110 @@
 import asyncio
 import logging
-from typing import Tuple
+import os
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
 from discord_bots.bot_manager import DaeBotManager
+from bot_runtime import BotRuntime
+from bot_supervisor import BotSupervisor
+from bot_leases import BotLeaseManager, BOT_LEASES_ENABLED, BOT_LEASE_MAX_BOTS
+from bot_fleet import FleetBoot, BOT_AUTOSTART
+from observability import registry, merge_families, request_log, run_profile
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 0 runs every bot in this process; N > 0 shards bots over N worker processes
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "0"))
+
 class BotRunner:
-    def __init__(self):
+    def __init__(self, workers: int = BOT_WORKERS):
         """Initialize the BotRunner with a DaeBotManager instance"""
         self.manager = DaeBotManager()
+        # All bots live on this loop thread, isolated from the API's event loop
+        self.runtime = BotRuntime()
+        # With workers, bots are hosted by child processes instead
+        self.supervisor = BotSupervisor(workers) if workers > 0 else None
+        # Several nodes sharing one database coordinate bot ownership through leases
+        self.leases = BotLeaseManager() if BOT_LEASES_ENABLED else None
+        # Concurrent start of the active bots at API startup
+        self.fleet_boot = FleetBoot()
+        # Bots with a start in progress; the API, the boot and the lease heartbeat may race to start one
+        self._starting: Set[int] = set()
+        self._starting_lock = threading.Lock()
+
+    def start_fleet(self) -> None:
+        """Boot the active bots in the background and, if leases are on, start the lease heartbeat alongside"""
+        # The heartbeat renews the leases of bots the boot is still starting, so it must not wait for the boot
+        if self.leases:
+            self.runtime.submit(self.leases.run(self))
+        if BOT_AUTOSTART:
+            self.runtime.submit(self._boot_fleet())
+
+    async def _boot_fleet(self) -> None:
+        try:
+            # With leases, start_bot skips bots another node already holds
+            await self.fleet_boot.run(self, limit=BOT_LEASE_MAX_BOTS if self.leases else 0)
+        except Exception as e:
+            logger.error(f"Fleet boot failed: {str(e)}")
+
+    def local_bot_ids(self) -> Set[int]:
+        """Ids of bots connected by this node"""
+        if self.supervisor:
+            return {bot_id for bot_id in list(self.supervisor.assignments) if self.supervisor.get_bot_status(bot_id)}
+        return {bot_id for bot_id, bot in list(self.manager.bots.items()) if not bot.is_closed()}
         
     async def start_bot(self, bot_id: int, token: str, name: str) -> Tuple[bool, str]:
         """Start a new Discord bot with the given token and name"""
+        with self._starting_lock:
+            if bot_id in self._starting:
+                return True, "Bot is already starting"
+            self._starting.add(bot_id)
         try:
+            if self.leases and not await asyncio.to_thread(self.leases.acquire, bot_id):
+                owner = self.leases.owner(bot_id) or "another node"
+                return True, f"Bot is already running on {owner}"
             # Create and start the bot in an asyncio task
-            success, message = await self.manager.create_bot(bot_id, token, name)
+            if self.supervisor:
+                success, message = await self.supervisor.start_bot(bot_id, token, name)
+            else:
+                success, message = await self.runtime.run(self.manager.create_bot(bot_id, token, name))
             
             if success:
                 logger.info(f"Successfully started bot {name} (ID: {bot_id})")
             else:
                 logger.error(f"Failed to start bot {name} (ID: {bot_id}): {message}")
+                if self.leases:
+                    await asyncio.to_thread(self.leases.release, bot_id)
             return success, message
         except Exception as e:
             error_msg = f"Unexpected error starting bot {name} (ID: {bot_id}): {str(e)}"
             logger.error(error_msg)
+            if self.leases:
+                # Otherwise the heartbeat would keep renewing a lease for a bot that isn't running
+                try:
+                    await asyncio.to_thread(self.leases.release, bot_id)
+                except Exception as release_error:
+                    logger.error(f"Failed to release lease on bot {bot_id}: {str(release_error)}")
             return False, error_msg
+        finally:
+            with self._starting_lock:
+                self._starting.discard(bot_id)
 
     async def stop_bot(self, bot_id: int) -> Tuple[bool, str]:
         """Stop a running Discord bot"""
         try:
-            if not self.get_bot_status(bot_id):
+            if not self._local_status(bot_id):
+                if self.leases and self.leases.is_running_elsewhere(bot_id):
+                    # The owner stops it on its next heartbeat once is_active is false
+                    owner = self.leases.owner(bot_id) or "another node"
+                    self.leases.forget(bot_id)
+                    return True, f"Bot runs on {owner}; it will stop there"
                 return True, "Bot is already stopped"
             
-            success = await self.manager.stop_bot(bot_id)
+            success = await self.stop_local(bot_id)
             if success:
+                if self.leases:
+                    await asyncio.to_thread(self.leases.release, bot_id)
                 logger.info(f"Successfully stopped bot {bot_id}")
                 return True, "Bot stopped successfully"
             else:
@@ -46,9 +116,22 @@ class BotRunner:
             logger.error(error_msg)
             return False, error_msg
 
+    async def stop_local(self, bot_id: int) -> bool:
+        """Disconnect a bot on this node without touching its lease"""
+        if self.supervisor:
+            return await self.supervisor.stop_bot(bot_id)
+        return await self.runtime.run(self.manager.stop_bot(bot_id))
+
     def get_bot_status(self, bot_id: int) -> bool:
-        """Check if a bot is running"""
+        """Check if a bot is running, here or (with leases) on another node"""
+        if self._local_status(bot_id):
+            return True
+        return bool(self.leases and self.leases.is_running_elsewhere(bot_id))
+
+    def _local_status(self, bot_id: int) -> bool:
         try:
+            if self.supervisor:
+                return self.supervisor.get_bot_status(bot_id)
             bot = self.manager.get_bot(bot_id)
             if bot is None:
                 return False
@@ -57,6 +140,92 @@ class BotRunner:
             logger.error(f"Error checking bot {bot_id} status: {str(e)}")
             return False
 
+    def get_bot_guilds(self, bot_id: int) -> List[Dict[str, str]]:
+        """Guilds a running bot is connected to, as id/name dicts"""
+        if self.supervisor:
+            return self.supervisor.get_bot_guilds(bot_id)
+        bot = self.manager.get_bot(bot_id)
+        if bot is None:
+            return []
+        try:
+            return [{"id": str(guild.id), "name": guild.name} for guild in list(bot.guilds)]
+        except Exception as e:
+            logger.error(f"Error reading guilds for bot {bot_id}: {str(e)}")
+            return []
+
+    def get_memory_stats(self) -> Dict[str, int]:
+        """Conversation memory stats, summed over worker processes when sharded"""
+        if self.supervisor:
+            return self.supervisor.get_memory_stats()
+        return self.manager.memory.stats()
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        """Response cache size, hits, misses and evictions"""
+        if self.supervisor:
+            return self.supervisor.get_cache_stats()
+        return self.manager.response_cache.stats()
+
+    def get_queue_stats(self) -> Dict[str, float]:
+        """Fair command queue depth, admissions and rejections"""
+        if self.supervisor:
+            return self.supervisor.get_queue_stats()
+        return self.manager.fair_queue.stats()
+
+    def get_metrics(self) -> List[Any]:
+        """Metric families of this process plus, when sharded, those of every worker"""
+        if self.supervisor:
+            return merge_families(registry.collect(), self.supervisor.get_metrics())
+        return registry.collect()
+
+    async def get_request_traces(self, limit: int = 100, bot_id: Optional[int] = None, min_ms: float = 0.0) -> List[Dict[str, Any]]:
+        """Stage timings of the most recent model commands, newest first"""
+        if self.supervisor:
+            return await self.supervisor.get_request_traces(limit, bot_id, min_ms)
+        return request_log.recent(limit, bot_id, min_ms)
+
+    async def profile(self, seconds: float, mode: str = "sample", top: int = 30) -> List[Dict[str, Any]]:
+        """Profile the bot loop(s) for a few seconds without stopping any bot; one result per process"""
+        if self.supervisor:
+            return await self.supervisor.profile(seconds, mode, top)
+        return [await self.runtime.run(run_profile(seconds, mode, top))]
+
+    def get_worker_stats(self) -> List[Dict[str, Any]]:
+        """Worker processes and the bots each one hosts (empty when not sharded)"""
+        return self.supervisor.get_worker_stats() if self.supervisor else []
+
+    async def rebalance(self) -> Dict[int, int]:
+        """Spread bots evenly over worker processes; returns bot_id -> new worker"""
+        return await self.supervisor.rebalance() if self.supervisor else {}
+
+    async def shutdown(self) -> None:
+        """Stop every running bot and the bot runtime thread"""
+        if self.supervisor:
+            await self.supervisor.shutdown()
+        else:
+            for bot_id in list(self.manager.bots):
+                await self.stop_bot(bot_id)
+        if self.leases:
+            # Hand the bots over right away instead of after lease expiry
+            await asyncio.to_thread(self.leases.release_all)
+        self.runtime.stop()
+
+    async def reload_commands(self, bot_id: int) -> Tuple[bool, str]:
+        """Re-register a running bot's model commands in place, without reconnecting"""
+        try:
+            if not self._local_status(bot_id):
+                return True, "Bot is not running here; commands will load on next start"
+            if self.supervisor:
+                success, message = await self.supervisor.reload_commands(bot_id)
+            else:
+                success, message = await self.runtime.run(self.manager.reload_commands(bot_id))
+            if not success:
+                logger.error(f"Failed to reload commands for bot {bot_id}: {message}")
+            return success, message
+        except Exception as e:
+            error_msg = f"Unexpected error reloading commands for bot {bot_id}: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
     async def restart_bot(self, bot_id: int, token: str, name: str) -> Tuple[bool, str]:
         """Restart a Discord bot"""
         try:
@@ -66,10 +235,7 @@ class BotRunner:
                 logger.warning(f"Failed to stop bot during restart: {stop_message}")
                 # Continue anyway since we'll try to start a new instance
             
-            # Wait a bit to ensure cleanup
-            await asyncio.sleep(1)
-            
-            # Start the bot again
+            # stop_bot returns once the old connection is closed, so the new one can start right away
             success, message = await self.start_bot(bot_id, token, name)
             if success:
                 logger.info(f"Successfully restarted bot {name} (ID: {bot_id})")
@@ -0,0 +1,432 @@
+import asyncio
+import concurrent.futures
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from observability import merge_families, registry, request_log, run_profile
+
+logger = logging.getLogger(__name__)
+
+# Seconds between status reports from a worker to the supervisor
+WORKER_STATUS_INTERVAL = float(os.getenv("BOT_WORKER_STATUS_INTERVAL", "2"))
+# Seconds the supervisor waits for a worker to answer a command
+WORKER_CALL_TIMEOUT = float(os.getenv("BOT_WORKER_CALL_TIMEOUT", "60"))
+# Starts tried for a bot that failed to come back after a worker respawn or a rebalance move
+BOT_RESTART_ATTEMPTS = int(os.getenv("BOT_RESTART_ATTEMPTS", "5"))
+
+
+# --- worker process --------------------------------------------------------
+
+def worker_main(worker_id: int, conn) -> None:
+    """Entry point of a worker process: hosts its own DaeBotManager on its own loop"""
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_worker_loop(worker_id, conn))
+
+
+async def _worker_loop(worker_id: int, conn) -> None:
+    from config.config_cache import config_cache
+    from discord_bots.bot_manager import DaeBotManager
+
+    manager = DaeBotManager()
+    loop = asyncio.get_running_loop()
+    send_lock = threading.Lock()
+    stopped = asyncio.Event()
+
+    def send(message) -> None:
+        with send_lock:
+            conn.send(message)
+
+    def status() -> Dict[str, Any]:
+        bots = {}
+        for bot_id, bot in list(manager.bots.items()):
+            try:
+                guilds = [{"id": str(g.id), "name": g.name} for g in list(bot.guilds)]
+            except Exception:
+                guilds = []
+            bots[bot_id] = {"running": not bot.is_closed(), "guilds": guilds}
+        return {"bots": bots, "memory": manager.memory.stats(), "queue": manager.fair_queue.stats(),
+                "cache": manager.response_cache.stats(), "metrics": registry.collect()}
+
+    async def handle(request_id: int, op: str, args: Dict[str, Any]) -> None:
+        try:
+            if op == "start":
+                result = await manager.create_bot(args["bot_id"], args["token"], args["name"])
+            elif op == "stop":
+                result = await manager.stop_bot(args["bot_id"])
+            elif op == "reload":
+                # Config writes were invalidated in the API process, not here
+                config_cache.invalidate_all()
+                result = await manager.reload_commands(args["bot_id"])
+            elif op == "traces":
+                result = request_log.recent(args["limit"], args["bot_id"], args["min_ms"])
+            elif op == "profile":
+                result = await run_profile(args["seconds"], args["mode"], args["top"])
+            elif op == "shutdown":
+                for bot_id in list(manager.bots):
+                    await manager.stop_bot(bot_id)
+                stopped.set()
+                result = True
+            else:
+                raise ValueError(f"Unknown worker op: {op}")
+            reply = (True, result)
+        except Exception as e:
+            logger.exception(f"Worker {worker_id} failed to handle {op}")
+            reply = (False, str(e))
+        # Status goes first so the caller sees the new state once it has the reply
+        send(("status", None, status()))
+        send(("reply", request_id, reply))
+
+    def receive() -> None:
+        # Blocking pipe reads happen on a helper thread and are handed to the loop
+        while True:
+            try:
+                request_id, op, args = conn.recv()
+            except (EOFError, OSError):
+                loop.call_soon_threadsafe(stopped.set)
+                return
+            asyncio.run_coroutine_threadsafe(handle(request_id, op, args), loop)
+
+    threading.Thread(target=receive, name=f"bot-worker-{worker_id}-rx", daemon=True).start()
+    logger.info(f"Bot worker {worker_id} ready (pid {os.getpid()})")
+    while not stopped.is_set():
+        send(("status", None, status()))
+        try:
+            await asyncio.wait_for(stopped.wait(), WORKER_STATUS_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+# --- supervisor ------------------------------------------------------------
+
+class _Worker:
+    """Supervisor-side handle of one worker process"""
+
+    def __init__(self, worker_id: int, ctx):
+        self.worker_id = worker_id
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=worker_main, args=(worker_id, child_conn), name=f"bot-worker-{worker_id}", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.pending: Dict[int, concurrent.futures.Future] = {}
+        self.status: Dict[str, Any] = {"bots": {}, "memory": {}}
+        self.send_lock = threading.Lock()
+        self.reader = threading.Thread(target=self._read, name=f"bot-worker-{worker_id}-reader", daemon=True)
+        self.reader.start()
+
+    def _read(self) -> None:
+        while True:
+            try:
+                kind, request_id, payload = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            if kind == "reply":
+                future = self.pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result(payload)
+            elif kind == "status":
+                self.status = payload
+        # The worker is gone: fail whatever was still waiting on it
+        for future in list(self.pending.values()):
+            if not future.done():
+                future.set_result((False, f"Worker {self.worker_id} exited"))
+        self.pending.clear()
+
+    def call(self, request_id: int, op: str, args: Dict[str, Any]) -> concurrent.futures.Future:
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        self.pending[request_id] = future
+        try:
+            with self.send_lock:
+                self.conn.send((request_id, op, args))
+        except (OSError, ValueError) as e:
+            self.pending.pop(request_id, None)
+            future.set_result((False, f"Worker {self.worker_id} unavailable: {e}"))
+        return future
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def close(self) -> None:
+        try:
+            self.conn.close()
+        except OSError:
+            pass
+
+
+class BotSupervisor:
+    """
+    Distributes bots over a pool of worker processes, each running its own
+    DaeBotManager. Lifecycle commands travel over a pipe per worker; workers
+    push status snapshots back so status reads never block. A monitor thread
+    respawns crashed workers and restarts the bots they hosted.
+    """
+
+    def __init__(self, num_workers: int):
+        self.num_workers = num_workers
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers: List[Optional[_Worker]] = [None] * num_workers
+        self._request_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # bot_id -> worker index, and bot_id -> (token, name) for restarts/rebalancing
+        self.assignments: Dict[int, int] = {}
+        self.bot_specs: Dict[int, Tuple[str, str]] = {}
+        # bot_id -> (failed starts so far, monotonic time of the next try), retried by the monitor thread
+        self._retries: Dict[int, Tuple[int, float]] = {}
+        self._monitor: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._monitor is not None:
+                return
+            for index in range(self.num_workers):
+                self._workers[index] = _Worker(index, self._ctx)
+            self._monitor = threading.Thread(target=self._watch, name="bot-supervisor-monitor", daemon=True)
+            self._monitor.start()
+        logger.info(f"Bot supervisor started {self.num_workers} worker processes")
+
+    # --- IPC -------------------------------------------------------------
+
+    def _call(self, index: int, op: str, **args) -> concurrent.futures.Future:
+        self.start()
+        return self._workers[index].call(next(self._request_ids), op, args)
+
+    async def _acall(self, index: int, op: str, **args) -> Tuple[bool, Any]:
+        future = self._call(index, op, **args)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), WORKER_CALL_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False, f"Worker {index} did not answer {op} in time"
+
+    # --- placement -------------------------------------------------------
+
+    def _least_loaded(self) -> int:
+        loads = [0] * self.num_workers
+        for index in self.assignments.values():
+            loads[index] += 1
+        return min(range(self.num_workers), key=loads.__getitem__)
+
+    # --- public API used by BotRunner ------------------------------------
+
+    async def start_bot(self, bot_id: int, token: str, name: str) -> Tuple[bool, str]:
+        with self._lock:
+            index = self.assignments.get(bot_id)
+            if index is None:
+                index = self._least_loaded()
+            self.assignments[bot_id] = index
+            self.bot_specs[bot_id] = (token, name)
+        ok, result = await self._acall(index, "start", bot_id=bot_id, token=token, name=name)
+        success, message = result if ok else (False, result)
+        if not success:
+            with self._lock:
+                self.assignments.pop(bot_id, None)
+                self.bot_specs.pop(bot_id, None)
+        return success, message
+
+    async def stop_bot(self, bot_id: int) -> bool:
+        with self._lock:
+            index = self.assignments.pop(bot_id, None)
+            self.bot_specs.pop(bot_id, None)
+            self._retries.pop(bot_id, None)
+        if index is None:
+            return False
+        ok, result = await self._acall(index, "stop", bot_id=bot_id)
+        return bool(ok and result)
+
+    async def reload_commands(self, bot_id: int) -> Tuple[bool, str]:
+        index = self.assignments.get(bot_id)
+        if index is None:
+            return False, "Bot is not running"
+        ok, result = await self._acall(index, "reload", bot_id=bot_id)
+        return tuple(result) if ok else (False, result)
+
+    def get_bot_status(self, bot_id: int) -> bool:
+        index = self.assignments.get(bot_id)
+        if index is None or self._workers[index] is None:
+            return False
+        bot = self._workers[index].status["bots"].get(bot_id)
+        return bool(bot and bot["running"])
+
+    def get_bot_guilds(self, bot_id: int) -> List[Dict[str, str]]:
+        index = self.assignments.get(bot_id)
+        if index is None or self._workers[index] is None:
+            return []
+        bot = self._workers[index].status["bots"].get(bot_id)
+        return bot["guilds"] if bot else []
+
+    def _sum_status(self, section: str) -> Dict[str, float]:
+        totals: Dict[str, float] = {}
+        for worker in self._workers:
+            if worker is None:
+                continue
+            for key, value in worker.status.get(section, {}).items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def get_memory_stats(self) -> Dict[str, int]:
+        return self._sum_status("memory")
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        return self._sum_status("cache")
+
+    def get_queue_stats(self) -> Dict[str, float]:
+        totals = self._sum_status("queue")
+        if "avg_service_seconds" in totals:
+            totals["avg_service_seconds"] = round(totals["avg_service_seconds"] / self.num_workers, 3)
+        return totals
+
+    def get_metrics(self) -> List[Any]:
+        """Metric families of every worker, merged into one set"""
+        return merge_families(*(worker.status.get("metrics", ()) for worker in self._workers if worker is not None))
+
+    def _live_workers(self) -> List[int]:
+        return [index for index, worker in enumerate(self._workers) if worker is not None and worker.is_alive()]
+
+    async def get_request_traces(self, limit: int, bot_id: Optional[int], min_ms: float) -> List[Dict[str, Any]]:
+        """The newest traces across all workers"""
+        indexes = self._live_workers()
+        results = await asyncio.gather(*(self._acall(i, "traces", limit=limit, bot_id=bot_id, min_ms=min_ms) for i in indexes))
+        traces = []
+        for index, (ok, result) in zip(indexes, results):
+            if ok:
+                traces.extend(dict(trace, worker=index) for trace in result)
+        traces.sort(key=lambda trace: trace["time"], reverse=True)
+        return traces[:limit]
+
+    async def profile(self, seconds: float, mode: str, top: int) -> List[Dict[str, Any]]:
+        """Profile every worker over the same window"""
+        indexes = self._live_workers()
+        results = await asyncio.gather(*(self._acall(i, "profile", seconds=seconds, mode=mode, top=top) for i in indexes))
+        return [dict(result, worker=index) if ok else {"worker": index, "error": result}
+                for index, (ok, result) in zip(indexes, results)]
+
+    def get_worker_stats(self) -> List[Dict[str, Any]]:
+        stats = []
+        for index, worker in enumerate(self._workers):
+            bots = sorted(bot_id for bot_id, i in self.assignments.items() if i == index)
+            stats.append({
+                "worker": index,
+                "pid": worker.process.pid if worker else None,
+                "alive": bool(worker and worker.is_alive()),
+                "bots": bots,
+            })
+        return stats
+
+    async def rebalance(self) -> Dict[int, int]:
+        """Move bots off the busiest workers until loads differ by at most one"""
+        moves: Dict[int, int] = {}
+        while True:
+            with self._lock:
+                loads: Dict[int, List[int]] = {i: [] for i in range(self.num_workers)}
+                for bot_id, index in self.assignments.items():
+                    loads[index].append(bot_id)
+                busiest = max(loads, key=lambda i: len(loads[i]))
+                idlest = min(loads, key=lambda i: len(loads[i]))
+                if len(loads[busiest]) - len(loads[idlest]) <= 1:
+                    return moves
+                bot_id = loads[busiest][-1]
+                token, name = self.bot_specs[bot_id]
+            await self._acall(busiest, "stop", bot_id=bot_id)
+            with self._lock:
+                self.assignments[bot_id] = idlest
+            ok, result = await self._acall(idlest, "start", bot_id=bot_id, token=token, name=name)
+            if ok and result[0]:
+                moves[bot_id] = idlest
+                continue
+            logger.error(f"Failed to move bot {bot_id} to worker {idlest}: {result}; putting it back on worker {busiest}")
+            with self._lock:
+                self.assignments[bot_id] = busiest
+            ok, result = await self._acall(busiest, "start", bot_id=bot_id, token=token, name=name)
+            if not ok or not result[0]:
+                logger.error(f"Failed to restart bot {bot_id} on worker {busiest}: {result}")
+                self._schedule_retry(bot_id, 1)
+            # Loads are unchanged, so another pass would pick the same bot again
+            return moves
+
+    async def shutdown(self) -> None:
+        self._stopping.set()
+        for index, worker in enumerate(self._workers):
+            if worker is not None and worker.is_alive():
+                await self._acall(index, "shutdown")
+        for worker in self._workers:
+            if worker is not None:
+                worker.process.join(5)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+                worker.close()
+
+    # --- crash recovery --------------------------------------------------
+
+    def _watch(self) -> None:
+        while not self._stopping.wait(1.0):
+            for index, worker in enumerate(self._workers):
+                if worker is None or worker.is_alive() or self._stopping.is_set():
+                    continue
+                logger.error(f"Bot worker {index} (pid {worker.process.pid}) exited with {worker.process.exitcode}; respawning")
+                worker.close()
+                with self._lock:
+                    self._workers[index] = _Worker(index, self._ctx)
+                    orphans = [(bot_id, self.bot_specs[bot_id]) for bot_id, i in self.assignments.items() if i == index]
+                for bot_id, _ in orphans:
+                    self._start_in_background(bot_id, index, 0)
+            self._run_retries()
+
+    def _start_in_background(self, bot_id: int, index: int, attempt: int) -> None:
+        """Send a start from the monitor thread; a failed reply schedules a retry instead of being dropped"""
+        with self._lock:
+            spec = self.bot_specs.get(bot_id)
+            worker = self._workers[index]
+        if spec is None or worker is None:
+            return
+        token, name = spec
+
+        def check(future: concurrent.futures.Future) -> None:
+            ok, result = future.result()
+            if ok and result[0]:
+                with self._lock:
+                    self._retries.pop(bot_id, None)
+                return
+            logger.error(f"Bot {bot_id} failed to start on worker {index}: {result}")
+            self._schedule_retry(bot_id, attempt + 1)
+
+        worker.call(next(self._request_ids), "start", {"bot_id": bot_id, "token": token, "name": name}).add_done_callback(check)
+
+    def _schedule_retry(self, bot_id: int, attempts: int) -> None:
+        with self._lock:
+            if bot_id not in self.bot_specs:
+                # Stopped in the meantime
+                return
+            if attempts >= BOT_RESTART_ATTEMPTS:
+                logger.error(f"Giving up on bot {bot_id} after {attempts} failed starts")
+                self.assignments.pop(bot_id, None)
+                self.bot_specs.pop(bot_id, None)
+                self._retries.pop(bot_id, None)
+                return
+            delay = min(60.0, 2.0 ** attempts)
+            self._retries[bot_id] = (attempts, time.monotonic() + delay)
+        logger.warning(f"Retrying start of bot {bot_id} in {delay:g}s")
+
+    def _run_retries(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            due = [(bot_id, attempts) for bot_id, (attempts, at) in self._retries.items() if at <= now]
+            for bot_id, attempts in due:
+                # Park the retry until its reply decides what happens next
+                self._retries[bot_id] = (attempts, float("inf"))
+                live = [i for i, w in enumerate(self._workers) if w is not None and w.is_alive()]
+                if not live:
+                    self._retries[bot_id] = (attempts, now + 1.0)
+                    continue
+                loads = {i: 0 for i in live}
+                for other, i in self.assignments.items():
+                    if i in loads and other != bot_id:
+                        loads[i] += 1
+                self.assignments[bot_id] = min(live, key=loads.__getitem__)
+        for bot_id, attempts in due:
+            index = self.assignments.get(bot_id)
+            if index is not None and self._retries.get(bot_id, (0, 0.0))[1] == float("inf"):
+                self._start_in_background(bot_id, index, attempts)
@@ -0,0 +1,330 @@
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import joinedload, selectinload
+
+from config.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ProviderSnapshot:
+    id: int
+    name: str
+    api_key: str
+    is_active: bool
+    api_url: Optional[str] = None
+    # Every usable key: api_key first, then the active pooled keys
+    api_keys: Tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class ModelSnapshot:
+    id: int
+    name: str
+    provider_id: int
+    model_id: str
+    configuration: str
+    is_active: bool
+    active: bool
+    short_description: str
+    image_url: str
+
+    @property
+    def config_json(self) -> dict:
+        try:
+            return json.loads(self.configuration or '{}')
+        except Exception:
+            return {}
+
+
+@dataclass(frozen=True)
+class IntegrationSnapshot:
+    id: int
+    bot_id: int
+    model_id: int
+    command: str
+    cache_ttl: Optional[int] = None
+    fallback_model_ids: Tuple[int, ...] = ()
+
+
+@dataclass(frozen=True)
+class BotSnapshot:
+    id: int
+    name: str
+    token: str
+
+
+@dataclass(frozen=True)
+class ModelCard:
+    """Precomputed `!models` embed content for one integration"""
+    command: str
+    title: str
+    description: str
+    provider_name: str
+    model_id: str
+    temperature: Optional[float]
+    thumbnail_url: Optional[str]
+
+
+# Base URL used to turn relative model image paths into public thumbnail URLs
+PUBLIC_BASE_URL = "http://localhost:8000"
+
+
+def public_image_url(image_url: Optional[str]) -> Optional[str]:
+    if image_url and isinstance(image_url, str):
+        if image_url.startswith("/model_images/"):
+            image_url = f"{PUBLIC_BASE_URL}{image_url}"
+        elif image_url.startswith("/static/model_images/"):
+            image_url = f"{PUBLIC_BASE_URL}{image_url[7:]}"
+    if image_url and (image_url.startswith("http://") or image_url.startswith("https://")):
+        return image_url
+    return None
+
+
+class ConfigCache:
+    """
+    Read-through cache of immutable bot/integration/model/provider snapshots.
+
+    The first read of an id loads it from the database; later reads are dict
+    lookups. The FastAPI write endpoints invalidate the entries they touch.
+    A generation counter per cache keeps a load that raced with an
+    invalidation from storing a stale snapshot.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        self._bots: Dict[int, Optional[BotSnapshot]] = {}
+        self._integrations: Dict[int, Tuple[IntegrationSnapshot, ...]] = {}
+        self._models: Dict[int, Optional[ModelSnapshot]] = {}
+        self._providers: Dict[int, Optional[ProviderSnapshot]] = {}
+        self._cards: Dict[int, Tuple[ModelCard, ...]] = {}
+        self._generation = 0
+
+    # --- snapshots -------------------------------------------------------
+
+    @staticmethod
+    def provider_snapshot(row) -> ProviderSnapshot:
+        api_keys = [row.api_key] if row.api_key else []
+        for key in getattr(row, 'keys', None) or ():
+            if key.is_active and key.api_key and key.api_key not in api_keys:
+                api_keys.append(key.api_key)
+        return ProviderSnapshot(row.id, row.name, row.api_key, bool(row.is_active), getattr(row, 'api_url', None), tuple(api_keys))
+
+    @staticmethod
+    def model_snapshot(row) -> ModelSnapshot:
+        active = row.active if row.active is not None else (row.is_active if row.is_active is not None else True)
+        return ModelSnapshot(
+            row.id, row.name, row.provider_id, row.model_id, row.configuration or '{}',
+            bool(row.is_active), bool(active), row.short_description or '', row.image_url or '',
+        )
+
+    @staticmethod
+    def integration_snapshot(row) -> IntegrationSnapshot:
+        return IntegrationSnapshot(
+            row.id, row.bot_id, row.model_id, row.command, getattr(row, 'cache_ttl', None),
+            tuple(getattr(row, 'fallback_model_ids', None) or ()),
+        )
+
+    # --- read-through lookups -------------------------------------------
+
+    def _read(self, cache: dict, key, load):
+        with self._lock:
+            if key in cache:
+                return cache[key]
+            generation = self._generation
+        value = load(key)
+        with self._lock:
+            if generation == self._generation:
+                cache[key] = value
+        return value
+
+    def get_bot(self, bot_id: int) -> Optional[BotSnapshot]:
+        return self._read(self._bots, bot_id, self._load_bot)
+
+    def get_integrations(self, bot_id: int) -> Tuple[IntegrationSnapshot, ...]:
+        return self._read(self._integrations, bot_id, self._load_integrations)
+
+    def get_model(self, model_id: int) -> Optional[ModelSnapshot]:
+        return self._read(self._models, model_id, self._load_model)
+
+    def get_provider(self, provider_id: int) -> Optional[ProviderSnapshot]:
+        return self._read(self._providers, provider_id, self._load_provider)
+
+    def _load_bot(self, bot_id):
+        from discord_bots.bot_models import DiscordBot
+        session = self.session_factory()
+        try:
+            row = session.query(DiscordBot).filter(DiscordBot.id == bot_id).first()
+            return BotSnapshot(row.id, row.name, row.token) if row else None
+        finally:
+            session.close()
+
+    def _load_integrations(self, bot_id):
+        from models.models import BotModelIntegration
+        session = self.session_factory()
+        try:
+            rows = session.query(BotModelIntegration).filter(BotModelIntegration.bot_id == bot_id).order_by(BotModelIntegration.id).all()
+            return tuple(self.integration_snapshot(row) for row in rows)
+        finally:
+            session.close()
+
+    def _load_model(self, model_id):
+        from models.models import AIModel
+        session = self.session_factory()
+        try:
+            row = session.query(AIModel).filter(AIModel.id == model_id).first()
+            return self.model_snapshot(row) if row else None
+        finally:
+            session.close()
+
+    def _load_provider(self, provider_id):
+        from models.models import AIProvider
+        session = self.session_factory()
+        try:
+            row = session.query(AIProvider).filter(AIProvider.id == provider_id).first()
+            return self.provider_snapshot(row) if row else None
+        finally:
+            session.close()
+
+    def warm_bot(self, bot_id: int) -> None:
+        """
+        Load a bot plus all its integrations, models and providers with three
+        queries (integrations eager-load their model and provider, then the
+        providers' key pools), unless they are already cached.
+        """
+        with self._lock:
+            if bot_id in self._integrations and bot_id in self._bots:
+                return
+            generation = self._generation
+        from discord_bots.bot_models import DiscordBot
+        from models.models import AIModel, AIProvider, BotModelIntegration
+        session = self.session_factory()
+        try:
+            bot = session.query(DiscordBot).filter(DiscordBot.id == bot_id).first()
+            rows = (
+                session.query(BotModelIntegration)
+                .options(joinedload(BotModelIntegration.model).joinedload(AIModel.provider).selectinload(AIProvider.keys))
+                .filter(BotModelIntegration.bot_id == bot_id)
+                .order_by(BotModelIntegration.id)
+                .all()
+            )
+            bot_snapshot = BotSnapshot(bot.id, bot.name, bot.token) if bot else None
+            integrations = tuple(self.integration_snapshot(row) for row in rows)
+            model_rows = {row.model.id: row.model for row in rows if row.model is not None}
+            models = {model_id: self.model_snapshot(row) for model_id, row in model_rows.items()}
+            providers = {row.provider.id: self.provider_snapshot(row.provider) for row in model_rows.values() if row.provider is not None}
+        finally:
+            session.close()
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._bots[bot_id] = bot_snapshot
+            self._integrations[bot_id] = integrations
+            self._models.update(models)
+            self._providers.update(providers)
+
+    def get_model_cards(self, bot_id: int) -> Tuple[ModelCard, ...]:
+        """`!models` projection for a bot: one card per integration on an active model"""
+        with self._lock:
+            cards = self._cards.get(bot_id)
+            if cards is not None:
+                return cards
+            generation = self._generation
+        self.warm_bot(bot_id)
+        cards = []
+        for integration in self.get_integrations(bot_id):
+            model = self.get_model(integration.model_id)
+            # Only show active models
+            if not model or not model.active:
+                continue
+            provider = self.get_provider(model.provider_id)
+            cards.append(ModelCard(
+                command=integration.command,
+                title=model.name or 'Unknown',
+                description=model.short_description or 'No description.',
+                provider_name=provider.name if provider else 'Unknown',
+                model_id=model.model_id or 'Unknown',
+                temperature=model.config_json.get('temperature', None),
+                thumbnail_url=public_image_url(model.image_url),
+            ))
+        cards = tuple(cards)
+        with self._lock:
+            if generation == self._generation:
+                self._cards[bot_id] = cards
+        return cards
+
+    # --- invalidation ----------------------------------------------------
+
+    def _invalidate(self, cache: dict, key) -> None:
+        with self._lock:
+            self._generation += 1
+            cache.pop(key, None)
+
+    def invalidate_bot(self, bot_id: int) -> None:
+        self._invalidate(self._bots, bot_id)
+        self._invalidate(self._integrations, bot_id)
+        self._invalidate(self._cards, bot_id)
+
+    def invalidate_integrations(self, bot_id: int) -> None:
+        self._invalidate(self._integrations, bot_id)
+        self._invalidate(self._cards, bot_id)
+
+    def invalidate_model(self, model_id: int) -> None:
+        self._invalidate(self._models, model_id)
+        with self._lock:
+            self._cards.clear()
+
+    def invalidate_provider(self, provider_id: int) -> None:
+        self._invalidate(self._providers, provider_id)
+        with self._lock:
+            self._cards.clear()
+
+    def invalidate_all(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._bots.clear()
+            self._integrations.clear()
+            self._models.clear()
+            self._providers.clear()
+            self._cards.clear()
+
+    def bots_using_model(self, model_id: int) -> Tuple[int, ...]:
+        """
+        Ids of bots with an integration on this model, directly or as a
+        fallback. Read from the database: bot workers keep their own caches,
+        so this process may never have loaded the integrations.
+        """
+        return self._bots_using_models({model_id})
+
+    def bots_using_provider(self, provider_id: int) -> Tuple[int, ...]:
+        """Ids of bots with an integration on a model of this provider (read from the database)"""
+        from models.models import AIModel
+        session = self.session_factory()
+        try:
+            model_ids = {model_id for model_id, in session.query(AIModel.id).filter(AIModel.provider_id == provider_id)}
+        finally:
+            session.close()
+        return self._bots_using_models(model_ids) if model_ids else ()
+
+    def _bots_using_models(self, model_ids) -> Tuple[int, ...]:
+        from models.models import BotModelIntegration
+        session = self.session_factory()
+        try:
+            rows = session.query(BotModelIntegration).filter(
+                BotModelIntegration.model_id.in_(model_ids) | BotModelIntegration.fallback_models.isnot(None)
+            ).all()
+            # Fallbacks are a JSON list, so they are matched here rather than in SQL
+            return tuple(sorted({row.bot_id for row in rows
+                                 if row.model_id in model_ids or model_ids.intersection(row.fallback_model_ids)}))
+        finally:
+            session.close()
+
+
+# Process-wide cache shared by the API routers and every bot
+config_cache = ConfigCache()
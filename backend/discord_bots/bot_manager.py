@@ -1,30 +1,57 @@
 import discord
 from discord.ext import commands
-from typing import Dict, Optional, Tuple
+from typing import Dict, Optional, Set, Tuple
 import asyncio
 import logging
+import math
+import os
+import time
 import traceback
-import sqlalchemy
-from sqlalchemy.orm import sessionmaker
-from config.database import SQLALCHEMY_DATABASE_URL
-from models import models as db_models
-from discord_bots.bot_models import DiscordBot
+import weakref
+from config.config_cache import config_cache
+from ai_providers import ProviderError, close_session, complete_with_failover, stream_with_failover
+from discord_bots.streaming import StreamingReply
+from discord_bots.memory_store import get_memory_store
+from discord_bots.model_commands import CommandTimer, ModelCommandSpec, build_command_spec
+from discord_bots.fair_queue import FairQueue, AdmissionRejected
+from discord_bots.response_cache import get_response_cache
+from discord_bots.fanout import FANOUT_COMMAND, FANOUT_TIMEOUT, parse_fanout_targets
+from observability import registry, traffic_recorder
 import json
-import collections
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Seconds create_bot waits for on_ready before reporting a logged-in bot as still connecting
+BOT_READY_TIMEOUT = float(os.getenv("BOT_READY_TIMEOUT", "15"))
+# Warn when a bot has fewer daily gateway session starts left than this
+BOT_SESSION_START_WARN = int(os.getenv("BOT_SESSION_START_WARN", "50"))
+
+COMMAND_QUEUE = registry.gauge("dae_command_queue", "Model commands running and waiting in the fair queue", ("state",))
+GATEWAY_LATENCY = registry.gauge("dae_gateway_latency_seconds", "Discord gateway heartbeat latency per bot", ("bot",))
+# Live managers of this process (the API's, BotRunner's, a worker's); the gauges read them at scrape time
+_managers: "weakref.WeakSet[DaeBotManager]" = weakref.WeakSet()
+
 class DaeBotManager:
     def __init__(self):
         self.bots: Dict[int, commands.Bot] = {}
-        # Per-user, per-channel memory: (channel_id, user_id) -> deque of last 10 (role, content) tuples
-        self.user_message_memory = collections.defaultdict(lambda: collections.deque(maxlen=10))
+        # Per-user, per-channel memory: (channel_id, user_id) -> recent (role, content, tokens) entries.
+        # The store is process-wide, so every manager instance sees the same history.
+        self.memory = get_memory_store()
+        # bot_id -> command name -> spec; swapped wholesale when integrations change
+        self.command_specs: Dict[int, Dict[str, ModelCommandSpec]] = {}
+        # Fair per-(channel, user) queue shared by every model command of this manager
+        self.fair_queue = FairQueue()
+        # Opt-in (per integration cache_ttl) cache of answers to identical contexts
+        self.response_cache = get_response_cache()
+        # Bots with a create_bot in progress, so a racing duplicate start can't open a second gateway session
+        self._creating: Set[int] = set()
+        _managers.add(self)
 
     def get_memory_key(self, channel_id, user_id):
         return f"{channel_id}:{user_id}"
 
-    def setup_bot(self, bot: commands.Bot, name: str) -> None:
+    def setup_bot(self, bot: commands.Bot, name: str, bot_id: int) -> None:
         @bot.event
         async def on_ready():
             logger.info(f'Bot {name} is ready and connected as {bot.user}')
@@ -35,9 +62,13 @@ class DaeBotManager:
         async def on_message(message):
             if message.author == bot.user:
                 return
-            # Only store command user messages as ("user", content) with channel context
-            key = self.get_memory_key(message.channel.id, message.author.id)
-            self.user_message_memory[key].append(("user", message.content))
+            # Commands record their own prompt; plain chatter is only kept for users who
+            # already have a conversation (possibly only in the database), so idle channels don't allocate memory keys
+            if not message.content.startswith(bot.command_prefix):
+                key = self.get_memory_key(message.channel.id, message.author.id)
+                if await self.memory.append_existing(key, "user", message.content):
+                    # Recorded only when stored, so replays write memory as often as production did
+                    traffic_recorder.message(bot_id, message.channel.id, message.author.id, len(message.content))
             await bot.process_commands(message)
 
         @bot.event
@@ -65,6 +96,7 @@ class DaeBotManager:
                 ("!status", "Show this status card"),
                 ("!devinfo", "Show development info card"),
                 ("!models", "Show each available model and its parameters"),
+                (f"!{FANOUT_COMMAND}", f"Ask several models at once, e.g. `!{FANOUT_COMMAND} !gpt !claude <prompt>`"),
             ]
             embed.add_field(
                 name="General Commands",
@@ -122,317 +154,297 @@ class DaeBotManager:
         @bot.command(name='models')
         async def models(ctx):
             import discord
-            session = SessionLocal()
+            # Rendered from precomputed model cards. After an invalidation the cache reads
+            # through to the database, so the lookup runs off the event loop.
+            def load_cards():
+                if config_cache.get_bot(bot_id) is None:
+                    return "No bot found in database.", ()
+                if not config_cache.get_integrations(bot_id):
+                    return "No model integrations found for this bot.", ()
+                return None, config_cache.get_model_cards(bot_id)
+
+            error, cards = await asyncio.to_thread(load_cards)
+            if error:
+                await ctx.send(error)
+                return
+            for card in cards:
+                embed = discord.Embed(title=card.title, description=card.description, color=0x00BFFF)
+                embed.add_field(name="Command", value=f"`{card.command}`", inline=True)
+                embed.add_field(name="Provider", value=card.provider_name, inline=True)
+                embed.add_field(name="Model", value=card.model_id, inline=True)
+                if card.temperature is not None:
+                    embed.add_field(name="Temperature", value=str(card.temperature), inline=True)
+                # Set model image as thumbnail if available and valid
+                if card.thumbnail_url:
+                    embed.set_thumbnail(url=card.thumbnail_url)
+                embed.set_footer(text="Model provided by API*")
+                await ctx.send(embed=embed)
+            if not cards:
+                await ctx.send("No active models with images found for this bot.")
+
+        @bot.command(name=FANOUT_COMMAND)
+        async def fanout(ctx, *, prompt: str = None):
+            await self.run_fanout(ctx, bot_id, prompt)
+
+    def load_command_specs(self, bot_id: int) -> Dict[str, ModelCommandSpec]:
+        """Build the model command specs for a bot from its integrations (may hit the DB on a cache miss)"""
+        specs = {}
+        # Batched, eager-loaded warm-up of bot, integrations, models, providers and model cards
+        config_cache.warm_bot(bot_id)
+        config_cache.get_model_cards(bot_id)
+        for integration in config_cache.get_integrations(bot_id):
+            # Fetch model and provider info
+            model = config_cache.get_model(integration.model_id)
+            provider = config_cache.get_provider(model.provider_id) if model else None
+            fallbacks = []
+            for fallback_id in integration.fallback_model_ids:
+                fallback_model = config_cache.get_model(fallback_id)
+                if fallback_model and fallback_model.active:
+                    fallbacks.append((fallback_model, config_cache.get_provider(fallback_model.provider_id)))
+            spec = build_command_spec(integration, model, provider, fallbacks)
+            specs[spec.command_name] = spec
+        return specs
+
+    def apply_command_specs(self, bot: commands.Bot, bot_id: int, specs: Dict[str, ModelCommandSpec]) -> None:
+        """Add/remove model commands in place and atomically swap in the new specs"""
+        current = self.command_specs.get(bot_id, {})
+        specs = dict(specs)
+        for command_name in current.keys() - specs.keys():
+            bot.remove_command(command_name)
+        for command_name in specs.keys() - current.keys():
             try:
-                bot_db = session.query(DiscordBot).filter(DiscordBot.name == name).first()
-                if not bot_db:
-                    await ctx.send("No bot found in database.")
-                    return
-                integrations = session.query(db_models.BotModelIntegration).filter(db_models.BotModelIntegration.bot_id == bot_db.id).all()
-                if not integrations:
-                    await ctx.send("No model integrations found for this bot.")
+                bot.add_command(commands.Command(self.make_model_command(bot_id, command_name), name=command_name))
+            except commands.CommandRegistrationError as e:
+                logger.warning(f"Skipping model command '{command_name}' for bot {bot_id}: {e}")
+                del specs[command_name]
+        # Handlers look specs up per call, so one assignment switches every command over
+        self.command_specs[bot_id] = specs
+
+    async def reload_commands(self, bot_id: int) -> Tuple[bool, str]:
+        """Re-read a running bot's integrations and update its commands without reconnecting"""
+        bot = self.bots.get(bot_id)
+        if bot is None:
+            return False, "Bot is not running"
+        specs = await asyncio.to_thread(self.load_command_specs, bot_id)
+        self.apply_command_specs(bot, bot_id, specs)
+        logger.info(f"Reloaded {len(specs)} model commands for bot {bot_id}")
+        return True, "Commands reloaded"
+
+    def make_model_command(self, bot_id: int, command_name: str):
+        async def custom_model_command(ctx, *, prompt: str = None):
+            spec = self.command_specs.get(bot_id, {}).get(command_name)
+            if spec is None:
+                return
+            await self.run_model_command(ctx, spec, prompt)
+        custom_model_command.__name__ = command_name
+        return custom_model_command
+
+    async def run_model_command(self, ctx, spec: ModelCommandSpec, prompt: Optional[str]) -> None:
+        if not prompt:
+            await ctx.send(f"Usage: {spec.command} <your prompt>")
+            return
+        key = self.get_memory_key(ctx.channel.id, ctx.author.id)
+        timer = CommandTimer(spec, ctx, prompt)
+        try:
+            # --- Build context: persona, then as much recent memory as fits the token budget, then the prompt ---
+            history = await self.memory.get_history(key)
+            timer.lap("memory")
+            context_messages = spec.context_builder.build(history, prompt)
+            cache_key = spec.cache_key(context_messages) if spec.cache_ttl and spec.adapter is not None else None
+            timer.lap("context")
+            # Cached answers skip the queue and the provider entirely
+            if cache_key is not None:
+                cached = await self.response_cache.get(cache_key)
+                timer.lap("cache")
+                if cached is not None:
+                    for chunk in split_message_chunks(cached):
+                        await ctx.send(chunk)
+                    timer.lap("send")
+                    self.memory.append(key, "user", prompt)
+                    self.memory.append(key, spec.persona_name, cached)
+                    timer.reply_chars = len(cached)
+                    timer.finish("cache_hit")
                     return
-                sent = False
-                for integration in integrations:
-                    model = session.query(db_models.AIModel).filter(db_models.AIModel.id == integration.model_id).first()
-                    if not model:
-                        continue
-                    # Always fetch the latest image_url from the DB
-                    image_url = getattr(model, 'image_url', None)
-                    # Always use a valid public base URL (localhost for dev)
-                    if image_url and isinstance(image_url, str):
-                        if image_url.startswith("/model_images/"):
-                            image_url = f"http://localhost:8000{image_url}"
-                        elif image_url.startswith("/static/model_images/"):
-                            image_url = f"http://localhost:8000{image_url[7:]}"
-                    command = integration.command
-                    model_name = getattr(model, 'name', 'Unknown')
-                    short_desc = getattr(model, 'short_description', None) or getattr(model, 'description', None) or 'No description.'
-                    # --- New fields ---
-                    provider = session.query(db_models.AIProvider).filter(db_models.AIProvider.id == model.provider_id).first()
-                    provider_name = getattr(provider, 'name', 'Unknown') if provider else 'Unknown'
-                    model_id_display = getattr(model, 'model_id', 'Unknown')
-                    # Parse temperature from configuration JSON
-                    try:
-                        config_json = json.loads(getattr(model, 'configuration', '{}') or '{}')
-                        temperature = config_json.get('temperature', None)
-                    except Exception:
-                        temperature = None
-                    # Only show active models
-                    is_active = getattr(model, 'active', None)
-                    if is_active is None:
-                        is_active = getattr(model, 'is_active', True)
-                    if not is_active:
-                        continue
-                    # Build embed fields
-                    value = f"**Command:** `{command}`\n**Provider:** {provider_name}\n**Model:** {model_id_display}"
-                    if temperature is not None:
-                        value += f"\n**Temperature:** {temperature}"
-                    value += f"\n{short_desc}"
-                    embed = discord.Embed(title=model_name, description=short_desc, color=0x00BFFF)
-                    embed.add_field(name="Command", value=f"`{command}`", inline=True)
-                    embed.add_field(name="Provider", value=provider_name, inline=True)
-                    embed.add_field(name="Model", value=model_id_display, inline=True)
-                    if temperature is not None:
-                        embed.add_field(name="Temperature", value=str(temperature), inline=True)
-                    # Set model image as thumbnail if available and valid
-                    if image_url and (image_url.startswith("http://") or image_url.startswith("https://")):
-                        embed.set_thumbnail(url=image_url)
-                        logger.info(f"Set Discord embed thumbnail for model {model_name}: {image_url}")
+        except Exception as e:
+            timer.finish("error")
+            logger.error(f"Error in custom model command: {traceback.format_exc()}")
+            await ctx.send(f"An error occurred: {str(e)}")
+            return
+        try:
+            ticket = self.fair_queue.submit(key)
+        except AdmissionRejected as e:
+            timer.finish("rejected")
+            await ctx.send(f"Busy right now, {ctx.author.mention}: {e}. Please try again in a moment.")
+            return
+        try:
+            await self._run_admitted(ctx, spec, prompt, key, ticket, context_messages, cache_key, timer)
+        finally:
+            ticket.release()
+
+    async def _run_admitted(self, ctx, spec: ModelCommandSpec, prompt: str, key: str, ticket,
+                            context_messages, cache_key: Optional[str], timer: CommandTimer) -> None:
+        outcome = "error"
+        try:
+            if ticket.position:
+                buffer_msg = await ctx.send(f"Busy, position {ticket.position} in queue for {ctx.author.mention} ...")
+                timer.reset()
+                await ticket.wait()
+                timer.lap("queue")
+                await buffer_msg.edit(content=f"Preparing answer for {ctx.author.mention} ...")
+            else:
+                timer.record("queue", 0.0)
+                buffer_msg = await ctx.send(f"Preparing answer for {ctx.author.mention} ...")
+            user_id = ctx.author.id
+            # --- DEBUG: Log the context being sent to the model ---
+            # logger.info(f"[DEBUG] Model context for user {user_id} (provider: {spec.provider_name}, persona: {spec.persona_name}):\n" + json.dumps(context_messages, indent=2))
+            if spec.adapter is None:
+                await ctx.send(f"Unsupported provider: {spec.provider_name}")
+            else:
+                timer.reset()
+                send_seconds = 0.0
+                streaming_reply = None
+                served_by = []
+                try:
+                    if spec.stream:
+                        # Edit the buffer message in place as tokens arrive
+                        streaming_reply = StreamingReply(buffer_msg)
+                        async for delta in stream_with_failover(spec.chain, context_messages, served_by=served_by):
+                            edit_started = time.perf_counter()
+                            await streaming_reply.append(delta)
+                            send_seconds += time.perf_counter() - edit_started
+                        edit_started = time.perf_counter()
+                        reply = await streaming_reply.finish()
+                        send_seconds += time.perf_counter() - edit_started
+                        buffer_msg = None
                     else:
-                        logger.warning(f"No valid image_url for model {model_name}: {image_url}")
-                    embed.set_footer(text="Model provided by API*")
-                    await ctx.send(embed=embed)
-                    sent = True
-                if not sent:
-                    await ctx.send("No active models with images found for this bot.")
-            finally:
-                session.close()
-
-        # Dynamically register custom commands for model integrations
-        engine = sqlalchemy.create_engine(SQLALCHEMY_DATABASE_URL)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-        def register_model_commands():
-            session = SessionLocal()
-            try:
-                bot_db = session.query(DiscordBot).filter(DiscordBot.name == name).first()
-                if not bot_db:
-                    logger.warning(f"No DB bot found for name {name}")
-                    return
-                integrations = session.query(db_models.BotModelIntegration).filter(db_models.BotModelIntegration.bot_id == bot_db.id).all()
-                for integration in integrations:
-                    command_name = integration.command.lstrip('!')
-                    model_id = integration.model_id
-                    # Fetch model and provider info
-                    model = session.query(db_models.AIModel).filter(db_models.AIModel.id == model_id).first()
-                    provider = session.query(db_models.AIProvider).filter(db_models.AIProvider.id == model.provider_id).first() if model else None
-                    integration_config = integration.config if hasattr(integration, 'config') else {}
-
-                    async def custom_model_command(ctx, *, prompt: str = None, _model_id=model_id, _command=integration.command, _model=model, _provider=provider, _integration_config=integration_config):
-                        if not prompt:
-                            await ctx.send(f"Usage: {_command} <your prompt>")
-                            return
-                        try:
-                            buffer_msg = await ctx.send(f"Preparing answer for {ctx.author.mention} ...")
-                            model_id_for_api = getattr(_model, 'model_id', None) or getattr(_model, 'name', None)
-                            persona = None
-                            try:
-                                config_json = json.loads(getattr(_model, 'configuration', '{}') or '{}')
-                                persona = config_json.get('behavior') or config_json.get('persona')
-                            except Exception:
-                                persona = None
-                            user_id = ctx.author.id
-                            channel_id = ctx.channel.id
-                            # --- Get persona/model name for this command ---
-                            persona_name = (getattr(_model, 'name', None) or getattr(_model, 'model_id', None) or 'assistant').lower()
-                            # --- Build context: persona, then memory (filtered), then current prompt ---
-                            context_messages = []
-                            if persona:
-                                context_messages.append({"role": "system", "content": persona})
-                            # Only include memory for this persona/model, user, and channel
-                            key = self.get_memory_key(channel_id, user_id)
-                            for role, content in self.user_message_memory.get(key, []):
-                                if role == "user":
-                                    context_messages.append({"role": "user", "content": content})
-                                elif role == persona_name:
-                                    context_messages.append({"role": "assistant", "content": content})
-                            context_messages.append({"role": "user", "content": prompt})
-                            # --- DEBUG: Log the context being sent to the model ---
-                            # logger.info(f"[DEBUG] Model context for user {user_id} (provider: {getattr(_provider, 'name', 'unknown')}, persona: {persona_name}):\n" + json.dumps(context_messages, indent=2))
-                            # --- OpenAI ---
-                            if _provider and _provider.name.lower() == 'openai':
-                                import openai
-                                openai.api_key = _provider.api_key
-                                response = openai.ChatCompletion.create(
-                                    model=model_id_for_api,
-                                    messages=context_messages,
-                                    **(_integration_config or {})
-                                )
-                                reply = response['choices'][0]['message']['content']
-                                for chunk in split_message_chunks(reply):
-                                    await ctx.send(chunk)
-                                # Store both user prompt and bot reply in memory as ("user", prompt), (persona_name, reply)
-                                self.user_message_memory[key].append(("user", prompt))
-                                self.user_message_memory[key].append((persona_name, reply))
-                            # --- Anthropic ---
-                            elif _provider and _provider.name.lower() == 'anthropic':
-                                import requests
-                                api_key = _provider.api_key
-                                api_url = getattr(_provider, 'api_url', 'https://api.anthropic.com/v1/messages')
-                                headers = {
-                                    "x-api-key": api_key,
-                                    "anthropic-version": "2023-06-01",
-                                    "content-type": "application/json"
-                                }
-                                messages = []
-                                if persona:
-                                    messages.append({"role": "system", "content": persona})
-                                # Only include memory for this persona/model and user
-                                for role, content in self.user_message_memory.get(key, []):
-                                    if role == "user":
-                                        messages.append({"role": "user", "content": content})
-                                    elif role == persona_name:
-                                        messages.append({"role": "assistant", "content": content})
-                                messages.append({"role": "user", "content": prompt})
-                                data = {
-                                    "model": model_id_for_api,
-                                    "max_tokens": _integration_config.get("max_tokens", 1024) if _integration_config else 1024,
-                                    "messages": messages,
-                                    "temperature": _integration_config.get("temperature", 0.7) if _integration_config else 0.7
-                                }
-                                resp = requests.post(api_url, json=data, headers=headers, timeout=30)
-                                if resp.status_code == 200:
-                                    reply = resp.json().get('content', [{}])[0].get('text', 'No response')
-                                    for chunk in split_message_chunks(reply):
-                                        await ctx.send(chunk)
-                                    self.user_message_memory[key].append(("user", prompt))
-                                    self.user_message_memory[key].append((persona_name, reply))
-                                else:
-                                    await ctx.send(f"Anthropic API error: {resp.status_code} {resp.text}")
-                            # --- Gemini ---
-                            elif _provider and _provider.name.lower() == 'gemini':
-                                import requests
-                                api_key = _provider.api_key
-                                api_url = getattr(_provider, 'api_url', f"https://generativelanguage.googleapis.com/v1beta/models/{model_id_for_api}:generateContent?key={api_key}")
-                                headers = {"content-type": "application/json"}
-                                parts = []
-                                if persona:
-                                    parts.append({"text": persona})
-                                # Only include memory for this persona/model and user
-                                for role, content in self.user_message_memory.get(key, []):
-                                    if role == "user":
-                                        parts.append({"text": content})
-                                    elif role == persona_name:
-                                        parts.append({"text": content})
-                                parts.append({"text": prompt})
-                                data = {
-                                    "contents": [{"parts": parts}]
-                                }
-                                resp = requests.post(api_url, json=data, headers=headers, timeout=30)
-                                if resp.status_code == 200:
-                                    candidates = resp.json().get('candidates', [])
-                                    reply = candidates[0]['content']['parts'][0]['text'] if candidates and 'content' in candidates[0] and 'parts' in candidates[0]['content'] and candidates[0]['content']['parts'] else 'No response'
-                                    for chunk in split_message_chunks(reply):
-                                        await ctx.send(chunk)
-                                    self.user_message_memory[key].append(("user", prompt))
-                                    self.user_message_memory[key].append((persona_name, reply))
-                                else:
-                                    await ctx.send(f"Gemini API error: {resp.status_code} {resp.text}")
-                            # --- DeepSeek ---
-                            elif _provider and _provider.name.lower() == 'deepseek':
-                                import requests
-                                api_key = _provider.api_key
-                                api_url = getattr(_provider, 'api_url', 'https://api.deepseek.com/v1/chat/completions')
-                                headers = {
-                                    "Authorization": f"Bearer {api_key}",
-                                    "content-type": "application/json"
-                                }
-                                messages = []
-                                if persona:
-                                    messages.append({"role": "system", "content": persona})
-                                for role, content in self.user_message_memory.get(key, []):
-                                    if role == "user":
-                                        messages.append({"role": "user", "content": content})
-                                    elif role == persona_name:
-                                        messages.append({"role": "assistant", "content": content})
-                                messages.append({"role": "user", "content": prompt})
-                                data = {
-                                    "model": model_id_for_api,
-                                    "messages": messages,
-                                    "max_tokens": _integration_config.get("max_tokens", 1024) if _integration_config else 1024,
-                                    "temperature": _integration_config.get("temperature", 0.7) if _integration_config else 0.7
-                                }
-                                resp = requests.post(api_url, json=data, headers=headers, timeout=30)
-                                if resp.status_code == 200:
-                                    reply = resp.json().get('choices', [{}])[0].get('message', {}).get('content', 'No response')
-                                    for chunk in split_message_chunks(reply):
-                                        await ctx.send(chunk)
-                                    self.user_message_memory[key].append(("user", prompt))
-                                    self.user_message_memory[key].append((persona_name, reply))
-                                else:
-                                    await ctx.send(f"DeepSeek API error: {resp.status_code} {resp.text}")
-                            # --- Mistral ---
-                            elif _provider and _provider.name.lower() == 'mistral':
-                                import requests
-                                api_key = _provider.api_key
-                                api_url = getattr(_provider, 'api_url', 'https://api.mistral.ai/v1/chat/completions')
-                                headers = {
-                                    "Authorization": f"Bearer {api_key}",
-                                    "content-type": "application/json"
-                                }
-                                messages = []
-                                if persona:
-                                    messages.append({"role": "system", "content": persona})
-                                for role, content in self.user_message_memory.get(key, []):
-                                    if role == "user":
-                                        messages.append({"role": "user", "content": content})
-                                    elif role == persona_name:
-                                        messages.append({"role": "assistant", "content": content})
-                                messages.append({"role": "user", "content": prompt})
-                                data = {
-                                    "model": model_id_for_api,
-                                    "messages": messages,
-                                    "max_tokens": _integration_config.get("max_tokens", 1024) if _integration_config else 1024,
-                                    "temperature": _integration_config.get("temperature", 0.7) if _integration_config else 0.7
-                                }
-                                resp = requests.post(api_url, json=data, headers=headers, timeout=30)
-                                if resp.status_code == 200:
-                                    reply = resp.json().get('choices', [{}])[0].get('message', {}).get('content', 'No response')
-                                    for chunk in split_message_chunks(reply):
-                                        await ctx.send(chunk)
-                                    self.user_message_memory[key].append(("user", prompt))
-                                    self.user_message_memory[key].append((persona_name, reply))
-                                else:
-                                    await ctx.send(f"Mistral API error: {resp.status_code} {resp.text}")
-                            # --- OpenRouter ---
-                            elif _provider and _provider.name.lower() == 'openrouter':
-                                import requests
-                                api_key = _provider.api_key
-                                api_url = getattr(_provider, 'api_url', 'https://openrouter.ai/api/v1/chat/completions')
-                                headers = {
-                                    "Authorization": f"Bearer {api_key}",
-                                    "Content-Type": "application/json"
-                                }
-                                messages = []
-                                if persona:
-                                    messages.append({"role": "system", "content": persona})
-                                for role, content in self.user_message_memory.get(key, []):
-                                    if role == "user":
-                                        messages.append({"role": "user", "content": content})
-                                    elif role == persona_name:
-                                        messages.append({"role": "assistant", "content": content})
-                                messages.append({"role": "user", "content": prompt})
-                                data = {
-                                    "model": model_id_for_api,
-                                    "messages": messages,
-                                    "max_tokens": _integration_config.get("max_tokens", 1024) if _integration_config else 1024,
-                                    "temperature": _integration_config.get("temperature", 0.7) if _integration_config else 0.7
-                                }
-                                resp = requests.post(api_url, json=data, headers=headers, timeout=30)
-                                if resp.status_code == 200:
-                                    reply = resp.json().get('choices', [{}])[0].get('message', {}).get('content', 'No response')
-                                    for chunk in split_message_chunks(reply):
-                                        await ctx.send(chunk)
-                                    self.user_message_memory[key].append(("user", prompt))
-                                    self.user_message_memory[key].append((persona_name, reply))
-                                else:
-                                    await ctx.send(f"OpenRouter API error: {resp.status_code} {resp.text}")
-                            else:
-                                await ctx.send(f"Unsupported provider: {getattr(_provider, 'name', 'Unknown')}")
-                            await buffer_msg.delete()
-                        except Exception as e:
-                            logger.error(f"Error in custom model command: {traceback.format_exc()}")
-                            error_chunks = split_message_chunks(f"An error occurred: {str(e)}\n\nDetails:\n{traceback.format_exc()}")
-                            for chunk in error_chunks:
-                                await ctx.send(chunk)
-                    custom_model_command.__name__ = command_name
-                    bot.command(name=command_name)(custom_model_command)
-            finally:
-                session.close()
-        register_model_commands()
+                        reply, answered_by = await complete_with_failover(spec.chain, context_messages)
+                        served_by.append(answered_by)
+                except ProviderError as e:
+                    timer.record("upstream", timer.elapsed() - send_seconds)
+                    outcome = "provider_error"
+                    if streaming_reply is not None and streaming_reply.text:
+                        # The buffer message already shows the start of the answer: keep it and note the cut
+                        await streaming_reply.finish()
+                        buffer_msg = None
+                        await ctx.send(f"Answer cut off: {e.provider} API error: {e.status} {e.body}")
+                    else:
+                        await ctx.send(f"{e.provider} API error: {e.status} {e.body}")
+                else:
+                    # Streamed edits count as sending, not as waiting on the provider
+                    timer.record("upstream", timer.elapsed() - send_seconds)
+                    if not spec.stream:
+                        timer.reset()
+                        for chunk in split_message_chunks(reply):
+                            await ctx.send(chunk)
+                        send_seconds = timer.elapsed()
+                    timer.record("send", send_seconds)
+                    timer.reply_chars = len(reply)
+                    outcome = "ok"
+                    # Store both user prompt and bot reply in memory as ("user", prompt), (persona_name, reply)
+                    self.memory.append(key, "user", prompt)
+                    self.memory.append(key, spec.persona_name, reply)
+                    # The key names the primary model, so fallback and hedged answers are not cached
+                    if cache_key is not None and served_by and served_by[0] is spec.adapter:
+                        await self.response_cache.put(cache_key, reply, spec.cache_ttl)
+            if buffer_msg is not None:
+                await buffer_msg.delete()
+        except Exception as e:
+            outcome = "error"
+            logger.error(f"Error in custom model command: {traceback.format_exc()}")
+            error_chunks = split_message_chunks(f"An error occurred: {str(e)}\n\nDetails:\n{traceback.format_exc()}")
+            for chunk in error_chunks:
+                await ctx.send(chunk)
+        finally:
+            timer.finish(outcome)
+
+    async def _complete_cached(self, spec: ModelCommandSpec, context_messages) -> str:
+        """One non-streamed answer, served from the response cache when the integration opts in"""
+        cache_key = spec.cache_key(context_messages) if spec.cache_ttl else None
+        if cache_key is not None:
+            cached = await self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        reply, answered_by = await complete_with_failover(spec.chain, context_messages)
+        # The key names the primary model, so fallback and hedged answers are not cached
+        if cache_key is not None and answered_by is spec.adapter:
+            await self.response_cache.put(cache_key, reply, spec.cache_ttl)
+        return reply
+
+    async def run_fanout(self, ctx, bot_id: int, text: Optional[str]) -> None:
+        """Send one prompt to several models concurrently and post each answer as it arrives"""
+        specs, prompt, error = parse_fanout_targets(text, self.command_specs.get(bot_id, {}))
+        if error:
+            await ctx.send(error)
+            return
+        if not prompt:
+            await ctx.send(f"Usage: !{FANOUT_COMMAND} [!model ...] <your prompt>")
+            return
+        key = self.get_memory_key(ctx.channel.id, ctx.author.id)
+        try:
+            # A fan-out weighs as much in the fair queue as the models it asks
+            ticket = self.fair_queue.submit(key, cost=len(specs))
+        except AdmissionRejected as e:
+            await ctx.send(f"Busy right now, {ctx.author.mention}: {e}. Please try again in a moment.")
+            return
+        try:
+            names = ", ".join(spec.persona_name for spec in specs)
+            if ticket.position:
+                buffer_msg = await ctx.send(f"Busy, position {ticket.position} in queue for {ctx.author.mention} ...")
+                await ticket.wait()
+                await buffer_msg.edit(content=f"Asking {names} for {ctx.author.mention} ...")
+            else:
+                buffer_msg = await ctx.send(f"Asking {names} for {ctx.author.mention} ...")
+            history = await self.memory.get_history(key)
+
+            async def ask(spec: ModelCommandSpec):
+                if spec.adapter is None:
+                    return spec, None, f"unsupported provider {spec.provider_name}"
+                try:
+                    # Each persona gets its own context from the shared history
+                    context_messages = spec.context_builder.build(history, prompt)
+                    return spec, await asyncio.wait_for(self._complete_cached(spec, context_messages), FANOUT_TIMEOUT), None
+                except asyncio.TimeoutError:
+                    return spec, None, f"timed out after {FANOUT_TIMEOUT:g}s"
+                except ProviderError as e:
+                    return spec, None, f"{e.provider} API error: {e.status}"
+                except Exception as e:
+                    logger.error(f"Fan-out to {spec.command} failed: {traceback.format_exc()}")
+                    return spec, None, f"error: {str(e)}"
+
+            answered = 0
+            for next_answer in asyncio.as_completed([ask(spec) for spec in specs]):
+                spec, reply, failure = await next_answer
+                if failure:
+                    await ctx.send(f"**{spec.persona_name}** ({spec.command}): {failure}")
+                    continue
+                if not answered:
+                    self.memory.append(key, "user", prompt)
+                answered += 1
+                self.memory.append(key, spec.persona_name, reply)
+                for chunk in split_message_chunks(f"**{spec.persona_name}** ({spec.command}):\n{reply}"):
+                    await ctx.send(chunk)
+            if answered < len(specs):
+                await ctx.send(f"{answered}/{len(specs)} models answered.")
+            await buffer_msg.delete()
+        except Exception as e:
+            logger.error(f"Error in fan-out command: {traceback.format_exc()}")
+            await ctx.send(f"An error occurred: {str(e)}")
+        finally:
+            ticket.release()
 
     async def create_bot(self, bot_id: int, token: str, name: str) -> Tuple[bool, str]:
+        existing = self.bots.get(bot_id)
+        if existing is not None and not existing.is_closed():
+            return True, f"Bot {name} is already running"
+        if bot_id in self._creating:
+            return True, f"Bot {name} is already starting"
+        self._creating.add(bot_id)
+        try:
+            return await self._create_bot(bot_id, token, name)
+        finally:
+            self._creating.discard(bot_id)
+
+    async def _create_bot(self, bot_id: int, token: str, name: str) -> Tuple[bool, str]:
         try:
             # Enable ALL intents
             intents = discord.Intents.all()
@@ -440,36 +452,82 @@ class DaeBotManager:
             
             # Create and setup bot
             bot = commands.Bot(command_prefix='!', intents=intents, help_command=None)
-            self.setup_bot(bot, name)
+            self.setup_bot(bot, name, bot_id)
+            # Register model commands for this bot's integrations
+            self.command_specs.pop(bot_id, None)
+            self.apply_command_specs(bot, bot_id, await asyncio.to_thread(self.load_command_specs, bot_id))
             
             try:
-                # Create background task for bot
-                task = asyncio.create_task(bot.start(token))
+                # Login is one REST call, so a bad token fails right here
+                await bot.login(token)
+                budget_error = await self._check_session_budget(bot, name)
+                if budget_error:
+                    await bot.close()
+                    logger.error(budget_error)
+                    return False, budget_error
+                # Create background task for the gateway connection
+                task = asyncio.create_task(bot.connect())
+                task.add_done_callback(lambda t, name=name: self._connection_ended(t, name))
                 self.bots[bot_id] = bot
-                
-                # Wait a bit to check if login succeeds
-                await asyncio.sleep(2)
-                
-                if bot.is_closed():
-                    error_msg = f'Bot {name} failed to start - connection closed'
-                    logger.error(error_msg)
-                    return False, error_msg
-                
-                return True, "Bot started successfully"
+                return await self._wait_until_ready(bot_id, bot, task, name)
                 
             except discord.LoginFailure as e:
                 error_msg = f'Failed to login bot {name}: Invalid token'
                 logger.error(f'{error_msg}: {str(e)}')
+                await bot.close()
                 return False, error_msg
             except Exception as e:
                 error_msg = f'Failed to start bot {name}: {str(e)}'
                 logger.error(f'{error_msg}\n{traceback.format_exc()}')
+                await bot.close()
                 return False, error_msg
                 
         except Exception as e:
             error_msg = f'Error creating bot {name}: {str(e)}'
             logger.error(f'{error_msg}\n{traceback.format_exc()}')
             return False, error_msg
+
+    async def _check_session_budget(self, bot: commands.Bot, name: str) -> Optional[str]:
+        """
+        Every gateway IDENTIFY spends one of the bot's daily session starts and
+        Discord resets the token once they run out, so refuse to connect then
+        """
+        try:
+            _, _, limit = await bot.http.get_bot_gateway()
+        except Exception as e:
+            logger.warning(f"Could not read session start limit of bot {name}: {str(e)}")
+            return None
+        remaining = limit.get("remaining", 1)
+        if remaining <= 0:
+            return f"Bot {name} has no session starts left; resets in {limit.get('reset_after', 0) / 1000:.0f}s"
+        if remaining < BOT_SESSION_START_WARN:
+            logger.warning(f"Bot {name} has only {remaining} of {limit.get('total')} session starts left today")
+        return None
+
+    async def _wait_until_ready(self, bot_id: int, bot: commands.Bot, task: asyncio.Task, name: str) -> Tuple[bool, str]:
+        """Wait for on_ready, or for the connection to fail, up to BOT_READY_TIMEOUT"""
+        ready = asyncio.create_task(bot.wait_until_ready())
+        done, _ = await asyncio.wait({task, ready}, timeout=BOT_READY_TIMEOUT, return_when=asyncio.FIRST_COMPLETED)
+        if ready in done:
+            return True, "Bot started successfully"
+        ready.cancel()
+        if task in done:
+            if self.bots.get(bot_id) is bot:
+                del self.bots[bot_id]
+                self.command_specs.pop(bot_id, None)
+            error = task.exception() if not task.cancelled() else None
+            await bot.close()
+            error_msg = f'Bot {name} failed to start - {error or "connection closed"}'
+            logger.error(error_msg)
+            return False, error_msg
+        # Logged in but guilds are still loading; on_ready will follow
+        logger.warning(f"Bot {name} not ready after {BOT_READY_TIMEOUT:g}s; still connecting")
+        return True, f"Bot logged in; still connecting after {BOT_READY_TIMEOUT:g}s"
+
+    @staticmethod
+    def _connection_ended(task: asyncio.Task, name: str) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Bot {name} disconnected: {task.exception()}")
     
     async def stop_bot(self, bot_id: int) -> bool:
         try:
@@ -477,6 +535,10 @@ class DaeBotManager:
                 bot = self.bots[bot_id]
                 await bot.close()
                 del self.bots[bot_id]
+                self.command_specs.pop(bot_id, None)
+                if not self.bots:
+                    # Release pooled provider connections once no bot needs them
+                    await close_session()
                 return True
             return False
         except Exception as e:
@@ -486,6 +548,22 @@ class DaeBotManager:
     def get_bot(self, bot_id: int) -> Optional[commands.Bot]:
         return self.bots.get(bot_id)
 
+def _queue_metrics():
+    managers = list(_managers)
+    return [(("running",), sum(m.fair_queue.running for m in managers)),
+            (("queued",), sum(m.fair_queue.queued for m in managers))]
+
+
+def _gateway_metrics():
+    # latency is NaN until the first heartbeat is acknowledged
+    return [((bot_id,), bot.latency) for m in list(_managers) for bot_id, bot in list(m.bots.items())
+            if not math.isnan(bot.latency)]
+
+
+# Registered once per process and scraped on demand, so tracking these costs nothing between scrapes
+COMMAND_QUEUE.add_callback(_queue_metrics)
+GATEWAY_LATENCY.add_callback(_gateway_metrics)
+
 # Create a global bot manager instance
 bot_manager = DaeBotManager()
 
@@ -15,4 +15,13 @@ class DiscordBot(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship to the AI model
-    model = relationship("AIModel", backref="bots")
\ No newline at end of file
+    model = relationship("AIModel", backref="bots")
+
+class BotLease(Base):
+    """Which node currently owns a bot's gateway connection, and until when"""
+    __tablename__ = "bot_leases"
+
+    bot_id = Column(Integer, ForeignKey("discord_bots.id", ondelete="CASCADE"), primary_key=True)
+    node_id = Column(String, nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False)
+    renewed_at = Column(DateTime, default=datetime.utcnow)
@@ -20,7 +20,8 @@ class DiscordBot(BaseModel):
     id: int
     name: str
     token: str
-    is_active: bool
+    is_active: bool  # Desired state: started at boot and kept running while true
+    is_running: bool = False  # Whether the bot is connected right now, here or on another node
     created_at: datetime
     updated_at: datetime
     guilds: List[Dict[str, str]] = []  # List of guilds the bot is connected to
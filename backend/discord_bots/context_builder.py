@@ -0,0 +1,60 @@
+import logging
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Default prompt budget when a model's configuration has no "context_tokens"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+# Chat formats add a few tokens of framing per message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional; fall back to the estimator below
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when installed, else a ~4 chars/token estimate"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+class ContextBuilder:
+    """
+    Packs the persona, the most recent conversation turns and the prompt into a
+    token budget. Built once per model command; history entries carry their
+    token count from the memory store, so nothing is re-tokenized per call.
+    """
+
+    def __init__(self, persona: Optional[str], persona_name: str, budget: int = CONTEXT_TOKEN_BUDGET):
+        self.persona = persona
+        self.persona_name = persona_name
+        self.budget = budget
+        self.persona_tokens = count_tokens(persona) + MESSAGE_OVERHEAD_TOKENS if persona else 0
+
+    def build(self, history: Sequence[Tuple[str, str, int]], prompt: str) -> List[Dict[str, str]]:
+        """Return chat messages: persona, as many recent turns as fit, then the prompt"""
+        remaining = self.budget - self.persona_tokens - count_tokens(prompt) - MESSAGE_OVERHEAD_TOKENS
+        turns = []
+        for role, content, tokens in reversed(history):
+            if role == "user":
+                chat_role = "user"
+            elif role == self.persona_name:
+                chat_role = "assistant"
+            else:
+                # Turns from other personas are not part of this model's conversation
+                continue
+            remaining -= tokens + MESSAGE_OVERHEAD_TOKENS
+            if remaining < 0:
+                break
+            turns.append({"role": chat_role, "content": content})
+        messages = [{"role": "system", "content": self.persona}] if self.persona else []
+        messages.extend(reversed(turns))
+        messages.append({"role": "user", "content": prompt})
+        return messages
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Model commands handled at once per process; the rest wait in the fair queue
+COMMAND_MAX_CONCURRENCY = int(os.getenv("COMMAND_MAX_CONCURRENCY", "16"))
+# Admission limits: total queue depth, queued commands per (channel, user), projected wait in seconds
+COMMAND_QUEUE_LIMIT = int(os.getenv("COMMAND_QUEUE_LIMIT", "100"))
+COMMAND_QUEUE_PER_USER = int(os.getenv("COMMAND_QUEUE_PER_USER", "3"))
+COMMAND_MAX_QUEUE_WAIT = float(os.getenv("COMMAND_MAX_QUEUE_WAIT", "120"))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a command is shed instead of queued"""
+
+
+class Ticket:
+    """A command's place in the fair queue; release() it when the command is done"""
+
+    __slots__ = ("queue", "key", "cost", "position", "future", "enqueued", "started")
+
+    def __init__(self, queue: "FairQueue", key: Hashable, cost: int, position: int):
+        self.queue = queue
+        self.key = key
+        self.cost = cost
+        self.position = position
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued = time.monotonic()
+        self.started: Optional[float] = None
+
+    async def wait(self) -> None:
+        """Wait until the command may run"""
+        try:
+            await self.future
+        except asyncio.CancelledError:
+            self.queue._cancel(self)
+            raise
+
+    def release(self) -> None:
+        self.queue._finish(self)
+
+
+class FairQueue:
+    """
+    Deficit round-robin queue in front of the model commands.
+
+    Each (channel, user) key gets its own FIFO, and free slots go round-robin
+    across keys, so one user spamming commands waits behind their own backlog
+    instead of everyone else's. Admission control sheds a command up front
+    when the queue is too deep, the key already has too many queued, or the
+    projected wait (from a moving average of service times) is too long.
+    """
+
+    def __init__(self, max_concurrent: int = COMMAND_MAX_CONCURRENCY, max_queue: int = COMMAND_QUEUE_LIMIT,
+                 max_per_key: int = COMMAND_QUEUE_PER_USER, max_wait: float = COMMAND_MAX_QUEUE_WAIT,
+                 quantum: int = 1):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_per_key = max_per_key
+        self.max_wait = max_wait
+        self.quantum = quantum
+        self.running = 0
+        self.queued = 0
+        self._queues: Dict[Hashable, Deque[Ticket]] = {}
+        self._deficit: Dict[Hashable, int] = {}
+        self._active: Deque[Hashable] = deque()
+        # Moving average of how long a command holds its slot
+        self.avg_service = 5.0
+        self.admitted = 0
+        self.rejected = 0
+
+    def position(self, key: Hashable, index: int) -> int:
+        """Commands served before the index-th queued command of key, under round-robin"""
+        ahead = index
+        for other, queue in self._queues.items():
+            if other != key:
+                ahead += min(len(queue), index + 1)
+        return ahead + 1
+
+    def projected_wait(self, position: int) -> float:
+        return position * self.avg_service / max(1, self.max_concurrent)
+
+    def submit(self, key: Hashable, cost: int = 1) -> Ticket:
+        """
+        Admit a command. The returned ticket is already running when
+        ticket.position is 0; otherwise await ticket.wait() first.
+        """
+        queue = self._queues.get(key)
+        if self.running < self.max_concurrent and not self.queued:
+            ticket = Ticket(self, key, cost, 0)
+            self._start(ticket)
+            self.admitted += 1
+            return ticket
+        depth = len(queue) if queue else 0
+        position = self.position(key, depth)
+        if self.queued >= self.max_queue:
+            reason = "the queue is full"
+        elif depth >= self.max_per_key:
+            reason = f"you already have {depth} requests waiting"
+        elif self.projected_wait(position) > self.max_wait:
+            reason = f"the expected wait is over {int(self.max_wait)}s"
+        else:
+            reason = None
+        if reason:
+            self.rejected += 1
+            raise AdmissionRejected(reason)
+        ticket = Ticket(self, key, cost, position)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            self._deficit[key] = 0
+            self._active.append(key)
+        queue.append(ticket)
+        self.queued += 1
+        self.admitted += 1
+        return ticket
+
+    def _start(self, ticket: Ticket) -> None:
+        self.running += 1
+        ticket.started = time.monotonic()
+        if not ticket.future.done():
+            ticket.future.set_result(None)
+
+    def _dispatch(self) -> None:
+        while self.running < self.max_concurrent and self._active:
+            key = self._active[0]
+            queue = self._queues[key]
+            head = queue[0]
+            if self._deficit[key] < head.cost:
+                self._deficit[key] += self.quantum
+                self._active.rotate(-1)
+                continue
+            queue.popleft()
+            self.queued -= 1
+            self._deficit[key] -= head.cost
+            if not queue:
+                self._drop_key(key)
+            self._start(head)
+
+    def _drop_key(self, key: Hashable) -> None:
+        del self._queues[key]
+        del self._deficit[key]
+        self._active.remove(key)
+
+    def _cancel(self, ticket: Ticket) -> None:
+        queue = self._queues.get(ticket.key)
+        if ticket.started is None and queue is not None and ticket in queue:
+            queue.remove(ticket)
+            self.queued -= 1
+            if not queue:
+                self._drop_key(ticket.key)
+        elif ticket.started is not None:
+            # Dispatched just as the waiter was cancelled: give the slot back
+            self._finish(ticket)
+
+    def _finish(self, ticket: Ticket) -> None:
+        if ticket.started is None:
+            self._cancel(ticket)
+            return
+        self.running -= 1
+        service = time.monotonic() - ticket.started
+        self.avg_service = 0.9 * self.avg_service + 0.1 * service
+        # A second release() then finds nothing to free
+        ticket.started = None
+        self._dispatch()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "keys": len(self._queues),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_service_seconds": round(self.avg_service, 3),
+        }
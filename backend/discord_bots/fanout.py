@@ -0,0 +1,41 @@
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+from discord_bots.model_commands import ModelCommandSpec
+
+logger = logging.getLogger(__name__)
+
+# Name of the command that asks several models at once
+FANOUT_COMMAND = os.getenv("FANOUT_COMMAND", "multi")
+# Seconds each model gets before the fan-out posts a timeout for it
+FANOUT_TIMEOUT = float(os.getenv("FANOUT_TIMEOUT", "45"))
+FANOUT_MAX_MODELS = int(os.getenv("FANOUT_MAX_MODELS", "5"))
+
+
+def parse_fanout_targets(text: str, specs: Dict[str, ModelCommandSpec]) -> Tuple[List[ModelCommandSpec], str, Optional[str]]:
+    """
+    Split "!gpt !claude what is love" into the model specs and the prompt.
+    Without leading model commands every model of the bot is asked. Returns
+    (specs, prompt, error message).
+    """
+    # Only the target list is consumed; the prompt keeps its newlines, indentation and code blocks
+    rest = (text or "").lstrip()
+    targets: List[ModelCommandSpec] = []
+    while rest.startswith("!"):
+        word = rest.split(maxsplit=1)[0]
+        name = word.lstrip("!")
+        spec = specs.get(name)
+        if spec is None:
+            return [], "", f"Unknown model command: !{name}"
+        if spec not in targets:
+            targets.append(spec)
+        rest = rest[len(word):].lstrip()
+    prompt = rest.rstrip()
+    if not targets:
+        targets = list(specs.values())
+    if not targets:
+        return [], prompt, "No models are integrated with this bot."
+    if len(targets) > FANOUT_MAX_MODELS:
+        return [], prompt, f"At most {FANOUT_MAX_MODELS} models can be asked at once."
+    return targets, prompt, None
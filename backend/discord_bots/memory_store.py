@@ -0,0 +1,456 @@
+import asyncio
+import atexit
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+
+from discord_bots.context_builder import count_tokens
+from observability import registry
+
+logger = logging.getLogger(__name__)
+
+# Max entries remembered per (channel, user); the context builder trims them to the token budget
+MEMORY_HISTORY_SIZE = int(os.getenv("MEMORY_HISTORY_SIZE", "40"))
+# "memory" keeps history in this process only, "sql" persists it to the database
+MEMORY_BACKEND = os.getenv("MEMORY_BACKEND", "memory").lower()
+MEMORY_CACHE_KEYS = int(os.getenv("MEMORY_CACHE_KEYS", "10000"))
+# Idle conversations expire after this many seconds (0 disables the TTL)
+MEMORY_TTL_SECONDS = float(os.getenv("MEMORY_TTL_SECONDS", "21600"))
+MEMORY_MAX_BYTES_PER_KEY = int(os.getenv("MEMORY_MAX_BYTES_PER_KEY", "16384"))
+MEMORY_FLUSH_INTERVAL = float(os.getenv("MEMORY_FLUSH_INTERVAL", "2.0"))
+MEMORY_FLUSH_BATCH = int(os.getenv("MEMORY_FLUSH_BATCH", "200"))
+# Failed flushes retry a message this many times before dropping it
+MEMORY_FLUSH_RETRIES = int(os.getenv("MEMORY_FLUSH_RETRIES", "3"))
+# A cached key is checked against the database for other processes' writes at most this often
+MEMORY_REVALIDATE_SECONDS = float(os.getenv("MEMORY_REVALIDATE_SECONDS", "1.0"))
+# Stored messages older than this are deleted (0 keeps them); rows past MEMORY_HISTORY_SIZE per key always are
+MEMORY_RETENTION_SECONDS = float(os.getenv("MEMORY_RETENTION_SECONDS", "2592000"))
+MEMORY_PRUNE_INTERVAL = float(os.getenv("MEMORY_PRUNE_INTERVAL", "3600"))
+
+# (role, content, token count)
+Entry = Tuple[str, str, int]
+
+
+class MemoryStore:
+    """Conversation history keyed by DaeBotManager.get_memory_key()"""
+
+    async def get_history(self, key: str) -> List[Entry]:
+        raise NotImplementedError
+
+    def append(self, key: str, role: str, content: str, create: bool = True) -> bool:
+        """
+        Add an entry to a key's history. With create=False the entry is only
+        stored if the key already has a live conversation. Returns whether it
+        was stored.
+        """
+        raise NotImplementedError
+
+    async def append_existing(self, key: str, role: str, content: str) -> bool:
+        """
+        Add an entry only if the key already has a conversation, in memory or,
+        for persistent backends, in storage. Returns whether it was stored.
+        """
+        return self.append(key, role, content, create=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Footprint counters for monitoring"""
+        return {}
+
+    def flush(self) -> None:
+        """Persist pending writes, if the backend buffers any"""
+
+    def close(self) -> None:
+        self.flush()
+
+
+class _Conversation:
+    """Compact per-key history: (role_id, content, nbytes, ntokens) tuples plus their total UTF-8 footprint"""
+
+    __slots__ = ("entries", "nbytes", "touched")
+
+    def __init__(self, touched: float):
+        self.entries: Deque[Tuple[int, str, int, int]] = collections.deque()
+        self.nbytes = 0
+        self.touched = touched
+
+
+class InMemoryStore(MemoryStore):
+    """
+    Process-local LRU of per-key histories, bounded three ways: a global key
+    limit, a TTL after which idle conversations expire, and a byte budget per
+    key. Role names are interned to small ints so each entry is one tuple.
+    """
+
+    def __init__(self, history_size: int = MEMORY_HISTORY_SIZE, max_keys: int = MEMORY_CACHE_KEYS,
+                 ttl: float = MEMORY_TTL_SECONDS, max_bytes_per_key: int = MEMORY_MAX_BYTES_PER_KEY):
+        self.history_size = history_size
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.max_bytes_per_key = max_bytes_per_key
+        self._data: "collections.OrderedDict[str, _Conversation]" = collections.OrderedDict()
+        self._role_ids: Dict[str, int] = {}
+        self._role_names: List[str] = []
+        self._bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._lock = threading.Lock()
+
+    def _role_id(self, role: str) -> int:
+        role_id = self._role_ids.get(role)
+        if role_id is None:
+            role_id = self._role_ids[role] = len(self._role_names)
+            self._role_names.append(sys.intern(role))
+        return role_id
+
+    def _get(self, key: str, now: float) -> Optional[_Conversation]:
+        conversation = self._data.get(key)
+        if conversation is None:
+            return None
+        if self.ttl and now - conversation.touched > self.ttl:
+            self._drop(key)
+            self.expirations += 1
+            return None
+        conversation.touched = now
+        self._data.move_to_end(key)
+        return conversation
+
+    def _drop(self, key: str) -> None:
+        conversation = self._data.pop(key)
+        self._bytes -= conversation.nbytes
+
+    def peek(self, key: str) -> Optional[List[Entry]]:
+        """Return the cached history, or None if the key is not cached"""
+        with self._lock:
+            conversation = self._get(key, time.monotonic())
+            if conversation is None:
+                return None
+            names = self._role_names
+            return [(names[role_id], content, ntokens) for role_id, content, _, ntokens in conversation.entries]
+
+    def put(self, key: str, entries: List[Tuple[str, str]]) -> None:
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            conversation = self._data[key] = _Conversation(time.monotonic())
+            for role, content in entries:
+                self._add(conversation, role, content)
+            self._evict(time.monotonic())
+
+    def contains(self, key: str) -> bool:
+        return key in self._data
+
+    async def get_history(self, key: str) -> List[Entry]:
+        return self.peek(key) or []
+
+    def append(self, key: str, role: str, content: str, create: bool = True) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            conversation = self._get(key, now)
+            if conversation is None:
+                if not create:
+                    return False
+                conversation = self._data[key] = _Conversation(now)
+            self._add(conversation, role, content)
+            self._evict(now)
+            return True
+
+    def _add(self, conversation: _Conversation, role: str, content: str) -> None:
+        size = len(content.encode("utf-8"))
+        # Token counts are computed once here and reused by every context build
+        conversation.entries.append((self._role_id(role), content, size, count_tokens(content)))
+        conversation.nbytes += size
+        self._bytes += size
+        # Keep at least the newest entry, even if it alone is over budget
+        while len(conversation.entries) > 1 and (
+            len(conversation.entries) > self.history_size or conversation.nbytes > self.max_bytes_per_key
+        ):
+            _, _, dropped_size, _ = conversation.entries.popleft()
+            conversation.nbytes -= dropped_size
+            self._bytes -= dropped_size
+
+    def _evict(self, now: float) -> None:
+        # Least recently used keys are first, so expired ones cluster at the front
+        while self._data:
+            key, conversation = next(iter(self._data.items()))
+            if len(self._data) > self.max_keys:
+                self.evictions += 1
+            elif self.ttl and now - conversation.touched > self.ttl:
+                self.expirations += 1
+            else:
+                break
+            self._drop(key)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "keys": len(self._data),
+            "bytes": self._bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SQLMemoryStore(MemoryStore):
+    """
+    Database-backed history with a hot-key cache and write-behind inserts.
+
+    Reads are served from the in-process cache; a miss loads the key's latest
+    entries once, off the event loop. Appends update the cache immediately and
+    are batched into bulk INSERTs by a background flusher thread.
+
+    Other processes (bot workers, other nodes) write the same keys, so every
+    cached key remembers the newest row id it reflects. A read more than
+    revalidate seconds after the last check compares it with the database's
+    newest id for the key and reloads the key when they differ. The flusher
+    also trims rows past the history size or older than the retention.
+    """
+
+    def __init__(self, session_factory, history_size: int = MEMORY_HISTORY_SIZE, cache_keys: int = MEMORY_CACHE_KEYS,
+                 flush_interval: float = MEMORY_FLUSH_INTERVAL, flush_batch: int = MEMORY_FLUSH_BATCH,
+                 flush_retries: int = MEMORY_FLUSH_RETRIES, revalidate: float = MEMORY_REVALIDATE_SECONDS,
+                 retention: float = MEMORY_RETENTION_SECONDS, prune_interval: float = MEMORY_PRUNE_INTERVAL):
+        self.session_factory = session_factory
+        self.history_size = history_size
+        self.cache = InMemoryStore(history_size, cache_keys)
+        self.flush_batch = flush_batch
+        self.flush_retries = max(1, flush_retries)
+        self.revalidate = revalidate
+        self.retention = retention
+        self.prune_interval = prune_interval
+        # (key, role, content, failed flush attempts)
+        self._pending: List[Tuple[str, str, str, int]] = []
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # key -> (newest row id the cached history reflects, monotonic time of the last check)
+        self._versions: Dict[str, Tuple[Optional[int], float]] = {}
+        self._versions_lock = threading.Lock()
+        self.dropped_writes = 0
+        self.reloads = 0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._flush_interval = flush_interval
+        self._thread = threading.Thread(target=self._run, name="memory-store-flusher", daemon=True)
+        self._thread.start()
+
+    async def get_history(self, key: str) -> List[Entry]:
+        history = self.cache.peek(key)
+        if history is not None:
+            version, checked = self._versions.get(key, (None, 0.0))
+            now = time.monotonic()
+            if now - checked < self.revalidate:
+                return history
+            try:
+                latest = await asyncio.to_thread(self._latest_id, key)
+            except Exception as e:
+                logger.warning(f"Failed to check conversation memory for {key}, using the cached history: {e}")
+                return history
+            if latest == version:
+                with self._versions_lock:
+                    self._versions[key] = (version, now)
+                return history
+            # Another process wrote this key since it was cached
+            self.reloads += 1
+        await asyncio.to_thread(self._load, key)
+        return self.cache.peek(key) or []
+
+    def append(self, key: str, role: str, content: str, create: bool = True) -> bool:
+        # Under the pending lock, so a reload sees each entry either in the database or still pending
+        with self._pending_lock:
+            if not self.cache.append(key, role, content, create=create):
+                return False
+            self._pending.append((key, role, content, 0))
+            full = len(self._pending) >= self.flush_batch
+        if full:
+            self._wake.set()
+        return True
+
+    async def append_existing(self, key: str, role: str, content: str) -> bool:
+        if self.append(key, role, content, create=False):
+            return True
+        # Not cached here (restart, eviction, another worker): the conversation may still be stored
+        try:
+            latest = await asyncio.to_thread(self._latest_id, key)
+        except Exception as e:
+            logger.warning(f"Failed to check conversation memory for {key}: {e}")
+            return False
+        if latest is None:
+            return False
+        await asyncio.to_thread(self._load, key)
+        return self.append(key, role, content, create=False)
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats["pending_writes"] = len(self._pending)
+        stats["dropped_writes"] = self.dropped_writes
+        stats["reloads"] = self.reloads
+        return stats
+
+    def _latest_id(self, key: str) -> Optional[int]:
+        from models.models import ConversationMessage
+        session = self.session_factory()
+        try:
+            return (
+                session.query(func.max(ConversationMessage.id))
+                .filter(ConversationMessage.memory_key == key)
+                .scalar()
+            )
+        finally:
+            session.close()
+
+    def _load(self, key: str) -> None:
+        """Replace the key's cached history with its newest rows plus its unflushed appends"""
+        from models.models import ConversationMessage
+        with self._flush_lock:
+            self._flush()
+            session = self.session_factory()
+            try:
+                rows = (
+                    session.query(ConversationMessage.id, ConversationMessage.role, ConversationMessage.content)
+                    .filter(ConversationMessage.memory_key == key)
+                    .order_by(ConversationMessage.id.desc())
+                    .limit(self.history_size)
+                    .all()
+                )
+            except Exception as e:
+                logger.error(f"Failed to load conversation memory for {key}: {e}")
+                return
+            finally:
+                session.close()
+            with self._pending_lock:
+                # Appends whose flush failed are still pending; keep them after the stored rows
+                pending = [(role, content) for pending_key, role, content, _ in self._pending if pending_key == key]
+                self.cache.put(key, [(row.role, row.content) for row in reversed(rows)] + pending)
+                with self._versions_lock:
+                    self._versions[key] = (rows[0].id if rows else None, time.monotonic())
+                    if len(self._versions) > 2 * self.cache.max_keys:
+                        for cached_key in [k for k in self._versions if not self.cache.contains(k)]:
+                            del self._versions[cached_key]
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        from models.models import ConversationMessage
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        keys = {key for key, _, _, _ in batch}
+        session = self.session_factory()
+        try:
+            # Newest ids before this batch; a key whose id moved was written by another process
+            before = dict(
+                session.query(ConversationMessage.memory_key, func.max(ConversationMessage.id))
+                .filter(ConversationMessage.memory_key.in_(keys))
+                .group_by(ConversationMessage.memory_key)
+                .all()
+            )
+            inserted = session.execute(
+                insert(ConversationMessage).returning(ConversationMessage.id, ConversationMessage.memory_key),
+                [{"memory_key": key, "role": role, "content": content} for key, role, content, _ in batch],
+            ).all()
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            retry = [(key, role, content, attempts + 1) for key, role, content, attempts in batch
+                     if attempts + 1 < self.flush_retries]
+            dropped = len(batch) - len(retry)
+            self.dropped_writes += dropped
+            logger.error(f"Failed to persist {len(batch)} conversation messages: {e}"
+                         + (f"; dropped {dropped} after {self.flush_retries} attempts" if dropped else ""))
+            # Put the rest back so the next flush retries them
+            with self._pending_lock:
+                self._pending[:0] = retry
+            return
+        finally:
+            session.close()
+        newest: Dict[str, int] = {}
+        for row_id, key in inserted:
+            newest[key] = max(row_id, newest.get(key, row_id))
+        with self._versions_lock:
+            for key, row_id in newest.items():
+                version = self._versions.get(key)
+                if version is not None and version[0] == before.get(key):
+                    self._versions[key] = (row_id, version[1])
+                else:
+                    # Force a reload on the next read
+                    self._versions.pop(key, None)
+
+    def prune(self) -> None:
+        """Delete rows past each key's history size and, with a retention, rows older than it"""
+        from models.models import ConversationMessage
+        session = self.session_factory()
+        try:
+            ranked = select(
+                ConversationMessage.id,
+                func.row_number().over(
+                    partition_by=ConversationMessage.memory_key, order_by=ConversationMessage.id.desc()
+                ).label("position"),
+            ).subquery()
+            trimmed = (
+                session.query(ConversationMessage)
+                .filter(ConversationMessage.id.in_(select(ranked.c.id).where(ranked.c.position > self.history_size)))
+                .delete(synchronize_session=False)
+            )
+            expired = 0
+            if self.retention:
+                cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+                expired = (
+                    session.query(ConversationMessage)
+                    .filter(ConversationMessage.created_at < cutoff)
+                    .delete(synchronize_session=False)
+                )
+            session.commit()
+            if trimmed or expired:
+                logger.info(f"Pruned {trimmed} conversation messages past the history size and {expired} expired ones")
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Failed to prune conversation messages: {e}")
+        finally:
+            session.close()
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def _run(self) -> None:
+        next_prune = time.monotonic()
+        while not self._stopped.is_set():
+            self._wake.wait(self._flush_interval)
+            self._wake.clear()
+            self.flush()
+            if self.prune_interval and time.monotonic() >= next_prune:
+                next_prune = time.monotonic() + self.prune_interval
+                self.prune()
+
+
+_store: Optional[MemoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_memory_store() -> MemoryStore:
+    """Return the process-wide memory store shared by every DaeBotManager"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if MEMORY_BACKEND == "sql":
+                from config.database import SessionLocal
+                _store = SQLMemoryStore(SessionLocal)
+            else:
+                _store = InMemoryStore()
+            atexit.register(_store.close)
+            store = _store
+            registry.gauge("dae_memory_store", "Conversation memory footprint counters", ("stat",)).add_callback(
+                lambda: [((stat,), value) for stat, value in store.stats().items()]
+            )
+            logger.info(f"Using {type(_store).__name__} for conversation memory")
+        return _store
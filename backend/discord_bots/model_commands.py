@@ -0,0 +1,156 @@
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ai_providers import ProviderAdapter, create_adapter
+from discord_bots.context_builder import ContextBuilder, CONTEXT_TOKEN_BUDGET
+from discord_bots.streaming import STREAM_RESPONSES_DEFAULT
+from discord_bots.response_cache import response_cache_key
+from observability import registry, request_log, traffic_recorder
+
+logger = logging.getLogger(__name__)
+
+COMMAND_STAGE_SECONDS = registry.histogram(
+    "dae_command_stage_seconds", "Time spent in each stage of a model command",
+    ("bot", "command", "model", "provider", "stage"),
+)
+COMMANDS = registry.counter("dae_commands", "Model commands handled, by outcome", ("bot", "command", "model", "provider", "outcome"))
+
+
+class CommandMetrics:
+    """Metric children of one model command, resolved when its spec is built"""
+
+    __slots__ = ("labels", "memory", "context", "cache", "queue", "upstream", "send",
+                 "ok", "cache_hit", "provider_error", "error", "rejected")
+
+    def __init__(self, bot_id, command: str, model: str, provider: str):
+        self.labels = {"bot": bot_id, "command": command, "model": model, "provider": provider}
+        labels = (bot_id, command, model, provider)
+        for stage in ("memory", "context", "cache", "queue", "upstream", "send"):
+            setattr(self, stage, COMMAND_STAGE_SECONDS.labels(*labels, stage))
+        for outcome in ("ok", "cache_hit", "provider_error", "error", "rejected"):
+            setattr(self, outcome, COMMANDS.labels(*labels, outcome))
+
+
+class CommandTimer:
+    """
+    Stage clock of one model command run. Every stage goes to the command's
+    histograms and, when the request is sampled, to its request log trace.
+    With traffic recording on, the finished run is also recorded for replay;
+    set reply_chars once the answer is known.
+    """
+
+    __slots__ = ("metrics", "trace", "mark", "started", "traffic", "reply_chars")
+
+    def __init__(self, spec: "ModelCommandSpec", ctx=None, prompt: Optional[str] = None):
+        self.metrics = spec.metrics
+        self.trace = request_log.start(spec.metrics.labels)
+        self.mark = self.started = time.perf_counter()
+        self.traffic = (time.time(), ctx.channel.id, ctx.author.id, len(prompt or "")) \
+            if traffic_recorder.enabled and ctx is not None else None
+        self.reply_chars = 0
+
+    def reset(self) -> None:
+        self.mark = time.perf_counter()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.mark
+
+    def lap(self, stage: str) -> None:
+        """Record the time since the last lap or reset as stage"""
+        now = time.perf_counter()
+        self.record(stage, now - self.mark)
+        self.mark = now
+
+    def record(self, stage: str, seconds: float) -> None:
+        getattr(self.metrics, stage).observe(seconds)
+        if self.trace is not None:
+            self.trace.add(stage, seconds)
+
+    def finish(self, outcome: str) -> None:
+        getattr(self.metrics, outcome).inc()
+        if self.trace is not None:
+            request_log.finish(self.trace, outcome)
+        if self.traffic is not None:
+            started, channel_id, user_id, prompt_chars = self.traffic
+            labels = self.metrics.labels
+            traffic_recorder.command(labels["bot"], labels["command"], channel_id, user_id, started, prompt_chars,
+                                     self.reply_chars, outcome, time.perf_counter() - self.started)
+
+
+class ModelCommandSpec:
+    """
+    Everything a model command needs at call time, resolved once from the
+    integration, model and provider rows. Specs are never mutated; a config
+    change builds a new spec and swaps it in.
+    """
+
+    __slots__ = ("command", "command_name", "provider_name", "adapter", "context_builder", "persona_name", "stream",
+                 "cache_ttl", "chain", "metrics")
+
+    def __init__(self, command: str, provider_name: str, adapter: Optional[ProviderAdapter],
+                 context_builder: ContextBuilder, persona_name: str, stream: bool, cache_ttl: int = 0,
+                 fallbacks: Sequence[ProviderAdapter] = (), metrics: Optional[CommandMetrics] = None):
+        self.command = command
+        self.command_name = command.lstrip('!')
+        self.provider_name = provider_name
+        self.adapter = adapter
+        self.context_builder = context_builder
+        self.persona_name = persona_name
+        self.stream = stream
+        self.cache_ttl = cache_ttl
+        # The model's adapter followed by its fallbacks, in the order they are tried
+        self.chain: Tuple[ProviderAdapter, ...] = tuple(a for a in (adapter, *fallbacks) if a is not None)
+        self.metrics = metrics or CommandMetrics(None, command, "unknown", provider_name)
+
+    def cache_key(self, messages: List[Dict[str, str]]) -> str:
+        """Response cache key for this command's model, persona and sampling params plus the context"""
+        return response_cache_key(self.provider_name, self.adapter.model_id, self.persona_name, self.adapter.template, messages)
+
+
+def build_command_spec(integration, model, provider, fallbacks: Sequence[Tuple[object, object]] = ()) -> ModelCommandSpec:
+    """
+    Resolve adapter, persona, streaming flag and token budget for one
+    integration; fallbacks are the (model, provider) pairs of its fallback chain
+    """
+    integration_config = integration.config if hasattr(integration, 'config') else {}
+    model_id_for_api = getattr(model, 'model_id', None) or getattr(model, 'name', None)
+    try:
+        config_json = json.loads(getattr(model, 'configuration', '{}') or '{}')
+        if not isinstance(config_json, dict):
+            config_json = {}
+    except (ValueError, TypeError):
+        config_json = {}
+    # Each optional field falls back on its own, so one bad value doesn't drop the persona
+    persona = config_json.get('behavior') or config_json.get('persona')
+    if not isinstance(persona, str):
+        persona = None
+    stream = config_json.get('stream', STREAM_RESPONSES_DEFAULT)
+    if isinstance(stream, str):
+        stream = stream.strip().lower() in ('1', 'true', 'yes', 'on')
+    elif not isinstance(stream, (bool, int)):
+        logger.warning(f"Ignoring invalid stream setting {stream!r} of model {getattr(model, 'name', '?')}")
+        stream = STREAM_RESPONSES_DEFAULT
+    stream = bool(stream)
+    try:
+        context_tokens = int(config_json.get('context_tokens', CONTEXT_TOKEN_BUDGET))
+    except (ValueError, TypeError):
+        logger.warning(f"Ignoring invalid context_tokens of model {getattr(model, 'name', '?')}")
+        context_tokens = CONTEXT_TOKEN_BUDGET
+    persona_name = (getattr(model, 'name', None) or getattr(model, 'model_id', None) or 'assistant').lower()
+    provider_name = getattr(provider, 'name', 'Unknown')
+    return ModelCommandSpec(
+        command=integration.command,
+        provider_name=provider_name,
+        adapter=create_adapter(provider, model_id_for_api, integration_config),
+        context_builder=ContextBuilder(persona, persona_name, context_tokens),
+        persona_name=persona_name,
+        stream=stream,
+        cache_ttl=getattr(integration, 'cache_ttl', None) or 0,
+        fallbacks=[
+            create_adapter(fallback_provider, getattr(fallback_model, 'model_id', None) or getattr(fallback_model, 'name', None), integration_config)
+            for fallback_model, fallback_provider in fallbacks
+        ],
+        metrics=CommandMetrics(getattr(integration, 'bot_id', None), integration.command, model_id_for_api, provider_name),
+    )
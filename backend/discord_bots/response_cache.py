@@ -0,0 +1,149 @@
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Entries kept in the in-memory tier (least recently used are evicted first)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+# Also keep answers in the database, so they survive restarts and are shared between processes
+RESPONSE_CACHE_SQL = os.getenv("RESPONSE_CACHE_SQL", "false").lower() in ("1", "true", "yes")
+
+
+def response_cache_key(provider: str, model_id: str, persona: str, params: Dict[str, Any],
+                       messages: List[Dict[str, str]]) -> str:
+    """sha256 over everything that shapes the answer: provider, model, persona, sampling params and context"""
+    payload = json.dumps([provider, model_id, persona, params, messages], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Exact-match cache of model answers for integrations that opt in with a
+    cache_ttl. The in-memory tier is an LRU bounded by entry count, with a
+    TTL per entry. With a session factory, a SQL tier sits behind it: memory
+    misses are looked up there and new answers are written through.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, session_factory=None):
+        self.max_entries = max_entries
+        self.session_factory = session_factory
+        self._lock = threading.Lock()
+        # key -> (monotonic expiry time, answer)
+        self._data: "collections.OrderedDict[str, Tuple[float, str]]" = collections.OrderedDict()
+        self.hits = 0
+        self.sql_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get_local(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, text = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return text
+
+    def _put_local(self, key: str, text: str, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, text)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    async def get(self, key: str) -> Optional[str]:
+        text = self._get_local(key)
+        if text is not None:
+            self.hits += 1
+            return text
+        if self.session_factory is not None:
+            found = await asyncio.to_thread(self._load, key)
+            if found is not None:
+                text, ttl = found
+                self._put_local(key, text, ttl)
+                self.hits += 1
+                self.sql_hits += 1
+                return text
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, text: str, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        self._put_local(key, text, ttl)
+        if self.session_factory is not None:
+            await asyncio.to_thread(self._store, key, text, ttl)
+
+    def _load(self, key: str) -> Optional[Tuple[str, float]]:
+        from models.models import ResponseCacheEntry
+        session = self.session_factory()
+        try:
+            row = session.query(ResponseCacheEntry).filter(ResponseCacheEntry.key == key).first()
+            if row is None:
+                return None
+            remaining = (row.expires_at - datetime.utcnow()).total_seconds()
+            return (row.response, remaining) if remaining > 0 else None
+        except Exception as e:
+            logger.error(f"Response cache lookup failed: {str(e)}")
+            return None
+        finally:
+            session.close()
+
+    def _store(self, key: str, text: str, ttl: float) -> None:
+        from models.models import ResponseCacheEntry
+        session = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            session.merge(ResponseCacheEntry(key=key, response=text, expires_at=now + timedelta(seconds=ttl), created_at=now))
+            # Piggyback expiry of old rows on writes, which are much rarer than reads
+            session.query(ResponseCacheEntry).filter(ResponseCacheEntry.expires_at < now).delete(synchronize_session=False)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Response cache write failed: {str(e)}")
+        finally:
+            session.close()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = len(self._data)
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "sql_hits": self.sql_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide response cache shared by every DaeBotManager"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            session_factory = None
+            if RESPONSE_CACHE_SQL:
+                from config.database import SessionLocal
+                session_factory = SessionLocal
+            _cache = ResponseCache(session_factory=session_factory)
+        return _cache
@@ -0,0 +1,78 @@
+import logging
+import os
+import time
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+DISCORD_MESSAGE_LIMIT = 2000
+# Minimum seconds between two edits of the same message (Discord allows ~5 edits / 5s per channel)
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+# Streaming is opt-in per model via `"stream": true` in AIModel.configuration; this sets the default
+STREAM_RESPONSES_DEFAULT = os.getenv("STREAM_RESPONSES", "false").lower() in ("1", "true", "yes")
+
+
+class StreamingReply:
+    """
+    Progressively edits a Discord message while tokens stream in.
+
+    The first edit replaces the placeholder message; once the text passes the
+    2000-char limit the current message is finalized at the last whitespace and
+    the remainder continues in a new message.
+    """
+
+    def __init__(self, message: discord.Message, edit_interval: float = STREAM_EDIT_INTERVAL, limit: int = DISCORD_MESSAGE_LIMIT):
+        self.message = message
+        self.channel = message.channel
+        self.edit_interval = edit_interval
+        self.limit = limit
+        self.parts = []        # text of the messages already finalized
+        self.current = ""      # text of the message being edited
+        self.shown = None      # text last pushed to Discord for the current message
+        self.last_edit = 0.0
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts) + self.current
+
+    async def append(self, delta: str) -> None:
+        self.current += delta
+        while len(self.current) > self.limit:
+            await self._rollover()
+        if time.monotonic() - self.last_edit >= self.edit_interval:
+            await self._flush()
+
+    async def finish(self, empty_text: str = "No response") -> str:
+        """Push the final text and return the full reply"""
+        if not self.current and not self.parts:
+            self.current = empty_text
+        await self._flush()
+        return self.text
+
+    async def _rollover(self) -> None:
+        split_index = self.current[:self.limit].rfind(' ')
+        if split_index <= 0:
+            split_index = self.limit
+        head, tail = self.current[:split_index], self.current[split_index:]
+        rest = tail.lstrip()
+        self.current = head
+        await self._flush()
+        # Keep the whitespace we split on so `text` matches what the provider sent
+        self.parts.append(head + tail[:len(tail) - len(rest)])
+        self.current = rest
+        first = self.current.strip() if 0 < len(self.current) <= self.limit else "..."
+        self.message = await self.channel.send(first or "...")
+        self.shown = first or "..."
+        self.last_edit = time.monotonic()
+
+    async def _flush(self) -> None:
+        content = self.current.strip() or "..."
+        if content == self.shown:
+            return
+        try:
+            await self.message.edit(content=content)
+            self.shown = content
+        except discord.HTTPException as e:
+            logger.warning(f"Failed to edit streaming message: {e}")
+        self.last_edit = time.monotonic()
@@ -11,7 +11,7 @@ from typing import Tuple
 import asyncio
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import text
-from routers import providers, models as models_router, bots, bot_model_integrations
+from routers import providers, models as models_router, bots, bot_model_integrations, system, metrics, debug
 from fastapi.staticfiles import StaticFiles
 import os
 
@@ -39,6 +39,8 @@ def init_db():
         
         # This will only create tables that don't exist yet
         Base.metadata.create_all(bind=engine)
+        models.add_cache_ttl_column(engine)
+        models.add_fallback_models_column(engine)
         logger.info("Database tables verified successfully")
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
@@ -62,8 +64,25 @@ app.include_router(providers.router)
 app.include_router(models_router.router)
 app.include_router(bots.router)
 app.include_router(bot_model_integrations.router)
+app.include_router(system.router)
+app.include_router(metrics.router)
+app.include_router(debug.router)
 
 # Serve static files for model images
 static_dir = os.path.join(os.path.dirname(__file__), '../static/model_images')
 os.makedirs(static_dir, exist_ok=True)
 app.mount("/model_images", StaticFiles(directory=static_dir), name="model_images")
+
+@app.on_event("startup")
+def start_bot_fleet():
+    # Boots active bots (BOT_AUTOSTART) and then runs the lease heartbeat (BOT_LEASES)
+    bot_runner.start_fleet()
+
+@app.on_event("shutdown")
+async def shutdown_bots():
+    await bot_runner.shutdown()
+
+@app.on_event("shutdown")
+def dispose_db_pool():
+    # Close every pooled connection held by the shared engine
+    engine.dispose()
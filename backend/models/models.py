@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
+import json
 from config.database import Base
 
 class AIProvider(Base):
@@ -14,6 +15,26 @@ class AIProvider(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     models = relationship("AIModel", back_populates="provider")
+    # Extra keys pooled with api_key; requests are spread across all active ones
+    keys = relationship("ProviderKey", back_populates="provider", cascade="all, delete-orphan", order_by="ProviderKey.id")
+
+class ProviderKey(Base):
+    __tablename__ = "provider_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    provider_id = Column(Integer, ForeignKey("ai_providers.id", ondelete="CASCADE"), nullable=False, index=True)
+    api_key = Column(String, nullable=False)
+    label = Column(String, default="")
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    provider = relationship("AIProvider", back_populates="keys")
+
+    @property
+    def key_hint(self):
+        """Last characters of the key, enough to tell keys apart without exposing them"""
+        return f"...{self.api_key[-4:]}" if self.api_key and len(self.api_key) > 8 else "****"
 
 class AIModel(Base):
     __tablename__ = "ai_models"
@@ -40,6 +61,8 @@ class BotModelIntegration(Base):
     model_id = Column(Integer, ForeignKey("ai_models.id"))
     command = Column(String, nullable=False)
     # Optionally, add config if you use it: config = Column(Text)
+    cache_ttl = Column(Integer, nullable=True)  # Seconds to cache identical answers; NULL/0 disables the response cache
+    fallback_models = Column(Text, nullable=True)  # JSON list of AIModel ids tried, in order, when the model fails or is slow
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -47,6 +70,36 @@ class BotModelIntegration(Base):
     bot = relationship("DiscordBot", backref="model_integrations")
     model = relationship("AIModel")
 
+    @property
+    def fallback_model_ids(self):
+        try:
+            return [int(model_id) for model_id in json.loads(self.fallback_models or '[]')]
+        except (ValueError, TypeError):
+            return []
+
+    @fallback_model_ids.setter
+    def fallback_model_ids(self, model_ids):
+        self.fallback_models = json.dumps(list(model_ids)) if model_ids else None
+
+class ConversationMessage(Base):
+    __tablename__ = "conversation_messages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    memory_key = Column(String, nullable=False)  # "<channel_id>:<user_id>"
+    role = Column(String, nullable=False)  # "user" or the lowercased persona name
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (Index("ix_conversation_messages_key_id", "memory_key", "id"),)
+
+class ResponseCacheEntry(Base):
+    __tablename__ = "response_cache"
+
+    key = Column(String(64), primary_key=True)  # sha256 of provider, model, persona, params and context
+    response = Column(Text, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 # Migration helper for image_url (manual, if not using Alembic)
 def add_image_url_column(engine):
     from sqlalchemy import text
@@ -55,3 +108,22 @@ def add_image_url_column(engine):
             conn.execute(text('ALTER TABLE ai_models ADD COLUMN image_url VARCHAR(512) DEFAULT ""'))
         except Exception as e:
             print(f"[Migration] image_url column may already exist: {e}")
+
+# Migration helpers for the per-integration response cache TTL and fallback chain
+def add_cache_ttl_column(engine):
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        try:
+            conn.execute(text('ALTER TABLE bot_model_integrations ADD COLUMN IF NOT EXISTS cache_ttl INTEGER'))
+            conn.commit()
+        except Exception as e:
+            print(f"[Migration] cache_ttl column may already exist: {e}")
+
+def add_fallback_models_column(engine):
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        try:
+            conn.execute(text('ALTER TABLE bot_model_integrations ADD COLUMN IF NOT EXISTS fallback_models TEXT'))
+            conn.commit()
+        except Exception as e:
+            print(f"[Migration] fallback_models column may already exist: {e}")
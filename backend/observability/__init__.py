@@ -0,0 +1,5 @@
+# Metrics and timing instrumentation shared by the API and the bot workers
+from observability.metrics import registry, merge_families, render, LATENCY_BUCKETS
+from observability.request_log import request_log
+from observability.profiler import run_profile, ProfilerBusy
+from observability.traffic import traffic_recorder, read_traffic
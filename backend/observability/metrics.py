@@ -0,0 +1,246 @@
+import bisect
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Upper bounds, in seconds, of the default latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (sample suffix, ((label, value), ...), value)
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+# (name, type, help, samples) -- plain tuples so worker processes can send them over a pipe
+Family = Tuple[str, str, str, List[Sample]]
+
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+
+class HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bound plus +Inf; made cumulative only when scraped
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    """
+    One metric family. Callers resolve a child with labels() once (when a
+    command spec or adapter is built) and keep it, so recording is a plain
+    attribute update: no lock, no lookup and no allocation per request.
+    Concurrent increments from different threads may in rare cases lose an
+    update, which is acceptable for monitoring counters.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+        return child
+
+    def remove(self, *values) -> None:
+        with self._lock:
+            self._children.pop(tuple(str(v) for v in values), None)
+
+    def _label_pairs(self, values: Tuple[str, ...]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(zip(self.labelnames, values))
+
+    def samples(self) -> List[Sample]:
+        return [("", self._label_pairs(key), child.value) for key, child in list(self._children.items())]
+
+    def collect(self) -> Family:
+        return self.name, self.kind, self.documentation, self.samples()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+    def samples(self):
+        return [("_total", self._label_pairs(key), child.value) for key, child in list(self._children.items())]
+
+
+class Gauge(Metric):
+    """
+    A gauge that is either set directly or filled at scrape time by
+    callbacks returning (label values, value) pairs, so state that already
+    lives elsewhere (queue depth, gateway latency) costs nothing to track.
+    Values reported for the same labels are added up, so every label set
+    appears once in the exposition.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._callbacks: List[Callable[[], Iterable[Tuple[Sequence, float]]]] = []
+
+    def _new_child(self):
+        return GaugeChild()
+
+    def add_callback(self, callback: Callable[[], Iterable[Tuple[Sequence, float]]]) -> None:
+        self._callbacks.append(callback)
+
+    def samples(self):
+        totals: Dict[Tuple[str, ...], float] = {}
+        for key, child in list(self._children.items()):
+            totals[key] = child.value
+        for callback in list(self._callbacks):
+            for values, value in callback():
+                key = tuple(str(v) for v in values)
+                totals[key] = totals.get(key, 0.0) + float(value)
+        return [("", self._label_pairs(key), value) for key, value in totals.items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def samples(self):
+        samples = []
+        for key, child in list(self._children.items()):
+            labels = self._label_pairs(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), list(child.counts)):
+                cumulative += count
+                samples.append(("_bucket", labels + (("le", _format_value(bound)),), cumulative))
+            samples.append(("_sum", labels, child.sum))
+            samples.append(("_count", labels, child.count))
+        return samples
+
+
+class MetricsRegistry:
+    """Named metric families of this process; asking for an existing name returns the same family"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Metric] = {}
+
+    def _get(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def collect(self) -> List[Family]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return [metric.collect() for metric in metrics]
+
+
+def merge_families(*collections: Iterable[Family]) -> List[Family]:
+    """
+    Combine the families of several processes. Identical series are summed,
+    which is right for counters and histograms and gives fleet totals for
+    the gauges (each bot lives in exactly one process).
+    """
+    merged: Dict[str, Tuple[str, str, Dict[Tuple[str, tuple], float]]] = {}
+    for families in collections:
+        for name, kind, documentation, samples in families or ():
+            _, _, values = merged.setdefault(name, (kind, documentation, {}))
+            for suffix, labels, value in samples:
+                key = (suffix, tuple(labels))
+                values[key] = values.get(key, 0) + value
+    return [
+        (name, kind, documentation, [(suffix, labels, value) for (suffix, labels), value in values.items()])
+        for name, (kind, documentation, values) in merged.items()
+    ]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render(families: Iterable[Family]) -> str:
+    """Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for name, kind, documentation, samples in families:
+        if not samples:
+            continue
+        lines.append(f"# HELP {name} {_escape(documentation)}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            if labels:
+                label_text = ",".join(f'{label}="{_escape(str(v))}"' for label, v in labels)
+                lines.append(f"{name}{suffix}{{{label_text}}} {_format_value(value)}")
+            else:
+                lines.append(f"{name}{suffix} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# Process-wide registry every module records into
+registry = MetricsRegistry()
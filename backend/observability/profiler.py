@@ -0,0 +1,128 @@
+import asyncio
+import cProfile
+import collections
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on a profiling window requested through the API
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "30"))
+# Interval between stack samples of the statistical profiler
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+PROFILE_MODES = ("sample", "cprofile")
+
+_busy = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is still running"""
+
+
+def _label(filename: str, line: int, name: str) -> str:
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def _sample_thread(thread_id: int, stop: threading.Event, interval: float) -> Dict[str, Any]:
+    """Sample another thread's stack until stop is set; count leaf (self) and on-stack (cumulative) hits"""
+    own: collections.Counter = collections.Counter()
+    total: collections.Counter = collections.Counter()
+    samples = 0
+    while not stop.wait(interval):
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            break
+        samples += 1
+        code = frame.f_code
+        own[(code.co_filename, code.co_firstlineno, code.co_name)] += 1
+        seen = set()
+        while frame is not None:
+            code = frame.f_code
+            key = (code.co_filename, code.co_firstlineno, code.co_name)
+            # Recursive functions count once per sample
+            if key not in seen:
+                seen.add(key)
+                total[key] += 1
+            frame = frame.f_back
+    return {"samples": samples, "own": own, "total": total}
+
+
+async def _profile_sample(seconds: float, top: int) -> Dict[str, Any]:
+    stop = threading.Event()
+    result: Dict[str, Any] = {}
+    thread_id = threading.get_ident()
+    sampler = threading.Thread(
+        target=lambda: result.update(_sample_thread(thread_id, stop, PROFILE_SAMPLE_INTERVAL)),
+        name="profile-sampler", daemon=True,
+    )
+    sampler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        stop.set()
+        await asyncio.to_thread(sampler.join)
+    samples = result.get("samples", 0)
+    own, total = result.get("own", {}), result.get("total", {})
+    functions = [
+        {
+            "function": _label(*key),
+            "self_percent": round(100.0 * own.get(key, 0) / samples, 2) if samples else 0.0,
+            "total_percent": round(100.0 * count / samples, 2) if samples else 0.0,
+        }
+        for key, count in total.items()
+    ]
+    functions.sort(key=lambda f: (f["self_percent"], f["total_percent"]), reverse=True)
+    return {"mode": "sample", "seconds": seconds, "samples": samples, "functions": functions[:top]}
+
+
+async def _profile_cprofile(seconds: float, top: int) -> Dict[str, Any]:
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+    stats = pstats.Stats(profiler).stats
+    functions = [
+        {
+            "function": _label(*key),
+            "calls": calls,
+            "self_seconds": round(self_time, 6),
+            "cumulative_seconds": round(cumulative, 6),
+        }
+        for key, (_, calls, self_time, cumulative, _) in stats.items()
+    ]
+    functions.sort(key=lambda f: f["self_seconds"], reverse=True)
+    return {"mode": "cprofile", "seconds": seconds, "functions": functions[:top]}
+
+
+async def run_profile(seconds: float, mode: str = "sample", top: int = 30) -> Dict[str, Any]:
+    """
+    Profile the calling event loop's thread for a few seconds while it keeps
+    serving bots, and return the hottest functions. "sample" reads the
+    thread's stack from a helper thread at a fixed interval, which costs the
+    loop almost nothing; "cprofile" traces every call exactly but slows the
+    loop down while it runs. Only one profile runs at a time per process.
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode '{mode}', expected one of {', '.join(PROFILE_MODES)}")
+    seconds = max(0.1, min(float(seconds), PROFILE_MAX_SECONDS))
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        logger.info(f"Profiling for {seconds:g}s ({mode})")
+        started = time.monotonic()
+        if mode == "cprofile":
+            result = await _profile_cprofile(seconds, top)
+        else:
+            result = await _profile_sample(seconds, top)
+        result["elapsed"] = round(time.monotonic() - started, 3)
+        return result
+    finally:
+        _busy.release()
@@ -0,0 +1,88 @@
+import collections
+import itertools
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Most recent traced requests kept per process
+REQUEST_LOG_SIZE = int(os.getenv("REQUEST_LOG_SIZE", "500"))
+# Fraction of requests traced into the log (the histograms always see every request)
+REQUEST_LOG_SAMPLE = float(os.getenv("REQUEST_LOG_SAMPLE", "1.0"))
+
+
+class RequestTrace:
+    """Stage timings of one request, in the order the stages ran"""
+
+    __slots__ = ("id", "labels", "started", "stages", "outcome", "total")
+
+    def __init__(self, request_id: int, labels: Dict[str, Any]):
+        self.id = request_id
+        self.labels = labels
+        self.started = time.time()
+        self.stages: List[Tuple[str, float]] = []
+        self.outcome = ""
+        self.total = 0.0
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages.append((stage, seconds))
+
+    def to_dict(self) -> Dict[str, Any]:
+        stages = {}
+        for stage, seconds in self.stages:
+            stages[stage] = round(stages.get(stage, 0.0) + seconds * 1000, 2)
+        return {
+            "id": self.id,
+            "time": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            **self.labels,
+            "outcome": self.outcome,
+            "total_ms": round(self.total * 1000, 2),
+            "stages_ms": stages,
+            # Wall time not covered by a stage: buffer messages, memory writes, scheduling
+            "other_ms": round(max(0.0, self.total * 1000 - sum(stages.values())), 2),
+        }
+
+
+class RequestLog:
+    """
+    Bounded ring buffer of recent request traces. Appending to a deque with
+    maxlen is atomic, so the bot loop records without locking and the API
+    thread can read at any time; old traces fall off the end.
+    """
+
+    def __init__(self, size: int = REQUEST_LOG_SIZE, sample: float = REQUEST_LOG_SAMPLE):
+        self.sample = sample
+        self._traces: Deque[RequestTrace] = collections.deque(maxlen=size)
+        self._ids = itertools.count(1)
+
+    def start(self, labels: Dict[str, Any]) -> Optional[RequestTrace]:
+        """A new trace, or None when this request is not sampled"""
+        if self.sample < 1.0 and random.random() >= self.sample:
+            return None
+        return RequestTrace(next(self._ids), labels)
+
+    def finish(self, trace: RequestTrace, outcome: str) -> None:
+        trace.outcome = outcome
+        trace.total = time.time() - trace.started
+        self._traces.append(trace)
+
+    def recent(self, limit: int = 100, bot_id: Optional[int] = None, min_ms: float = 0.0) -> List[Dict[str, Any]]:
+        """Newest traces first, optionally only one bot's or only those slower than min_ms"""
+        result = []
+        for trace in reversed(list(self._traces)):
+            if bot_id is not None and str(trace.labels.get("bot")) != str(bot_id):
+                continue
+            if trace.total * 1000 < min_ms:
+                continue
+            result.append(trace.to_dict())
+            if len(result) >= limit:
+                break
+        return result
+
+    def clear(self) -> None:
+        self._traces.clear()
+
+
+# Process-wide log every bot of this process records into
+request_log = RequestLog()
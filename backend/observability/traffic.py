@@ -0,0 +1,130 @@
+import atexit
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Append-only file model commands and chatter are recorded to; recording is off when empty
+TRAFFIC_RECORD_PATH = os.getenv("TRAFFIC_RECORD_PATH", "")
+# Key for hashing channel and user ids; set it so ids hash the same across processes and restarts
+TRAFFIC_RECORD_SALT = os.getenv("TRAFFIC_RECORD_SALT", "")
+
+# Lines written per write() call at most
+_BATCH = 500
+
+
+class TrafficRecorder:
+    """
+    Opt-in recorder of production traffic shape for replay (bench.replay).
+
+    One compact JSON line per event, never any message text:
+      {"t":1760000000.123,"e":"c","b":3,"c":"gpt","ch":"9f2c..","u":"41ab..","p":182,"r":1409,"o":"ok","ms":2310.4}
+    "e" is "c" for a model command (p = prompt chars, r = reply chars) and
+    "m" for plain chatter that lands in conversation memory. Channel and
+    user ids are salted HMACs. Lines are handed to a writer thread and
+    appended with O_APPEND, so bot workers can share one file.
+    """
+
+    def __init__(self, path: str = TRAFFIC_RECORD_PATH, salt: str = TRAFFIC_RECORD_SALT):
+        self.path = path
+        self.enabled = bool(path)
+        self._salt = (salt or os.urandom(16).hex()).encode()
+        self._queue: "queue.SimpleQueue[Optional[str]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def anonymize(self, value: Any) -> str:
+        return hmac.new(self._salt, str(value).encode(), hashlib.sha256).hexdigest()[:12]
+
+    def command(self, bot_id, command: str, channel_id, user_id, started: float, prompt_chars: int,
+                reply_chars: int, outcome: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        self._emit({
+            "t": round(started, 3), "e": "c", "b": bot_id, "c": command.lstrip("!"),
+            "ch": self.anonymize(channel_id), "u": self.anonymize(user_id),
+            "p": prompt_chars, "r": reply_chars, "o": outcome, "ms": round(seconds * 1000, 1),
+        })
+
+    def message(self, bot_id, channel_id, user_id, chars: int) -> None:
+        if not self.enabled:
+            return
+        self._emit({
+            "t": round(time.time(), 3), "e": "m", "b": bot_id,
+            "ch": self.anonymize(channel_id), "u": self.anonymize(user_id), "p": chars,
+        })
+
+    def _emit(self, event: Dict[str, Any]) -> None:
+        if self._thread is None:
+            self._start()
+        self._queue.put(json.dumps(event, separators=(",", ":")))
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._write_loop, name="traffic-recorder", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+            logger.info(f"Recording traffic to {self.path}")
+
+    def _write_loop(self) -> None:
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        except OSError as e:
+            logger.error(f"Traffic recording disabled, cannot open {self.path}: {e}")
+            self.enabled = False
+            return
+        try:
+            while True:
+                # Block for one line, then take whatever else queued up meanwhile
+                lines = [self._queue.get()]
+                while len(lines) < _BATCH and lines[-1] is not None:
+                    try:
+                        lines.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                done = lines[-1] is None
+                if done:
+                    lines.pop()
+                if lines:
+                    # Whole lines per write keep concurrent appenders from interleaving
+                    os.write(fd, ("\n".join(lines) + "\n").encode("utf-8"))
+                if done:
+                    return
+        except OSError as e:
+            logger.error(f"Traffic recording stopped: {e}")
+            self.enabled = False
+        finally:
+            os.close(fd)
+
+    def close(self, timeout: float = 5) -> None:
+        """Write out queued events and stop the writer thread"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+
+
+def read_traffic(path: str) -> Iterator[Dict[str, Any]]:
+    """Events of a recording in file order; lines cut short by a crash are skipped"""
+    with open(path, encoding="utf-8") as recording:
+        for line in recording:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(event, dict) and "t" in event:
+                yield event
+
+
+# Process-wide recorder every bot of this process records into
+traffic_recorder = TrafficRecorder()
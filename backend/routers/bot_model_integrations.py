@@ -6,6 +6,8 @@ from models import models
 from schemas import schemas
 from typing import List
 from routers.bots import bot_runner
+from routers.models import refresh_model_commands
+from config.config_cache import config_cache
 from discord_bots.bot_models import DiscordBot
 import os
 
@@ -73,11 +75,10 @@ def create_integration(
     import logging
     logger = logging.getLogger("uvicorn.error")
     logger.info(f"[BotModelIntegration] Incoming payload: {integration}")
-    print(f"[DEBUG] Incoming payload: {integration}")
     try:
         # Validate bot exists
         bot = db.query(DiscordBot).filter(DiscordBot.id == integration.bot_id).first()
-        print(f"[DEBUG] Bot lookup for id={integration.bot_id}: {bot}")
+        logger.debug(f"[BotModelIntegration] Bot lookup for id={integration.bot_id}: {bot}")
         if not bot:
             logger.error(f"Bot with ID {integration.bot_id} not found")
             raise HTTPException(
@@ -87,7 +88,7 @@ def create_integration(
         
         # Validate model exists and is active
         model = db.query(models.AIModel).filter(models.AIModel.id == integration.model_id).first()
-        print(f"[DEBUG] Model lookup for id={integration.model_id}: {model}")
+        logger.debug(f"[BotModelIntegration] Model lookup for id={integration.model_id}: {model}")
         if not model:
             logger.error(f"AI Model with ID {integration.model_id} not found")
             raise HTTPException(
@@ -119,11 +120,10 @@ def create_integration(
             db.add(db_integration)
             db.commit()
             db.refresh(db_integration)
-            # Restart bot to reload commands
-            db_bot = db.query(DiscordBot).filter(DiscordBot.id == integration.bot_id).first()
-            if db_bot:
-                if background_tasks is not None:
-                    background_tasks.add_task(bot_runner.restart_bot, db_bot.id, db_bot.token, db_bot.name)
+            # Hot-reload the bot's commands (no gateway reconnect)
+            config_cache.invalidate_integrations(integration.bot_id)
+            if background_tasks is not None:
+                background_tasks.add_task(bot_runner.reload_commands, integration.bot_id)
             return db_integration
         except IntegrityError as e:
             db.rollback()
@@ -219,11 +219,10 @@ def update_integration(
         
         db.commit()
         db.refresh(db_integration)
-        # Restart bot to reload commands
-        db_bot = db.query(DiscordBot).filter(DiscordBot.id == db_integration.bot_id).first()
-        if db_bot:
-            if background_tasks is not None:
-                background_tasks.add_task(bot_runner.restart_bot, db_bot.id, db_bot.token, db_bot.name)
+        # Hot-reload the bot's commands (no gateway reconnect)
+        config_cache.invalidate_integrations(db_integration.bot_id)
+        if background_tasks is not None:
+            background_tasks.add_task(bot_runner.reload_commands, db_integration.bot_id)
         return db_integration
     except IntegrityError:
         db.rollback()
@@ -265,11 +264,10 @@ def delete_integration(
         # Delete the integration
         db.delete(db_integration)
         db.commit()
-        # Restart bot to reload commands
-        db_bot = db.query(DiscordBot).filter(DiscordBot.id == db_integration.bot_id).first()
-        if db_bot:
-            if background_tasks is not None:
-                background_tasks.add_task(bot_runner.restart_bot, db_bot.id, db_bot.token, db_bot.name)
+        # Hot-reload the bot's commands (no gateway reconnect)
+        config_cache.invalidate_integrations(db_integration.bot_id)
+        if background_tasks is not None:
+            background_tasks.add_task(bot_runner.reload_commands, db_integration.bot_id)
         return {
             "message": "Integration deleted successfully", 
             "deleted_integration": {
@@ -297,7 +295,7 @@ def get_model_info(model_id: int, db: Session = Depends(get_db), request: Reques
     return model
 
 @router.put("/model/{model_id}", response_model=schemas.AIModel)
-def update_model_info(model_id: int, model_update: schemas.AIModelUpdate, db: Session = Depends(get_db), request: Request = None):
+def update_model_info(model_id: int, model_update: schemas.AIModelUpdate, db: Session = Depends(get_db), request: Request = None, background_tasks: BackgroundTasks = None):
     model = db.query(models.AIModel).filter(models.AIModel.id == model_id).first()
     if not model:
         raise HTTPException(status_code=404, detail="Model not found")
@@ -307,6 +305,7 @@ def update_model_info(model_id: int, model_update: schemas.AIModelUpdate, db: Se
         setattr(model, key, value)
     db.commit()
     db.refresh(model)
+    refresh_model_commands(model_id, background_tasks)
     # Return absolute image_url if set
     if model.image_url and not model.image_url.startswith("http") and request:
         base_url = str(request.base_url).rstrip('/')
@@ -314,7 +313,7 @@ def update_model_info(model_id: int, model_update: schemas.AIModelUpdate, db: Se
     return model
 
 @router.post("/model/{model_id}/upload_image", response_model=schemas.AIModel)
-def upload_model_image(model_id: int, file: UploadFile = File(...), db: Session = Depends(get_db), request: Request = None):
+def upload_model_image(model_id: int, file: UploadFile = File(...), db: Session = Depends(get_db), request: Request = None, background_tasks: BackgroundTasks = None):
     model = db.query(models.AIModel).filter(models.AIModel.id == model_id).first()
     if not model:
         raise HTTPException(status_code=404, detail="Model not found")
@@ -330,6 +329,7 @@ def upload_model_image(model_id: int, file: UploadFile = File(...), db: Session
     model.image_url = rel_url
     db.commit()
     db.refresh(model)
+    refresh_model_commands(model_id, background_tasks)
     # Return absolute URL
     if request:
         base_url = str(request.base_url).rstrip('/')
@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from config.database import get_db
+from config.config_cache import config_cache
 from discord_bots.bot_models import DiscordBot
 from discord_bots.bot_schemas import DiscordBotCreate, DiscordBotUpdate, DiscordBot as DiscordBotSchema
 from bot_runner import bot_runner
@@ -9,8 +11,20 @@ from typing import Tuple
 
 router = APIRouter(prefix="/discord-bots", tags=["discord-bots"])
 
-@router.post("/", response_model=DiscordBotSchema)
-async def create_bot(bot: DiscordBotCreate, db: Session = Depends(get_db)):
+# The handlers below await bot_runner, so they stay async and run their database work in the threadpool
+def _get_bot_or_404(db: Session, bot_id: int) -> DiscordBot:
+    db_bot = db.query(DiscordBot).filter(DiscordBot.id == bot_id).first()
+    if not db_bot:
+        raise HTTPException(status_code=404, detail="Bot not found")
+    return db_bot
+
+def _set_active(db: Session, db_bot: DiscordBot, is_active: bool) -> None:
+    db_bot.is_active = is_active
+    db.commit()
+    # Reload here, so serializing the response doesn't query on the event loop
+    db.refresh(db_bot)
+
+def _add_bot(db: Session, bot: DiscordBotCreate) -> DiscordBot:
     if bot.model_id:
         model = db.query(models.AIModel).filter(models.AIModel.id == bot.model_id).first()
         if not model:
@@ -21,45 +35,68 @@ async def create_bot(bot: DiscordBotCreate, db: Session = Depends(get_db)):
     db.add(db_bot)
     db.commit()
     db.refresh(db_bot)
+    return db_bot
+
+def _delete_bot(db: Session, db_bot: DiscordBot) -> None:
+    db.delete(db_bot)
+    db.commit()
+
+@router.post("/", response_model=DiscordBotSchema)
+async def create_bot(bot: DiscordBotCreate, db: Session = Depends(get_db)):
+    db_bot = await run_in_threadpool(_add_bot, db, bot)
     success, message = await bot_runner.start_bot(db_bot.id, bot.token, bot.name)
+    await run_in_threadpool(_set_active, db, db_bot, success)
     if not success:
-        db_bot.is_active = False
-        db.commit()
         raise HTTPException(status_code=400, detail=message)
-    db_bot.is_active = True
-    db.commit()
-    db.refresh(db_bot)
+    db_bot.is_running = True
     return db_bot
 
 @router.get("/", response_model=list[DiscordBotSchema])
-async def get_bots(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_bots(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     bots = db.query(DiscordBot).offset(skip).limit(limit).all()
     for bot in bots:
-        bot.is_active = bot_runner.get_bot_status(bot.id)
+        # Runtime state goes next to is_active, never into it: is_active is what the fleet boot starts
+        bot.is_running = bot_runner.get_bot_status(bot.id)
         # Fetch guilds from the running bot instance if available
-        running_bot = bot_runner.manager.get_bot(bot.id)
-        guilds = []
-        if running_bot is not None and hasattr(running_bot, 'guilds'):
-            try:
-                # guilds is a list of discord.Guild objects
-                guilds = [{"id": str(guild.id), "name": guild.name} for guild in getattr(running_bot, 'guilds', [])]
-            except Exception as e:
-                guilds = []
-        bot.guilds = guilds
-    db.commit()
+        bot.guilds = bot_runner.get_bot_guilds(bot.id)
     return bots
 
+@router.get("/memory/stats")
+def get_memory_stats():
+    """Key count and byte footprint of the shared conversation memory"""
+    return bot_runner.get_memory_stats()
+
+@router.get("/cache/stats")
+def get_cache_stats():
+    """Hit/miss counters and size of the model response cache"""
+    return bot_runner.get_cache_stats()
+
+@router.get("/queue/stats")
+def get_queue_stats():
+    """Running and queued model commands, and how many were admitted or shed"""
+    return bot_runner.get_queue_stats()
+
+@router.get("/workers")
+def get_workers():
+    """Bot worker processes and the bots each one hosts"""
+    return bot_runner.get_worker_stats()
+
+@router.post("/workers/rebalance")
+async def rebalance_workers():
+    """Move bots between worker processes until they are evenly spread"""
+    moves = await bot_runner.rebalance()
+    return {"moved": moves}
+
 @router.get("/{bot_id}", response_model=DiscordBotSchema)
 def get_bot(bot_id: int, db: Session = Depends(get_db)):
     db_bot = db.query(DiscordBot).filter(DiscordBot.id == bot_id).first()
     if not db_bot:
         raise HTTPException(status_code=404, detail="Bot not found")
-    db_bot.is_active = bot_runner.get_bot_status(bot_id)
-    db.commit()
+    db_bot.is_running = bot_runner.get_bot_status(bot_id)
     return db_bot
 
 @router.put("/{bot_id}", response_model=DiscordBotSchema)
-async def update_bot(bot_id: int, data: dict = Body(...), db: Session = Depends(get_db)):
+def update_bot(bot_id: int, data: dict = Body(...), db: Session = Depends(get_db)):
     db_bot = db.query(DiscordBot).filter(DiscordBot.id == bot_id).first()
     if not db_bot:
         raise HTTPException(status_code=404, detail="Bot not found")
@@ -69,47 +106,37 @@ async def update_bot(bot_id: int, data: dict = Body(...), db: Session = Depends(
         db_bot.token = data['token']
     db.commit()
     db.refresh(db_bot)
+    config_cache.invalidate_bot(bot_id)
     return db_bot
 
 @router.delete("/{bot_id}")
 async def delete_bot(bot_id: int, db: Session = Depends(get_db)):
-    db_bot = db.query(DiscordBot).filter(DiscordBot.id == bot_id).first()
-    if not db_bot:
-        raise HTTPException(status_code=404, detail="Bot not found")
+    db_bot = await run_in_threadpool(_get_bot_or_404, db, bot_id)
     if bot_runner.get_bot_status(bot_id):
         success, message = await bot_runner.stop_bot(bot_id)
         if not success:
             raise HTTPException(status_code=500, detail=message)
-    db.delete(db_bot)
-    db.commit()
+    await run_in_threadpool(_delete_bot, db, db_bot)
+    config_cache.invalidate_bot(bot_id)
     return {"message": "Bot deleted successfully"}
 
 @router.post("/{bot_id}/restart")
 async def restart_bot(bot_id: int, db: Session = Depends(get_db)):
-    db_bot = db.query(DiscordBot).filter(DiscordBot.id == bot_id).first()
-    if not db_bot:
-        raise HTTPException(status_code=404, detail="Bot not found")
+    db_bot = await run_in_threadpool(_get_bot_or_404, db, bot_id)
     success, message = await bot_runner.restart_bot(bot_id, db_bot.token, db_bot.name)
+    await run_in_threadpool(_set_active, db, db_bot, success)
     if not success:
-        db_bot.is_active = False
-        db.commit()
         raise HTTPException(status_code=400, detail=message)
-    db_bot.is_active = True
-    db.commit()
     return {"message": "Bot restarted successfully"}
 
 @router.post("/{bot_id}/stop")
 async def stop_bot(bot_id: int, db: Session = Depends(get_db)):
-    db_bot = db.query(DiscordBot).filter(DiscordBot.id == bot_id).first()
-    if not db_bot:
-        raise HTTPException(status_code=404, detail="Bot not found")
+    db_bot = await run_in_threadpool(_get_bot_or_404, db, bot_id)
     if not bot_runner.get_bot_status(bot_id):
-        db_bot.is_active = False
-        db.commit()
+        await run_in_threadpool(_set_active, db, db_bot, False)
         return {"message": "Bot is already stopped"}
     success, message = await bot_runner.stop_bot(bot_id)
     if not success:
         raise HTTPException(status_code=500, detail=message)
-    db_bot.is_active = False
-    db.commit()
+    await run_in_threadpool(_set_active, db, db_bot, False)
     return {"message": "Bot stopped successfully"}
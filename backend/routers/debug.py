@@ -0,0 +1,24 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from bot_runner import bot_runner
+from observability import ProfilerBusy
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+@router.get("/requests")
+async def recent_requests(limit: int = 100, bot_id: Optional[int] = None, min_ms: float = 0):
+    """Per-stage timing breakdown (memory, context, cache, queue, upstream, send) of recent model commands"""
+    return await bot_runner.get_request_traces(limit, bot_id, min_ms)
+
+@router.post("/profile")
+async def profile(seconds: float = 10, mode: str = "sample", top: int = 30):
+    """
+    Profile the bot event loop(s) for a few seconds while bots keep running and
+    return the hottest functions; mode is "sample" (statistical) or "cprofile"
+    """
+    try:
+        return await bot_runner.profile(seconds, mode, top)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from bot_runner import bot_runner
+from observability import render
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus scrape endpoint: command stage latencies, upstream statuses, tokens, queues and gateway latency"""
+    return PlainTextResponse(render(bot_runner.get_metrics()), media_type="text/plain; version=0.0.4")
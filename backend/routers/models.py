@@ -1,11 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, BackgroundTasks
+from sqlalchemy.orm import Session, joinedload
 from config.database import get_db
+from config.config_cache import config_cache
+from bot_runner import bot_runner
 from models import models
 from schemas import schemas
 
 router = APIRouter(prefix="/models", tags=["models"])
 
+def refresh_model_commands(model_id: int, background_tasks: BackgroundTasks = None):
+    """Drop the cached model snapshot and hot-reload commands of running bots that use it"""
+    bot_ids = config_cache.bots_using_model(model_id)
+    config_cache.invalidate_model(model_id)
+    if background_tasks is not None:
+        for bot_id in bot_ids:
+            background_tasks.add_task(bot_runner.reload_commands, bot_id)
+
 @router.post("/", response_model=schemas.AIModel)
 def create_model(model: schemas.AIModelCreate, db: Session = Depends(get_db)):
     db_model = models.AIModel(**model.dict())
@@ -14,34 +24,40 @@ def create_model(model: schemas.AIModelCreate, db: Session = Depends(get_db)):
     db.refresh(db_model)
     return db_model
 
+# Column names serialized for list endpoints, resolved once instead of copying m.__dict__ per row
+MODEL_COLUMNS = tuple(column.key for column in models.AIModel.__table__.columns)
+
+def serialize_model(m, base_url: str = None) -> dict:
+    model_dict = {key: getattr(m, key) for key in MODEL_COLUMNS}
+    model_dict['provider_name'] = m.provider.name if m.provider else 'Unknown'
+    if m.image_url and not m.image_url.startswith("http") and base_url:
+        model_dict['image_url'] = f"{base_url}{m.image_url}"
+    return model_dict
+
 @router.get("/", response_model=list[schemas.AIModel])
 def list_models(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), request: Request = None):
-    models_ = db.query(models.AIModel).offset(skip).limit(limit).all()
-    # Patch image_url to absolute and add provider_name
-    result = []
-    for m in models_:
-        model_dict = m.__dict__.copy()
-        if hasattr(m, 'provider') and m.provider:
-            model_dict['provider_name'] = m.provider.name
-        else:
-            # Try to fetch provider if not loaded
-            provider = db.query(models.AIProvider).filter(models.AIProvider.id == m.provider_id).first()
-            model_dict['provider_name'] = provider.name if provider else 'Unknown'
-        if m.image_url and not m.image_url.startswith("http") and request:
-            base_url = str(request.base_url).rstrip('/')
-            model_dict['image_url'] = f"{base_url}{m.image_url}"
-        result.append(model_dict)
-    return result
+    # Providers are joined into the same query, so there is no per-row lookup
+    models_ = (
+        db.query(models.AIModel)
+        .options(joinedload(models.AIModel.provider))
+        .order_by(models.AIModel.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    base_url = str(request.base_url).rstrip('/') if request else None
+    return [serialize_model(m, base_url) for m in models_]
 
 @router.get("/active", response_model=list[schemas.AIModel])
 def get_active_models(db: Session = Depends(get_db), request: Request = None):
-    models_list = db.query(models.AIModel).filter(models.AIModel.active == True).all()
-    if request:
-        base_url = str(request.base_url).rstrip('/')
-        for m in models_list:
-            if m.image_url and not m.image_url.startswith("http"):
-                m.image_url = f"{base_url}{m.image_url}"
-    return models_list
+    models_list = (
+        db.query(models.AIModel)
+        .options(joinedload(models.AIModel.provider))
+        .filter(models.AIModel.active == True)
+        .all()
+    )
+    base_url = str(request.base_url).rstrip('/') if request else None
+    return [serialize_model(m, base_url) for m in models_list]
 
 @router.get("/{model_id}", response_model=schemas.AIModel)
 def get_model(model_id: int, db: Session = Depends(get_db), request: Request = None):
@@ -52,7 +68,7 @@ def get_model(model_id: int, db: Session = Depends(get_db), request: Request = N
     return model
 
 @router.put("/{model_id}", response_model=schemas.AIModel)
-def update_model(model_id: int, model: schemas.AIModelUpdate, db: Session = Depends(get_db)):
+def update_model(model_id: int, model: schemas.AIModelUpdate, db: Session = Depends(get_db), background_tasks: BackgroundTasks = None):
     db_model = db.query(models.AIModel).filter(models.AIModel.id == model_id).first()
     if db_model is None:
         raise HTTPException(status_code=404, detail="Model not found")
@@ -60,13 +76,15 @@ def update_model(model_id: int, model: schemas.AIModelUpdate, db: Session = Depe
         setattr(db_model, key, value)
     db.commit()
     db.refresh(db_model)
+    refresh_model_commands(model_id, background_tasks)
     return db_model
 
 @router.delete("/{model_id}")
-def delete_model(model_id: int, db: Session = Depends(get_db)):
+def delete_model(model_id: int, db: Session = Depends(get_db), background_tasks: BackgroundTasks = None):
     db_model = db.query(models.AIModel).filter(models.AIModel.id == model_id).first()
     if db_model is None:
         raise HTTPException(status_code=404, detail="Model not found")
     db.delete(db_model)
     db.commit()
+    refresh_model_commands(model_id, background_tasks)
     return {"message": "Model deleted successfully"}
@@ -1,11 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
 from sqlalchemy.orm import Session
 from config.database import get_db
+from config.config_cache import config_cache
+from bot_runner import bot_runner
 from models import models
 from schemas import schemas
 
 router = APIRouter(prefix="/providers", tags=["providers"])
 
+def refresh_provider_commands(provider_id: int, background_tasks: BackgroundTasks = None):
+    """Drop the cached provider snapshot and hot-reload commands of running bots that use it"""
+    bot_ids = config_cache.bots_using_provider(provider_id)
+    config_cache.invalidate_provider(provider_id)
+    if background_tasks is not None:
+        for bot_id in bot_ids:
+            background_tasks.add_task(bot_runner.reload_commands, bot_id)
+
 @router.post("/", response_model=schemas.AIProvider)
 def create_provider(provider: schemas.AIProviderCreate, db: Session = Depends(get_db)):
     db_provider = models.AIProvider(**provider.dict())
@@ -20,10 +30,57 @@ def get_providers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)
     return providers
 
 @router.delete("/{provider_id}")
-def delete_provider(provider_id: int, db: Session = Depends(get_db)):
+def delete_provider(provider_id: int, db: Session = Depends(get_db), background_tasks: BackgroundTasks = None):
     provider = db.query(models.AIProvider).filter(models.AIProvider.id == provider_id).first()
     if not provider:
         raise HTTPException(status_code=404, detail="Provider not found")
     db.delete(provider)
     db.commit()
+    refresh_provider_commands(provider_id, background_tasks)
     return {"message": "Provider deleted successfully"}
+
+def get_provider_or_404(provider_id: int, db: Session):
+    provider = db.query(models.AIProvider).filter(models.AIProvider.id == provider_id).first()
+    if not provider:
+        raise HTTPException(status_code=404, detail="Provider not found")
+    return provider
+
+def get_key_or_404(provider_id: int, key_id: int, db: Session):
+    key = db.query(models.ProviderKey).filter(
+        models.ProviderKey.id == key_id, models.ProviderKey.provider_id == provider_id
+    ).first()
+    if not key:
+        raise HTTPException(status_code=404, detail="Key not found")
+    return key
+
+@router.get("/{provider_id}/keys", response_model=list[schemas.ProviderKey])
+def list_provider_keys(provider_id: int, db: Session = Depends(get_db)):
+    return get_provider_or_404(provider_id, db).keys
+
+@router.post("/{provider_id}/keys", response_model=schemas.ProviderKey)
+def add_provider_key(provider_id: int, key: schemas.ProviderKeyCreate, db: Session = Depends(get_db), background_tasks: BackgroundTasks = None):
+    get_provider_or_404(provider_id, db)
+    db_key = models.ProviderKey(provider_id=provider_id, **key.dict())
+    db.add(db_key)
+    db.commit()
+    db.refresh(db_key)
+    refresh_provider_commands(provider_id, background_tasks)
+    return db_key
+
+@router.put("/{provider_id}/keys/{key_id}", response_model=schemas.ProviderKey)
+def update_provider_key(provider_id: int, key_id: int, key: schemas.ProviderKeyUpdate, db: Session = Depends(get_db), background_tasks: BackgroundTasks = None):
+    db_key = get_key_or_404(provider_id, key_id, db)
+    for field, value in key.dict(exclude_unset=True).items():
+        setattr(db_key, field, value)
+    db.commit()
+    db.refresh(db_key)
+    refresh_provider_commands(provider_id, background_tasks)
+    return db_key
+
+@router.delete("/{provider_id}/keys/{key_id}")
+def delete_provider_key(provider_id: int, key_id: int, db: Session = Depends(get_db), background_tasks: BackgroundTasks = None):
+    db_key = get_key_or_404(provider_id, key_id, db)
+    db.delete(db_key)
+    db.commit()
+    refresh_provider_commands(provider_id, background_tasks)
+    return {"message": "Key removed from the pool"}
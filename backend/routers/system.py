@@ -0,0 +1,44 @@
+from fastapi import APIRouter
+from config.database import get_pool_stats
+from ai_providers import scheduler_stats, single_flight_stats, health_stats, key_pool_stats
+
+router = APIRouter(prefix="/system", tags=["system"])
+
+@router.get("/db-pool")
+def db_pool_stats():
+    """Occupancy and wait-time stats of the shared database connection pool"""
+    return get_pool_stats()
+
+@router.get("/providers")
+def provider_scheduler_stats():
+    """In-flight, queued, retried and throttled provider requests per provider"""
+    return scheduler_stats()
+
+@router.get("/coalescing")
+def coalescing_stats():
+    """Upstream completion calls made, and identical calls that joined one already in flight"""
+    return single_flight_stats()
+
+@router.get("/provider-health")
+def provider_health_stats():
+    """Circuit breaker state, outcome counters and current hedge delay per provider"""
+    return health_stats()
+
+@router.get("/provider-keys")
+def provider_key_stats():
+    """Requests, failures and quarantine state of every pooled API key, by provider"""
+    return key_pool_stats()
+
+@router.get("/leases")
+def bot_lease_stats():
+    """This node's id and the bots other nodes own, as of the last lease heartbeat"""
+    from bot_runner import bot_runner
+    if not bot_runner.leases:
+        return {"enabled": False}
+    return {"enabled": True, "local": sorted(bot_runner.local_bot_ids()), **bot_runner.leases.stats()}
+
+@router.get("/fleet-boot")
+def fleet_boot_stats():
+    """Progress of the startup boot of the active bots: started, failed and elapsed seconds"""
+    from bot_runner import bot_runner
+    return bot_runner.fleet_boot.stats()
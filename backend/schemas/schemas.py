@@ -23,6 +23,25 @@ class AIProvider(AIProviderBase):
     created_at: datetime
     updated_at: datetime
 
+# Provider Key Pool Schemas
+class ProviderKeyBase(BaseModelWithConfig):
+    label: Optional[str] = ""
+    is_active: bool = True
+
+class ProviderKeyCreate(ProviderKeyBase):
+    api_key: str
+
+class ProviderKeyUpdate(BaseModelWithConfig):
+    label: Optional[str] = None
+    is_active: Optional[bool] = None
+
+class ProviderKey(ProviderKeyBase):
+    id: int
+    provider_id: int
+    key_hint: str  # the key itself is never returned
+    created_at: datetime
+    updated_at: datetime
+
 # AI Model Schemas
 class AIModelBase(BaseModel):
     name: str
@@ -60,6 +79,10 @@ class BotModelIntegrationBase(BaseModelWithConfig):
     bot_id: int
     model_id: int
     command: str
+    # Seconds identical answers are served from the response cache; None/0 disables it
+    cache_ttl: Optional[int] = None
+    # AIModel ids tried in order when the integration's model fails or is slow
+    fallback_model_ids: Optional[List[int]] = None
     # Optionally, you can add config: dict = {} if you use it
     # config: Optional[dict] = None
 
@@ -69,6 +92,8 @@ class BotModelIntegrationCreate(BotModelIntegrationBase):
 class BotModelIntegrationUpdate(BaseModelWithConfig):
     model_id: Optional[int] = None
     command: Optional[str] = None
+    cache_ttl: Optional[int] = None
+    fallback_model_ids: Optional[List[int]] = None
     # config: Optional[dict] = None
 
 class BotModelIntegration(BotModelIntegrationBase):
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The backend uses absolute imports rooted at backend/, as when run from there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
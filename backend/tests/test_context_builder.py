@@ -0,0 +1,54 @@
+from discord_bots.context_builder import MESSAGE_OVERHEAD_TOKENS, ContextBuilder, count_tokens
+
+
+def budget_for(prompt, turn_tokens, persona=None):
+    """A budget that fits the persona, the prompt and exactly these history turns"""
+    total = count_tokens(prompt) + MESSAGE_OVERHEAD_TOKENS
+    if persona:
+        total += count_tokens(persona) + MESSAGE_OVERHEAD_TOKENS
+    return total + sum(tokens + MESSAGE_OVERHEAD_TOKENS for tokens in turn_tokens)
+
+
+def test_count_tokens():
+    assert count_tokens("") == 0
+    assert count_tokens("hello there") > 0
+
+
+def test_persona_first_and_prompt_last():
+    builder = ContextBuilder("You are Desi.", "desi", budget=1000)
+    history = [("user", "hi", 1), ("desi", "hello!", 2)]
+    assert builder.build(history, "how are you?") == [
+        {"role": "system", "content": "You are Desi."},
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello!"},
+        {"role": "user", "content": "how are you?"},
+    ]
+
+
+def test_keeps_the_most_recent_turns_that_fit():
+    history = [("user", "old", 10), ("desi", "older answer", 10), ("user", "recent", 10), ("desi", "latest", 10)]
+    builder = ContextBuilder(None, "desi", budget=budget_for("next", [10, 10]))
+    messages = builder.build(history, "next")
+    assert [m["content"] for m in messages] == ["recent", "latest", "next"]
+
+
+def test_stops_at_the_first_turn_that_does_not_fit():
+    # A small old turn must not jump the queue past a large newer one
+    history = [("user", "small", 1), ("desi", "huge", 500), ("user", "recent", 10)]
+    builder = ContextBuilder(None, "desi", budget=budget_for("next", [10, 1]))
+    messages = builder.build(history, "next")
+    assert [m["content"] for m in messages] == ["recent", "next"]
+
+
+def test_skips_turns_of_other_personas():
+    history = [("user", "hi", 1), ("claude", "from another model", 5), ("desi", "mine", 2)]
+    builder = ContextBuilder(None, "desi", budget=1000)
+    messages = builder.build(history, "next")
+    assert [m["content"] for m in messages] == ["hi", "mine", "next"]
+
+
+def test_prompt_is_kept_even_without_room():
+    builder = ContextBuilder("A long persona " * 50, "desi", budget=10)
+    messages = builder.build([("user", "hi", 1)], "next")
+    assert messages[-1] == {"role": "user", "content": "next"}
+    assert [m["role"] for m in messages] == ["system", "user"]
@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from discord_bots.fair_queue import AdmissionRejected, FairQueue
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_runs_at_once_while_slots_are_free():
+    async def scenario():
+        queue = FairQueue(max_concurrent=2)
+        first, second = queue.submit("a"), queue.submit("b")
+        assert (first.position, second.position) == (0, 0)
+        assert first.future.done() and second.future.done()
+        assert queue.running == 2 and queue.queued == 0
+        first.release()
+        second.release()
+        assert queue.running == 0
+
+    run(scenario())
+
+
+def test_slots_go_round_robin_across_keys():
+    async def scenario():
+        queue = FairQueue(max_concurrent=1, max_per_key=10, max_wait=1000)
+        holder = queue.submit("a")
+        spam = [queue.submit("a") for _ in range(3)]
+        other = queue.submit("b")
+        # b waits behind a's first queued command only, not its whole backlog
+        assert other.position == 2
+        order = []
+
+        async def command(name, ticket):
+            await ticket.wait()
+            order.append(name)
+            await asyncio.sleep(0)
+            ticket.release()
+
+        tasks = [asyncio.create_task(command(f"a{i}", t)) for i, t in enumerate(spam, 1)]
+        tasks.append(asyncio.create_task(command("b1", other)))
+        await asyncio.sleep(0)
+        holder.release()
+        await asyncio.gather(*tasks)
+        assert order == ["a1", "b1", "a2", "a3"]
+        assert queue.running == 0 and queue.queued == 0
+
+    run(scenario())
+
+
+def test_costly_command_waits_for_its_deficit():
+    async def scenario():
+        queue = FairQueue(max_concurrent=1, max_wait=1000)
+        holder = queue.submit("x")
+        fanout = queue.submit("a", cost=2)
+        single = queue.submit("b")
+        order = []
+
+        async def command(name, ticket):
+            await ticket.wait()
+            order.append(name)
+            await asyncio.sleep(0)
+            ticket.release()
+
+        tasks = [asyncio.create_task(command("fanout", fanout)), asyncio.create_task(command("single", single))]
+        await asyncio.sleep(0)
+        holder.release()
+        await asyncio.gather(*tasks)
+        assert order == ["single", "fanout"]
+
+    run(scenario())
+
+
+def test_rejects_a_key_over_its_queue_limit():
+    async def scenario():
+        queue = FairQueue(max_concurrent=1, max_per_key=2, max_wait=1000)
+        queue.submit("a")
+        queue.submit("a")
+        queue.submit("a")
+        with pytest.raises(AdmissionRejected, match="2 requests waiting"):
+            queue.submit("a")
+        # Other keys are still admitted
+        queue.submit("b")
+        assert queue.rejected == 1 and queue.queued == 3
+
+    run(scenario())
+
+
+def test_rejects_when_the_queue_is_full():
+    async def scenario():
+        queue = FairQueue(max_concurrent=1, max_queue=2, max_wait=1000)
+        queue.submit("a")
+        queue.submit("b")
+        queue.submit("c")
+        with pytest.raises(AdmissionRejected, match="queue is full"):
+            queue.submit("d")
+
+    run(scenario())
+
+
+def test_rejects_when_the_projected_wait_is_too_long():
+    async def scenario():
+        queue = FairQueue(max_concurrent=1, max_wait=10)
+        queue.avg_service = 6.0
+        queue.submit("a")
+        queue.submit("b")
+        with pytest.raises(AdmissionRejected, match="expected wait"):
+            queue.submit("c")
+        assert queue.stats()["rejected"] == 1
+
+    run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        queue = FairQueue(max_concurrent=1, max_wait=1000)
+        holder = queue.submit("a")
+        waiting = queue.submit("b")
+        task = asyncio.create_task(waiting.wait())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert queue.queued == 0 and queue.stats()["keys"] == 0
+        holder.release()
+        assert queue.running == 0
+
+    run(scenario())
+
+
+def test_double_release_frees_one_slot():
+    async def scenario():
+        queue = FairQueue(max_concurrent=1)
+        ticket = queue.submit("a")
+        ticket.release()
+        ticket.release()
+        assert queue.running == 0
+
+    run(scenario())
@@ -0,0 +1,101 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import aiohttp
+import pytest
+
+from ai_providers import scheduler
+from ai_providers.errors import ProviderError
+from ai_providers.scheduler import ProviderScheduler, _parse_duration, parse_rate_limit_reset, parse_retry_after
+
+
+def test_parse_retry_after_seconds_and_milliseconds():
+    assert parse_retry_after({"retry-after": "7"}) == 7.0
+    assert parse_retry_after({"retry-after-ms": "1500", "retry-after": "7"}) == 1.5
+    assert parse_retry_after({"retry-after": "-3"}) == 0.0
+    assert parse_retry_after({}) is None
+    assert parse_retry_after(None) is None
+
+
+def test_parse_retry_after_http_date():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 < parse_retry_after({"retry-after": format_datetime(when, usegmt=True)}) <= 30
+    assert parse_retry_after({"retry-after": "soon"}) is None
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("1.5", 1.5),
+    ("1s", 1.0),
+    ("6m0s", 360.0),
+    ("250ms", 0.25),
+    ("1h2m3s", 3723.0),
+])
+def test_parse_duration(value, seconds):
+    assert _parse_duration(value) == pytest.approx(seconds)
+
+
+@pytest.mark.parametrize("value", ["5x", "m", "12s3"])
+def test_parse_duration_rejects_malformed_values(value):
+    assert _parse_duration(value) is None
+
+
+def test_rate_limit_reset_only_when_the_quota_is_used_up():
+    assert parse_rate_limit_reset({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "2s"}) == 2.0
+    assert parse_rate_limit_reset({"x-ratelimit-remaining-requests": "5", "x-ratelimit-reset-requests": "2s"}) is None
+    assert parse_rate_limit_reset({"anthropic-ratelimit-remaining-requests": "0",
+                                   "anthropic-ratelimit-reset-requests": "250ms"}) == 0.25
+    assert parse_rate_limit_reset({}) is None
+
+
+@pytest.mark.parametrize("error, retried", [
+    (ProviderError("p", 429, "slow down"), True),
+    (ProviderError("p", 503, "overloaded"), True),
+    (ProviderError("p", 529, "overloaded"), True),
+    (aiohttp.ConnectionTimeoutError(), True),
+    # The provider may already have run (and billed) these, so they go to failover
+    (ProviderError("p", 408, "timeout"), False),
+    (ProviderError("p", 409, "conflict"), False),
+    (ProviderError("p", 500, "oops"), False),
+    (ProviderError("p", 502, "bad gateway"), False),
+    (asyncio.TimeoutError(), False),
+    (aiohttp.ServerTimeoutError(), False),
+    (aiohttp.ServerDisconnectedError(), False),
+    # Rejected keys are never retried with the same key
+    (ProviderError("p", 401, "bad key"), False),
+    (ProviderError("p", 429, "insufficient quota"), False),
+    (ValueError("bad json"), False),
+])
+def test_retry_classification(error, retried):
+    delay = ProviderScheduler()._retry_delay("p", "key", error, 0)
+    assert (delay is not None) == retried
+
+
+def test_connection_refused_is_retried():
+    key = aiohttp.client_reqrep.ConnectionKey("example.com", 443, True, True, None, None, None)
+    error = aiohttp.ClientConnectorError(key, ConnectionRefusedError(111, "refused"))
+    assert ProviderScheduler()._retry_delay("p", "key", error, 0) is not None
+
+
+def test_retry_after_is_honoured_and_pauses_the_key():
+    sched = ProviderScheduler()
+    assert sched._retry_delay("p", "key", ProviderError("p", 429, "slow down", retry_after=2.0), 0) == 2.0
+    paused, _ = sched.key_load("p", "key")
+    assert paused
+
+
+def test_no_retry_past_the_limits():
+    sched = ProviderScheduler()
+    error = ProviderError("p", 503, "overloaded")
+    assert sched._retry_delay("p", "key", error, scheduler.PROVIDER_MAX_RETRIES) is None
+    too_long = ProviderError("p", 429, "slow down", retry_after=scheduler.PROVIDER_RETRY_MAX_DELAY + 1)
+    assert sched._retry_delay("p", "key", too_long, 0) is None
+
+
+def test_backoff_is_jittered_and_capped():
+    sched = ProviderScheduler()
+    error = ProviderError("p", 503, "overloaded")
+    for attempt in range(scheduler.PROVIDER_MAX_RETRIES):
+        delay = sched._retry_delay("p", "key", error, attempt)
+        cap = min(scheduler.PROVIDER_RETRY_MAX_DELAY, scheduler.PROVIDER_RETRY_BASE_DELAY * 2 ** attempt)
+        assert 0 <= delay <= cap
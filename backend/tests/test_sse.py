@@ -0,0 +1,57 @@
+import asyncio
+
+from ai_providers.sse import iter_sse_events
+
+
+class FakeResponse:
+    """Just the content line iterator of an aiohttp response"""
+
+    def __init__(self, body: str):
+        self.lines = [line.encode("utf-8") for line in body.splitlines(keepends=True)]
+
+    @property
+    def content(self):
+        async def lines():
+            for line in self.lines:
+                yield line
+        return lines()
+
+
+def events(body: str):
+    async def collect():
+        return [event async for event in iter_sse_events(FakeResponse(body))]
+    return asyncio.run(collect())
+
+
+def test_one_event_per_blank_line():
+    body = 'data: {"a": 1}\n\ndata: {"a": 2}\n\n'
+    assert events(body) == [{"a": 1}, {"a": 2}]
+
+
+def test_crlf_and_unspaced_data():
+    assert events('data:{"a": 1}\r\n\r\n') == [{"a": 1}]
+
+
+def test_multi_line_data_is_joined():
+    body = 'data: {"a":\ndata: 1}\n\n'
+    assert events(body) == [{"a": 1}]
+
+
+def test_event_id_and_comment_lines_are_ignored():
+    body = ': keep-alive\n\nevent: message_delta\nid: 7\ndata: {"a": 1}\n\n'
+    assert events(body) == [{"a": 1}]
+
+
+def test_done_ends_the_stream():
+    body = 'data: {"a": 1}\n\ndata: [DONE]\n\ndata: {"a": 2}\n\n'
+    assert events(body) == [{"a": 1}]
+
+
+def test_malformed_json_is_skipped():
+    body = 'data: {not json\n\ndata: {"a": 1}\n\n'
+    assert events(body) == [{"a": 1}]
+
+
+def test_last_event_without_trailing_blank_line():
+    assert events('data: {"a": 1}\n\ndata: {"a": 2}') == [{"a": 1}, {"a": 2}]
+    assert events('data: [DONE]') == []
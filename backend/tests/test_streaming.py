@@ -0,0 +1,67 @@
+import asyncio
+
+from discord_bots.streaming import StreamingReply
+
+
+class FakeChannel:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, content):
+        message = FakeMessage(self, content)
+        self.messages.append(message)
+        return message
+
+
+class FakeMessage:
+    def __init__(self, channel, content):
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, content):
+        self.content = content
+
+
+def stream(deltas, limit=20):
+    async def scenario():
+        channel = FakeChannel()
+        placeholder = await channel.send("Preparing answer ...")
+        reply = StreamingReply(placeholder, edit_interval=0, limit=limit)
+        for delta in deltas:
+            await reply.append(delta)
+        text = await reply.finish()
+        return text, [message.content for message in channel.messages]
+    return asyncio.run(scenario())
+
+
+def test_short_reply_edits_the_placeholder():
+    text, messages = stream(["Hello", " world"])
+    assert text == "Hello world"
+    assert messages == ["Hello world"]
+
+
+def test_rolls_over_at_the_last_space_before_the_limit():
+    text, messages = stream(["one two three ", "four five six seven"], limit=20)
+    assert text == "one two three four five six seven"
+    assert messages == ["one two three four", "five six seven"]
+    assert all(len(m) <= 20 for m in messages)
+
+
+def test_long_word_is_split_at_the_limit():
+    text, messages = stream(["x" * 45], limit=20)
+    assert text == "x" * 45
+    assert messages == ["x" * 20, "x" * 20, "x" * 5]
+
+
+def test_text_keeps_every_character_across_many_rollovers():
+    words = [f"word{i} " for i in range(200)]
+    text, messages = stream(words, limit=50)
+    assert text == "".join(words)
+    assert all(len(m) <= 50 for m in messages)
+    assert " ".join(messages).split() == text.split()
+
+
+def test_empty_reply_shows_the_fallback():
+    text, messages = stream([])
+    assert text == "No response"
+    assert messages == ["No response"]
@@ -38,6 +38,7 @@ type DiscordBot = {
   name: string;
   token: string;
   is_active: boolean;
+  is_running: boolean;
   created_at: string;
   updated_at: string;
   guild_id?: string;
@@ -285,8 +286,8 @@ export const BotManager = () => {
                     {/* Status column */}
                     <TableCell>
                       <Chip
-                        label={bot.is_active ? 'Active' : 'Inactive'}
-                        color={bot.is_active ? 'success' : 'default'}
+                        label={bot.is_running ? 'Running' : 'Stopped'}
+                        color={bot.is_running ? 'success' : 'default'}
                         size="small"
                         sx={{ pl: 0.5, pr: 0.5, fontWeight: 600, fontSize: '0.7rem', height: 20, minHeight: 20 }}
                       />
@@ -314,7 +315,7 @@ export const BotManager = () => {
                         color="primary"
                         onClick={() => handleRestart(bot.id)}
                         title="Start Bot"
-                        disabled={bot.is_active || saving}
+                        disabled={bot.is_running || saving}
                       >
                         <PlayArrowIcon fontSize="small" />
                       </IconButton>
@@ -324,7 +325,7 @@ export const BotManager = () => {
                         color="info"
                         onClick={() => handleRestart(bot.id)}
                         title="Restart Bot"
-                        disabled={!bot.is_active || saving}
+                        disabled={!bot.is_running || saving}
                       >
                         <RefreshIcon fontSize="small" />
                       </IconButton>
@@ -334,7 +335,7 @@ export const BotManager = () => {
                         color="warning"
                         onClick={() => handleStop(bot.id)}
                         title="Stop Bot"
-                        disabled={!bot.is_active || saving}
+                        disabled={!bot.is_running || saving}
                       >
                         <StopIcon fontSize="small" />
                       </IconButton>